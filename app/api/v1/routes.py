@@ -1,13 +1,21 @@
 from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from typing import Optional
+import asyncio
 import os 
+import json
 import tempfile
+import time
 from pathlib import Path
 from app.core.session_manager import SessionManager, Session, session_manager
 from app.services.RAG_service import RAGService
-from app.schemas.request_models import QueryRequest
-from app.schemas.response_models import SessionResponse, QueryResponse,UploadResponse
+from app.schemas.request_models import QueryRequest, BatchQueryRequest, LibraryQueryRequest
+from app.schemas.response_models import SessionResponse, QueryResponse,UploadResponse, BatchQueryResponse, BatchAnswer, LibraryQueryResponse
+from app.services.library_service import library_service
+from app.utils.llm_scheduler import get_scheduler
+from app.utils.model_router import get_router
+from app.utils.hedging import hedging_metrics
+from app.utils.chain_cache import chain_cache
 from app.config.config import get_settings
 from app.schemas.response_models import SessionResponse, QueryResponse, UploadResponse,SourceDocument
 
@@ -21,10 +29,26 @@ def get_session(session_id:str) -> Session:
         )
     return session
 
+def to_sources(hits, limit: int = 3):
+    """Top retrieval hits as SourceDocuments"""
+    return [
+        SourceDocument(
+            doc_id=hit.doc_id,
+            page=hit.page,
+            text=hit.text,
+            score=hit.score,
+            metadata=hit.metadata,
+            dense_score=hit.dense_score,
+            sparse_score=hit.sparse_score
+        )
+        for hit in hits[:limit]
+    ]
+
 @router.post("/session", response_model=SessionResponse)
-async def create_session():
+async def create_session(username: Optional[str] = None):
     """Create a new session for document processing"""
-    session_id = session_manager.create_session()
+    # sqlite write, kept off the event loop
+    session_id = await asyncio.to_thread(session_manager.create_session, username=username)
     return SessionResponse(
         session_id=session_id,
         message="Session created successfully"
@@ -33,7 +57,8 @@ async def create_session():
 @router.delete("/session/{session_id}")
 async def delete_session(session_id: str):
     """Delete a session"""
-    session_manager.delete_session(session_id)
+    # store, spill-file and sqlite cleanup, kept off the event loop
+    await asyncio.to_thread(session_manager.delete_session, session_id)
     return {"message": "Session deleted successfully"}
 
 @router.post("/upload/{session_id}", response_model=UploadResponse)
@@ -69,30 +94,46 @@ async def upload_document(
             tmp_file.write(content)
             tmp_file_path = tmp_file.name
         
-        # Initialize RAG service for this session 
-        session.rag_service = RAGService()
-
-        # Load and split document
-        session.rag_service.load_and_split_document(
-            type = doc_type, 
-            path = tmp_file_path
-        ) 
-
-        # create vectore store 
-        session.rag_service.create_vector_store()
-
-        # update session state 
-
-        session.document_uploaded = True
-        session.vector_store_created = True
-        session.document_info = {
-            "filename": file.filename,
-            "type": doc_type,
-            "size": file.size,
-            "chunks_count": len(session.rag_service.chunks)
-        }
-        # Clean up temporary file
-        os.unlink(tmp_file_path)
+        # until save_document publishes it, concurrent requests keep this worker's
+        # new document instead of reloading the one the stored record still names
+        with session_manager.uploading(session):
+            # Initialize RAG service for this upload; the session keeps serving its
+            # previous document until this one is loaded
+            rag_service = await asyncio.to_thread(RAGService)
+
+            # Load, split and index the document without blocking other sessions
+            await rag_service.aload(
+                type = doc_type,
+                path = tmp_file_path
+            )
+
+            # update session state
+            session.rag_service = rag_service
+            session.document_uploaded = True
+            session.vector_store_created = True
+            session.document_info = {
+                "filename": file.filename,
+                "type": doc_type,
+                "size": file.size,
+                "chunks_count": len(rag_service.chunks)
+            }
+            if session.username:
+                await asyncio.to_thread(
+                    session_manager.db.update_session,
+                    session_id,
+                    document_name=file.filename,
+                    document_type=doc_type,
+                    pinecone_index=rag_service.index_name,
+                    pinecone_namespace=rag_service.namespace,
+                    chunks_count=len(rag_service.chunks)
+                )
+            # Clean up temporary file
+            os.unlink(tmp_file_path)
+
+            # publish the document so other workers can serve this session
+            await asyncio.to_thread(session_manager.save_document, session)
+        # charge the new document to the memory budget; may evict other idle sessions
+        await asyncio.to_thread(session_manager.account, session)
 
         return UploadResponse(
             session_id=session_id,
@@ -123,39 +164,149 @@ async def query_document(
             detail="No docuement uploaded or processed for this session"
         )
     try: 
-        # create query embedding
-        session.rag_service.create_query_embedding(query_request.query)
-
-        # retrive relevant docs 
-        session.rag_service.retrive_documents(query_request.query)
-
-        # generate answer
-        answer = session.rag_service.answer_query(query_request.query)
-        sources = []
-        if hasattr(session.rag_service, 'result') and session.rag_service.result:
-            matches = session.rag_service.result
-            for match in matches[:3]:  # Top 3 sources
-                metadata = match.metadata
-                score = session.rag_service.metadataservice.cosine_similarity(vec1=session.rag_service.embedding_model.embed_query(match.page_content), vec2=session.rag_service.embedding_model.embed_query(
-                    session.rag_service.query
-                ))
-                sources.append(SourceDocument(
-                            doc_id=metadata['doc_id'],
-                            page=metadata['page_no'],
-                            text=match.page_content,
-                            score=score,
-                            metadata=metadata
-                        ))
+        # retrive relevant docs and generate answer (served from the answer cache when possible)
+        result = await session.rag_service.aquery(query_request.query, query_request.latency_budget_ms)
         return QueryResponse(
             session_id=session_id,
             query=query_request.query,
-            answer=answer,
-            message="Query processed successfully"
+            answer=result.answer,
+            message="Query processed successfully",
+            sources=to_sources(result.hits),
+            timings=result.timings,
+            cached=result.cached,
+            degradations=result.degradations
         )
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
 
+@router.post("/query/{session_id}/stream")
+async def stream_query_document(
+    session_id: str,
+    query_request: QueryRequest,
+    session: Session = Depends(get_session)
+):
+    """
+    Query the uploaded document, streaming the response as Server-Sent Events:
+    `sources` once retrieval is done, `token` for every answer piece, then `done`
+    with the timings (incl. time_to_first_token_ms) and the metadata filter the
+    query used (`query_filter`, `filter_source`). Failures are sent as `error`.
+    """
+    if not session.document_uploaded or not session.vector_store_created:
+        raise HTTPException(
+            status_code= 400,
+            detail="No docuement uploaded or processed for this session"
+        )
+
+    def sse(event: str, data) -> str:
+        return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+    def events():
+        # sync generator: Starlette iterates it in a worker thread, so the event loop is not blocked
+        try:
+            for event, payload in session.rag_service.stream_query(query_request.query, query_request.latency_budget_ms):
+                if event == "retrieval":
+                    yield sse("sources", {
+                        "session_id": session_id,
+                        "sources": [s.model_dump() for s in to_sources(payload.hits)],
+                        "timings": payload.timings,
+                        "cached": payload.cached,
+                        "degradations": payload.degradations
+                    })
+                elif event == "done":
+                    yield sse("done", {
+                        "session_id": session_id,
+                        "timings": payload.timings,
+                        "cached": payload.cached,
+                        "degradations": payload.degradations,
+                        "query_filter": payload.query_filter,
+                        "filter_source": payload.filter_source
+                    })
+                else:
+                    yield sse(event, payload)
+        except Exception as e:
+            yield sse("error", {"detail": f"Error processing query: {str(e)}"})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/query/{session_id}/batch", response_model=BatchQueryResponse)
+async def batch_query_document(
+    session_id: str,
+    batch_request: BatchQueryRequest,
+    session: Session = Depends(get_session)
+):
+    """Answer a list of questions over the uploaded document"""
+    if not session.document_uploaded or not session.vector_store_created:
+        raise HTTPException(
+            status_code= 400,
+            detail="No docuement uploaded or processed for this session"
+        )
+    try:
+        start = time.perf_counter()
+        # the batch fans out on its own thread pool; keep the event loop free meanwhile
+        results = await asyncio.to_thread(
+            session.rag_service.batch_query,
+            batch_request.questions,
+            max_concurrency=batch_request.max_concurrency
+        )
+        total_ms = (time.perf_counter() - start) * 1000
+        return BatchQueryResponse(
+            session_id=session_id,
+            answers=[
+                BatchAnswer(
+                    query=r.query,
+                    answer=r.answer,
+                    sources=to_sources(r.hits),
+                    timings=r.timings,
+                    cached=r.cached
+                )
+                for r in results
+            ],
+            message=f"{len(results)} questions processed successfully",
+            timings={
+                "total_ms": total_ms,
+                "questions_per_second": len(results) / (total_ms / 1000) if total_ms else 0.0
+            }
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing batch query: {str(e)}")
+
+@router.post("/library/{username}/query", response_model=LibraryQueryResponse)
+async def query_library(username: str, library_request: LibraryQueryRequest):
+    """Query across every document the user has uploaded"""
+    try:
+        result = await asyncio.to_thread(
+            library_service.query,
+            username, library_request.query,
+            metadata_filter=library_request.metadata_filter, k=library_request.k
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing library query: {str(e)}")
+    if not result["stats"].get("documents"):
+        raise HTTPException(status_code=404, detail=f"No documents found for user '{username}'")
+    return LibraryQueryResponse(
+        username=username,
+        query=library_request.query,
+        answer=result["answer"],
+        message=f"Searched {result['stats']['searched']} of {result['stats']['documents']} documents",
+        sources=to_sources(result["hits"], limit=len(result["hits"])),
+        stats=result["stats"]
+    )
+
+@router.get("/llm/metrics")
+async def get_llm_metrics():
+    """LLM scheduler queues / rate limits, per-task routing usage, hedged-request latency histograms and compiled-chain cache"""
+    return {
+        "scheduler": get_scheduler().metrics(),
+        "routing": get_router().metrics(),
+        "hedging": hedging_metrics(),
+        "chains": chain_cache.metrics()
+    }
+
 @router.get("/session/{session_id}/status")
 async def get_session_status(
     session_id: str,
@@ -168,9 +319,18 @@ async def get_session_status(
         "last_activity": session.last_activity,
         "document_uploaded": session.document_uploaded,
         "vector_store_created": session.vector_store_created,
-        "document_info": session.document_info
+        "document_info": session.document_info,
+        "bytes_held": session.bytes_held,
+        "evicted": session.evicted,
+        "answer_cache": session.rag_service.answer_cache.metrics() if session.rag_service else None
     }
 
+@router.get("/sessions/metrics")
+async def get_sessions_metrics():
+    """Live sessions and the estimated memory they hold"""
+    # takes the manager lock, which the sweeper holds while spilling
+    return await asyncio.to_thread(session_manager.metrics)
+
     
     
 
@@ -13,11 +13,92 @@ class Settings(BaseSettings):
     allowed_file_types: list = [".pdf", ".docx", ".doc"]
     upload_dir: str = "app/uploads"
     
+    # Batch Query Settings
+    batch_max_concurrency: int = 8  # concurrent retrievals / answer LLM calls per batch
+    batch_pack_size: int = 1  # questions answered per LLM call (1 = one call per question)
+
+    # Answer Cache Settings
+    answer_cache_enabled: bool = True
+    answer_cache_size: int = 256  # cached answers per document
+    answer_cache_ttl_seconds: int = 3600
+    answer_cache_similarity_threshold: float = 0.95  # query-embedding cosine for near-duplicates
+
+    # LLM Scheduler Settings
+    llm_scheduler_enabled: bool = True  # quotas per provider:model are in config.yaml (llm.<provider>.rate_limits)
+    llm_max_retries: int = 5  # retries on 429 / RESOURCE_EXHAUSTED
+    llm_backoff_base_seconds: float = 1.0
+    llm_backoff_max_seconds: float = 60.0
+    llm_output_token_estimate: int = 256  # charged to the tokens/min bucket on top of the prompt
+
+    # Provider Settings ("fake" / "hash" / "memory" / "lexical" run everything offline)
+    llm_provider_override: Optional[str] = None  # e.g. "fake": route every LLM task to this provider
+    embedding_provider: str = "huggingface"  # or "hash"
+    vector_store_provider: str = "pinecone"  # or "memory"
+    reranker_provider: str = "huggingface"  # or "lexical"
+
+    # Structured Output Settings
+    structured_output_mode: str = "parser"  # "parser" (schema in the prompt) or "native" (provider structured output)
+
+    # Hedged Request Settings (interactive answers; secondary provider is routing.answer.hedge).
+    # Off by default: each hedge is a second paid request against the hedge
+    # provider's own quota (llm.<provider>.rate_limits in config.yaml)
+    hedging_enabled: bool = False
+    hedge_percentile: float = 95  # primary latency percentile (first token for streams) used as the hedge delay
+    hedge_min_delay_ms: float = 300
+    hedge_max_delay_ms: float = 5000  # also the delay until hedge_min_samples latencies are known
+    hedge_min_samples: int = 20
+
+    # Library Settings
+    library_k: int = 5  # chunks retrieved across all of a user's documents
+    library_restored_retrievers_max: int = 64  # cached dense-only retrievers for documents not in memory
+
     # Session Settings
     session_timeout_minutes: int = 60
+    session_memory_budget_mb: float = 1024  # estimated per-document state held across live sessions
+    session_evict_idle_seconds: int = 120  # only sessions idle this long lose their in-memory state
+    session_sweep_interval_seconds: int = 60  # background expiry / budget sweep
+    session_spill_dir: str = "app/data/session_spill"  # idle sessions' state, rehydrated on their next query
+    session_store: str = "local"  # "local" (one worker), "sqlite" (workers sharing database_path) or "redis"
+    session_store_url: Optional[str] = None  # redis URL, e.g. redis://host:6379/0
 
     database_path: str = os.getenv("DATABASE_PATH", "/tmp/claridoc_data/sessions.db")
 
+    # Retrieval Settings
+    retrieval_k: int = 5  # same k for the dense and sparse legs
+    fusion_method: str = "rrf"  # "rrf" or "score"
+    fusion_weights: list = [0.7, 0.3]  # dense, sparse
+    rrf_k: int = 60
+
+    # Reranking Settings
+    rerank_enabled: bool = True
+    rerank_candidates: int = 20  # per-leg k when reranking
+    rerank_top_n: int = 3  # chunks sent to the LLM
+    rerank_latency_budget_ms: float = 250.0
+
+    # Context Assembly Settings
+    context_token_budget: int = 1500  # estimated tokens of retrieved context per question
+    context_dedup_threshold: float = 0.9  # shingle Jaccard above which a chunk is a near-duplicate
+    context_expansion: str = "none"  # "none", "neighbours" or "page"
+    context_expansion_window: int = 1  # neighbouring chunks added on each side of a hit
+    chunk_index_dir: str = "app/data/chunk_index"
+
+    # Query Deadline Settings
+    query_latency_budget_ms: Optional[float] = None  # default per-query budget; None = no deadline
+    deadline_answer_reserve_ms: float = 2500  # kept for answer generation when deciding on optional stages
+    deadline_llm_filter_ms: float = 1500  # expected query-metadata LLM latency
+    deadline_min_context_fraction: float = 0.25  # smallest share of context_token_budget when behind schedule
+
+    # Query Metadata Settings
+    local_query_filter: bool = True  # build filters from the keyword vocabulary before asking the LLM
+    local_filter_similarity_threshold: float = 0.75
+    local_filter_shadow: bool = False  # also run the LLM path and log agreement / latency saved
+    keyword_prompt_pruning: bool = True  # send only the query-relevant keyword vocabulary to the LLM
+    keyword_prompt_top_n: int = 8  # keywords kept per field
+    keyword_prompt_token_budget: int = 400
+    keyword_prompt_shadow: bool = False  # also run with the full vocabulary and log filter agreement
+    speculative_retrieval: bool = True  # retrieve unfiltered while the metadata LLM call is in flight
+    speculative_k_multiplier: int = 3
+    speculative_min_survivors: int = 3  # dense hits that must pass the filter to skip the re-query
     
     # API Keys
     gemini_api_key: Optional[str] = None
@@ -1,54 +1,322 @@
+import threading
+import time
 import uuid
-from typing import Dict, Optional
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import List, Optional
 from datetime  import datetime, timedelta
 from app.services.RAG_service import RAGService
+from app.database.database import SessionDatabase
+from app.database.session_store import get_session_store
+from app.config.config import get_settings
+
+# Minimum age of the stored last-activity time before get_session refreshes it
+_TOUCH_INTERVAL_SECONDS = 5
 
 class Session:
-    def __init__(self, session_id:str):
-        self.session_id = session_id 
+    def __init__(self, session_id:str, username: Optional[str] = None):
+        self.session_id = session_id
+        self.username = username
         self.created_at = datetime.now()
         self.last_activity = datetime.now()
         self.rag_service : Optional[RAGService] = None
         self.document_uploaded = False
         self.vector_store_created = False
         self.document_info = {}
+        self.document_id: Optional[str] = None  # per-upload id of the document (RAGService.document_id)
+        self.bytes_held = 0  # last memory estimate, refreshed by SessionManager.account()
+        self.uploads_in_progress = 0  # while > 0 the local document is newer than the stored record
+        self._load_lock = threading.Lock()
+        self._upload_lock = threading.Lock()  # never held across I/O; taken on the event loop
 
     def update_activity(self):
         self.last_activity = datetime.now()
 
+    def to_record(self) -> dict:
+        """What the session store keeps: everything except the document state itself."""
+        return {
+            "session_id": self.session_id,
+            "username": self.username,
+            "created_at": self.created_at.timestamp(),
+            "last_activity": self.last_activity.timestamp(),
+            "document_uploaded": self.document_uploaded,
+            "vector_store_created": self.vector_store_created,
+            "document_info": self.document_info,
+            "document_id": self.document_id,
+        }
+
+    @classmethod
+    def from_record(cls, record: dict) -> "Session":
+        session = cls(record["session_id"], username=record.get("username"))
+        session.created_at = datetime.fromtimestamp(record["created_at"])
+        session.apply_record(record)
+        return session
+
+    def apply_record(self, record: dict):
+        """Take over metadata another worker may have changed."""
+        self.last_activity = max(self.last_activity, datetime.fromtimestamp(record["last_activity"]))
+        self.document_uploaded = record["document_uploaded"]
+        self.vector_store_created = record["vector_store_created"]
+        self.document_info = record["document_info"]
+        self.document_id = record.get("document_id")
+
     def is_expired(self, timeout_minutes: int = 60) -> bool:
-        return datetime.now() - self.last_activity > timedelta()
+        return datetime.now() - self.last_activity > timedelta(minutes=timeout_minutes)
+
+    def idle_seconds(self) -> float:
+        return (datetime.now() - self.last_activity).total_seconds()
+
+    def estimate_bytes(self) -> int:
+        if self.rag_service is None:
+            return 0
+        return self.rag_service.memory_footprint()["total"]
+
+    @property
+    def evicted(self) -> bool:
+        """Document state is not resident (spilled to disk, or released and served dense-only)."""
+        return self.rag_service is not None and self.vector_store_created and not self.rag_service.heavy_state_loaded
+
+    def release_heavy_state(self):
+        """Spill the document state to disk (rehydrated on the next query), else just release it."""
+        if self.rag_service is not None and self.rag_service.heavy_state_loaded:
+            try:
+                spilled = self.rag_service.spill()
+            except OSError as e:
+                print(f"[SessionManager] Spill of session {self.session_id} failed ({e}), releasing state")
+                spilled = False
+            if not spilled:
+                self.rag_service.release_heavy_state()
+        self.bytes_held = self.estimate_bytes()
+
+    def discard(self):
+        """Remove anything the session left on disk."""
+        if self.rag_service is not None:
+            self.rag_service.discard_spill()
 
 class SessionManager:
+    """
+    Live sessions, least recently used first.
+
+    Session records are kept in the session store (`settings.session_store`); with
+    a shared store any worker can serve any session: the local Session is a cache
+    of the record, and its document is loaded by id from the store on first use.
+
+    Each session's document state is estimated in bytes (`account`). When the total
+    exceeds `session_memory_budget_mb`, sessions idle for at least
+    `session_evict_idle_seconds` spill their heavy state to disk, oldest first;
+    it is rehydrated on their next query. A background sweeper drops sessions
+    idle past `session_timeout_minutes` and re-checks the budget every
+    `session_sweep_interval_seconds`.
+    """
+
     def __init__(self):
-        self.sessions: Dict[str, Session] = {}
+        self.sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self.db = SessionDatabase(get_settings().database_path)
+        self.store = get_session_store()
+        self._lock = threading.RLock()
+        self._sweeper: Optional[threading.Thread] = None
+        self._stop_sweeper = threading.Event()
+        self.evictions = 0
+        self.expirations = 0
 
-    def create_session(self) -> str:
+    def create_session(self, username: Optional[str] = None) -> str:
         session_id  = str(uuid.uuid4())
-        self.sessions[session_id] = Session(session_id)
+        session = Session(session_id, username=username)
+        self.store.put_session(session.to_record())
+        with self._lock:
+            self.sessions[session_id] = session
+        if username:
+            # persisted so the session's document shows up in the user's library
+            self.db.create_session(session_id, username)
         return session_id
-    
+
+    def get_user_sessions(self, username: str) -> List[Session]:
+        """Live in-memory sessions that belong to a user"""
+        with self._lock:
+            return [s for s in self.sessions.values() if s.username == username]
+
     def get_session(self, session_id: str) -> Optional[Session]:
-        if session_id in self.sessions:
-            session = self.sessions[session_id]
-            if not session.is_expired():
-                session.update_activity()
-                return session
-            else:
-                del self.sessions[session_id]
-        return None
-    
-    def delete_session(self, session_id:str): 
-        if session_id in self.sessions:
-            del self.sessions[session_id]
-    
-    def cleanup_expired_sessions(self): 
-        expired_sessions = [
-            sid for sid, session in self.sessions.items()
-            if session.is_expired()
-        ]
-        for sid in expired_sessions:
-            del self.sessions[sid]
+        record = self.store.get_session(session_id)
+        timeout_seconds = get_settings().session_timeout_minutes * 60
+        if record is None or time.time() - record["last_activity"] > timeout_seconds:
+            if record is not None:
+                self._forget(record)
+                self.expirations += 1
+            with self._lock:
+                session = self.sessions.pop(session_id, None)
+            if session is not None:
+                session.discard()
+            return None
+        with self._lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                session = Session.from_record(record)
+                self.sessions[session_id] = session
+            elif self.store.shared and not session.uploads_in_progress:
+                session.apply_record(record)
+            self.sessions.move_to_end(session_id)
+        self._load_document(session)
+        session.update_activity()
+        now = session.last_activity.timestamp()
+        if now - record["last_activity"] >= _TOUCH_INTERVAL_SECONDS:
+            # expiry is minute-grained; skip the store write on bursts of requests
+            self.store.touch(session_id, now)
+        return session
 
-session_manager = SessionManager()
+    def _load_document(self, session: Session):
+        """Load the session's document from the store if this worker does not hold it yet."""
+        with session._load_lock:
+            if session.document_id is None or session.uploads_in_progress:
+                return
+            if session.rag_service is not None and session.rag_service.document_id == session.document_id:
+                return
+            state = self.store.get_document(session.document_id)
+            if state is None:
+                print(f"[SessionManager] Document {session.document_id} of session {session.session_id} is not in the store")
+                return
+            session.rag_service = RAGService.from_state(state)
+            session.bytes_held = session.estimate_bytes()
+
+    @contextmanager
+    def uploading(self, session: Session):
+        """
+        Wrap a (re-)upload from start to save_document. Until the new document is
+        published the stored record still names the old one; concurrent requests
+        must neither apply that record nor reload the old document over the new one.
+        """
+        with session._upload_lock:
+            session.uploads_in_progress += 1
+        try:
+            yield session
+        finally:
+            with session._upload_lock:
+                session.uploads_in_progress -= 1
+
+    def save_session(self, session: Session):
+        """Write the session's metadata back to the store after a change."""
+        self.store.put_session(session.to_record())
+
+    def save_document(self, session: Session):
+        """
+        Publish the session's freshly indexed document. Shared stores get the
+        document state first, so a record never points at a missing document.
+        """
+        session.document_id = session.rag_service.document_id
+        if self.store.shared:
+            start = time.perf_counter()
+            state = session.rag_service.export_state()
+            self.store.put_document(session.document_id, state)
+            print(f"[SessionManager] Stored document {session.document_id} ({len(state) / 1e6:.2f} MB) "
+                  f"in {(time.perf_counter() - start) * 1000:.0f}ms")
+        self.save_session(session)
+
+    def _forget(self, record: dict):
+        self.store.delete_session(record["session_id"])
+        # keeps the user's library from listing and searching a session that is gone
+        self.db.deactivate_session(record["session_id"])
+        if record.get("document_id"):
+            self.store.delete_document(record["document_id"])
+
+    def delete_session(self, session_id:str):
+        record = self.store.get_session(session_id)
+        if record is not None:
+            self._forget(record)
+        with self._lock:
+            session = self.sessions.pop(session_id, None)
+        if session is not None:
+            session.discard()
+
+    def cleanup_expired_sessions(self) -> int:
+        """
+        Delete sessions idle past the timeout from the store, and drop local copies
+        this worker has not used for that long (with a shared store, another worker
+        may still be serving them; they are reloaded on demand).
+        """
+        timeout_minutes = get_settings().session_timeout_minutes
+        expired_records = self.store.expired_sessions(time.time() - timeout_minutes * 60)
+        for record in expired_records:
+            self._forget(record)
+        self.expirations += len(expired_records)
+        with self._lock:
+            stale = [
+                sid for sid, session in self.sessions.items()
+                if session.is_expired(timeout_minutes)
+            ]
+            for sid in stale:
+                self.sessions.pop(sid).discard()
+        if expired_records or stale:
+            print(f"[SessionManager] Expired {len(expired_records)} session(s), dropped {len(stale)} stale local session(s)")
+        return len(expired_records)
 
+    def account(self, session: Optional[Session] = None):
+        """
+        Refresh the memory estimate of `session` (or of every session), then evict
+        idle sessions' heavy state, least recently used first, until the total fits
+        the budget. The session just accounted is never evicted by this call.
+        """
+        settings = get_settings()
+        budget = settings.session_memory_budget_mb * 1024 * 1024
+        with self._lock:
+            targets = [session] if session is not None else list(self.sessions.values())
+            candidates = list(self.sessions.values())
+        # estimating walks the session's chunks; done outside the lock
+        for target in targets:
+            target.bytes_held = target.estimate_bytes()
+        total = sum(s.bytes_held for s in candidates)
+        for candidate in candidates:
+            if total <= budget:
+                break
+            if candidate is session or candidate.bytes_held == 0 or candidate.evicted:
+                continue
+            if candidate.idle_seconds() < settings.session_evict_idle_seconds:
+                continue
+            freed = candidate.bytes_held
+            candidate.release_heavy_state()
+            freed -= candidate.bytes_held
+            total -= freed
+            self.evictions += 1
+            print(f"[SessionManager] Spilled session {candidate.session_id} state ({freed / 1e6:.1f} MB), "
+                  f"{total / 1e6:.1f}/{budget / 1e6:.1f} MB held")
+        if total > budget:
+            print(f"[SessionManager] Over memory budget ({total / 1e6:.1f}/{budget / 1e6:.1f} MB), no idle session left to evict")
+
+    def sweep(self):
+        self.cleanup_expired_sessions()
+        self.account()
+
+    def _sweep_loop(self):
+        while not self._stop_sweeper.wait(get_settings().session_sweep_interval_seconds):
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"[SessionManager] Sweep failed: {e}")
+
+    def start_sweeper(self):
+        """Start the background expiry / budget sweeper (idempotent)."""
+        with self._lock:
+            if self._sweeper is not None and self._sweeper.is_alive():
+                return
+            self._stop_sweeper.clear()
+            self._sweeper = threading.Thread(target=self._sweep_loop, name="session-sweeper", daemon=True)
+            self._sweeper.start()
+
+    def stop_sweeper(self):
+        self._stop_sweeper.set()
+
+    def metrics(self) -> dict:
+        settings = get_settings()
+        with self._lock:
+            sessions = list(self.sessions.values())
+        loaded = [s for s in sessions if s.rag_service is not None and s.rag_service.heavy_state_loaded]
+        return {
+            "live_sessions": len(sessions),
+            "loaded_sessions": len(loaded),
+            "evicted_sessions": sum(1 for s in sessions if s.evicted),
+            "spilled_sessions": sum(1 for s in sessions if s.rag_service is not None and s.rag_service.spilled),
+            "bytes_held": sum(s.bytes_held for s in sessions),
+            "budget_bytes": int(settings.session_memory_budget_mb * 1024 * 1024),
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+session_manager = SessionManager()
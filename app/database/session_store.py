@@ -0,0 +1,288 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+
+from app.config.config import get_settings
+
+
+class SessionStore(ABC):
+    """
+    Where session records and per-document state live.
+
+    A session record is a small JSON-serialisable dict (see Session.to_record);
+    `last_activity` is a unix timestamp. Document state is an opaque blob keyed
+    by document id (a uuid per upload), so any worker can load the
+    document a session points at. `shared` says whether other processes see
+    the same data.
+    """
+
+    shared = False
+
+    @abstractmethod
+    def get_session(self, session_id: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    def put_session(self, record: dict):
+        ...
+
+    @abstractmethod
+    def touch(self, session_id: str, last_activity: float):
+        ...
+
+    @abstractmethod
+    def delete_session(self, session_id: str):
+        ...
+
+    @abstractmethod
+    def expired_sessions(self, cutoff: float) -> List[dict]:
+        """Records whose last activity is older than `cutoff`."""
+
+    @abstractmethod
+    def put_document(self, document_id: str, state: bytes):
+        ...
+
+    @abstractmethod
+    def get_document(self, document_id: str) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    def delete_document(self, document_id: str):
+        ...
+
+
+class LocalSessionStore(SessionStore):
+    """In-process store: a single worker, the behaviour before shared stores existed."""
+
+    def __init__(self):
+        self._sessions: Dict[str, dict] = {}
+        self._documents: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def get_session(self, session_id: str) -> Optional[dict]:
+        with self._lock:
+            record = self._sessions.get(session_id)
+            return dict(record) if record is not None else None
+
+    def put_session(self, record: dict):
+        with self._lock:
+            self._sessions[record["session_id"]] = dict(record)
+
+    def touch(self, session_id: str, last_activity: float):
+        with self._lock:
+            if session_id in self._sessions:
+                self._sessions[session_id]["last_activity"] = last_activity
+
+    def delete_session(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def expired_sessions(self, cutoff: float) -> List[dict]:
+        with self._lock:
+            return [dict(r) for r in self._sessions.values() if r["last_activity"] < cutoff]
+
+    def put_document(self, document_id: str, state: bytes):
+        with self._lock:
+            self._documents[document_id] = state
+
+    def get_document(self, document_id: str) -> Optional[bytes]:
+        with self._lock:
+            return self._documents.get(document_id)
+
+    def delete_document(self, document_id: str):
+        with self._lock:
+            self._documents.pop(document_id, None)
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Shared store for several workers on one node (or a shared volume), kept in
+    the application database. WAL mode lets readers run alongside the writer.
+    """
+
+    shared = True
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def init_db(self):
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS session_state (
+                    session_id TEXT PRIMARY KEY,
+                    record TEXT NOT NULL,
+                    last_activity REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_session_state_activity ON session_state (last_activity)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS document_state (
+                    document_id TEXT PRIMARY KEY,
+                    state BLOB NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.commit()
+
+    def get_session(self, session_id: str) -> Optional[dict]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT record, last_activity FROM session_state WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        record = json.loads(row[0])
+        record["last_activity"] = row[1]
+        return record
+
+    def put_session(self, record: dict):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO session_state (session_id, record, last_activity) VALUES (?, ?, ?)",
+                (record["session_id"], json.dumps(record, default=str), record["last_activity"])
+            )
+            conn.commit()
+
+    def touch(self, session_id: str, last_activity: float):
+        with self._connect() as conn:
+            # max(): a slower worker must not move the activity time backwards
+            conn.execute(
+                "UPDATE session_state SET last_activity = max(last_activity, ?) WHERE session_id = ?",
+                (last_activity, session_id)
+            )
+            conn.commit()
+
+    def delete_session(self, session_id: str):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM session_state WHERE session_id = ?", (session_id,))
+            conn.commit()
+
+    def expired_sessions(self, cutoff: float) -> List[dict]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT record, last_activity FROM session_state WHERE last_activity < ?", (cutoff,)
+            ).fetchall()
+        return [{**json.loads(record), "last_activity": last_activity} for record, last_activity in rows]
+
+    def put_document(self, document_id: str, state: bytes):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO document_state (document_id, state, updated_at) VALUES (?, ?, ?)",
+                (document_id, sqlite3.Binary(state), time.time())
+            )
+            conn.commit()
+
+    def get_document(self, document_id: str) -> Optional[bytes]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT state FROM document_state WHERE document_id = ?", (document_id,)).fetchone()
+        return bytes(row[0]) if row is not None else None
+
+    def delete_document(self, document_id: str):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM document_state WHERE document_id = ?", (document_id,))
+            conn.commit()
+
+
+class RedisSessionStore(SessionStore):
+    """
+    Shared store for multi-node deployments. Session records are JSON strings with
+    a sorted set of last-activity times for expiry sweeps; document state is a
+    binary value. Needs the `redis` package.
+    """
+
+    shared = True
+
+    def __init__(self, url: str, prefix: str = "claridoc"):
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError("session_store='redis' requires the redis package (pip install redis)") from e
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def _session_key(self, session_id: str) -> str:
+        return f"{self.prefix}:session:{session_id}"
+
+    def _document_key(self, document_id: str) -> str:
+        return f"{self.prefix}:document:{document_id}"
+
+    @property
+    def _activity_key(self) -> str:
+        return f"{self.prefix}:session_activity"
+
+    def get_session(self, session_id: str) -> Optional[dict]:
+        pipe = self.client.pipeline()
+        pipe.get(self._session_key(session_id))
+        pipe.zscore(self._activity_key, session_id)
+        raw, last_activity = pipe.execute()
+        if raw is None:
+            return None
+        record = json.loads(raw)
+        if last_activity is not None:
+            record["last_activity"] = last_activity
+        return record
+
+    def put_session(self, record: dict):
+        pipe = self.client.pipeline()
+        pipe.set(self._session_key(record["session_id"]), json.dumps(record, default=str))
+        pipe.zadd(self._activity_key, {record["session_id"]: record["last_activity"]})
+        pipe.execute()
+
+    def touch(self, session_id: str, last_activity: float):
+        # GT: a slower worker must not move the activity time backwards
+        self.client.zadd(self._activity_key, {session_id: last_activity}, xx=True, gt=True)
+
+    def delete_session(self, session_id: str):
+        pipe = self.client.pipeline()
+        pipe.delete(self._session_key(session_id))
+        pipe.zrem(self._activity_key, session_id)
+        pipe.execute()
+
+    def expired_sessions(self, cutoff: float) -> List[dict]:
+        expired = []
+        for session_id in self.client.zrangebyscore(self._activity_key, "-inf", f"({cutoff}"):
+            record = self.get_session(session_id.decode("utf-8"))
+            if record is not None:
+                expired.append(record)
+        return expired
+
+    def put_document(self, document_id: str, state: bytes):
+        self.client.set(self._document_key(document_id), state)
+
+    def get_document(self, document_id: str) -> Optional[bytes]:
+        return self.client.get(self._document_key(document_id))
+
+    def delete_document(self, document_id: str):
+        self.client.delete(self._document_key(document_id))
+
+
+# Global session store (one per process, selected by settings.session_store)
+_session_store: Optional[SessionStore] = None
+_session_store_lock = threading.Lock()
+
+
+def get_session_store() -> SessionStore:
+    global _session_store
+    with _session_store_lock:
+        if _session_store is None:
+            settings = get_settings()
+            if settings.session_store == "sqlite":
+                _session_store = SQLiteSessionStore(settings.database_path)
+            elif settings.session_store == "redis":
+                _session_store = RedisSessionStore(settings.session_store_url or "redis://localhost:6379/0")
+            elif settings.session_store == "local":
+                _session_store = LocalSessionStore()
+            else:
+                raise ValueError(f"Unknown session_store '{settings.session_store}' (use 'local', 'sqlite' or 'redis')")
+            print(f"[SessionStore] Using {type(_session_store).__name__}")
+        return _session_store
@@ -1,10 +1,107 @@
+import asyncio
 import os
+import threading
+from typing import Dict, List, Optional
+import numpy as np
 from dotenv import load_dotenv
 from pinecone import Pinecone
 from pinecone import ServerlessSpec
 from langchain_pinecone import PineconeVectorStore
+from langchain_core.documents import Document
 from datetime import datetime
 from uuid import uuid4
+from app.config.config import get_settings
+from app.utils.metadata_utils import MetadataService
+
+MEMORY_INDEX_NAME = "memory"
+
+# In-memory stores by namespace (vector_store_provider="memory"), so library queries can find them
+_memory_stores: Dict[str, "MemoryVectorStore"] = {}
+_memory_stores_lock = threading.Lock()
+
+
+def get_memory_store(namespace: str) -> Optional["MemoryVectorStore"]:
+    with _memory_stores_lock:
+        return _memory_stores.get(namespace)
+
+
+def open_vector_store(index_name: str, namespace: str, embedding):
+    """
+    Vector store of an already indexed document. None for an in-memory store this
+    process does not hold (they are process-local; see MemoryVectorStore.from_vectors).
+    """
+    if index_name == MEMORY_INDEX_NAME:
+        return get_memory_store(namespace)
+    return PineconeVectorStore(index_name=index_name, embedding=embedding, namespace=namespace)
+
+
+class MemoryVectorStore:
+    """
+    Offline stand-in for PineconeVectorStore (vector_store_provider="memory").
+
+    Brute-force cosine search over a numpy matrix with the same call surface the
+    Retriever uses, Pinecone-style dict filters evaluated locally. Contents live
+    for the life of the process.
+    """
+
+    def __init__(self, embedding):
+        self.embedding = embedding
+        self.documents: List[Document] = []
+        self.vectors: Optional[np.ndarray] = None
+
+    def add_vectors(self, documents: List[Document], vectors: List[List[float]]):
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.where(norms == 0, 1, norms)
+        self.vectors = matrix if self.vectors is None else np.vstack([self.vectors, matrix])
+        self.documents.extend(documents)
+
+    def add_documents(self, documents: List[Document]):
+        self.add_vectors(documents, self.embedding.embed_documents([d.page_content for d in documents]))
+
+    def _register(self, namespace: str) -> "MemoryVectorStore":
+        with _memory_stores_lock:
+            _memory_stores[namespace] = self
+        return self
+
+    @classmethod
+    def from_documents(cls, documents: List[Document], embedding, namespace: str) -> "MemoryVectorStore":
+        store = cls(embedding)
+        store.add_documents(documents)
+        return store._register(namespace)
+
+    @classmethod
+    async def afrom_documents(cls, documents: List[Document], embedding, namespace: str) -> "MemoryVectorStore":
+        store = cls(embedding)
+        store.add_vectors(documents, await embedding.aembed_documents([d.page_content for d in documents]))
+        return store._register(namespace)
+
+    @classmethod
+    def from_vectors(cls, documents: List[Document], vectors: np.ndarray, embedding, namespace: str) -> "MemoryVectorStore":
+        """Rebuild a store from exported vectors, e.g. in another worker process."""
+        store = cls(embedding)
+        store.add_vectors(documents, vectors)
+        return store._register(namespace)
+
+    def similarity_search_by_vector_with_score(self, embedding, k: int = 4, filter: Optional[dict] = None, namespace=None):
+        if self.vectors is None:
+            return []
+        query = np.asarray(embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1)
+        scores = self.vectors @ query
+        rows = [i for i in np.argsort(-scores) if not filter or MetadataService.matches_filter(self.documents[i].metadata, filter)]
+        return [(self.documents[i], float(scores[i])) for i in rows[:k]]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: Optional[dict] = None, namespace=None):
+        return self.similarity_search_by_vector_with_score(self.embedding.embed_query(query), k=k, filter=filter)
+
+    async def asimilarity_search_by_vector_with_score(self, embedding, k: int = 4, filter: Optional[dict] = None, namespace=None):
+        return self.similarity_search_by_vector_with_score(embedding, k=k, filter=filter)
+
+    async def asimilarity_search_with_score(self, query: str, k: int = 4, filter: Optional[dict] = None, namespace=None):
+        return self.similarity_search_by_vector_with_score(await self.embedding.aembed_query(query), k=k, filter=filter)
+
+
 class VectorStore:
     def __init__(self, text_chunks, embedding_model):
         self.text_chunks = text_chunks
@@ -12,14 +109,16 @@ class VectorStore:
         self.embedding_model = embedding_model
         # self.index, self.namespace, self.retriever = self.create_vectorestore()
 
-    def create_vectorestore(self):
+    def _prepare_index(self):
         load_dotenv()
         pinecone_key = os.getenv("PINECONE_API_KEY")
         pc = Pinecone(api_key=pinecone_key)
         # pc._vector_api.api_client.pool_threads = 1  
         time_string = self.current_time.strftime("%Y-%m-%d-%H-%M")
         index_name = "rag-project"
-        namespace = f"rag-project{time_string}"
+        self.index_name = index_name
+        # minute resolution alone would put two uploads of the same minute in one namespace
+        namespace = f"rag-project{time_string}-{uuid4().hex[:8]}"
         if not pc.has_index(index_name):
             pc.create_index(
                 name=index_name,
@@ -29,6 +128,17 @@ class VectorStore:
             )
 
         index = pc.Index(index_name)
+        return index, index_name, namespace
+
+    def _memory_namespace(self) -> str:
+        self.index_name = MEMORY_INDEX_NAME
+        return f"memory-{self.current_time.strftime('%Y-%m-%d-%H-%M')}-{uuid4().hex[:8]}"
+
+    def create_vectorestore(self):
+        if get_settings().vector_store_provider == "memory":
+            namespace = self._memory_namespace()
+            return None, namespace, MemoryVectorStore.from_documents(self.text_chunks, self.embedding_model, namespace)
+        index, index_name, namespace = self._prepare_index()
         # model_loader = ModelLoader(model_provider="openai")
         # embedding_model = model_loader.load_llm()
         uuids = [str(uuid4()) for _ in range(len(self.text_chunks)) ]
@@ -48,4 +158,11 @@ class VectorStore:
 
         return index, namespace, vector_store
 
-
+    async def acreate_vectorestore(self):
+        """Async create_vectorestore(): index setup runs in a thread, the upsert uses the store's async path."""
+        if get_settings().vector_store_provider == "memory":
+            namespace = self._memory_namespace()
+            return None, namespace, await MemoryVectorStore.afrom_documents(self.text_chunks, self.embedding_model, namespace)
+        index, index_name, namespace = await asyncio.to_thread(self._prepare_index)
+        vector_store = await PineconeVectorStore.afrom_documents(documents=self.text_chunks, index_name=index_name, embedding=self.embedding_model, namespace = namespace)
+        return index, namespace, vector_store
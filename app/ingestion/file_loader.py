@@ -6,21 +6,16 @@ from app.schemas.request_models import DocumentTypeSchema
 from langchain_core.documents import Document
 from typing import List
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import PydanticOutputParser
-from app.schemas.request_models import  DocumentTypeSchema
+from langchain_core.exceptions import OutputParserException
+from app.config.config import get_settings
+from app.utils.chain_cache import chain_cache, format_instructions
 
-class FileLoader:
-    def __init__(self, llm=None):
-        self.llm = llm
 
-    def detect_document_type(self, documents: List[Document]) -> DocumentTypeSchema:
-        """Detect the genre of document by reading first 2 page content by llm."""
-        
-        document_content = " ".join([doc.page_content for doc in documents])
-        parser = PydanticOutputParser(pydantic_object=DocumentTypeSchema)
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", "You are a legal/HR/financial document classifier."),
-            ("human", """
+def _classification_prompt(schema, native: bool) -> ChatPromptTemplate:
+    """Document-type prompt; format instructions are bound once (and dropped for native structured output)."""
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", "You are a legal/HR/financial document classifier."),
+        ("human", """
             You will be given the first 2 pages of a document. 
             Classify it into one of the following categories:
             - HR/Employment
@@ -36,12 +31,32 @@ class FileLoader:
             Document content:
             {document_content}
             """),
-        ])
-        chain = prompt | self.llm | parser
-        result: DocumentTypeSchema = chain.invoke({
-            "document_content": document_content,
-            "format_instructions": parser.get_format_instructions()
-        })
+    ])
+    return prompt.partial(format_instructions="" if native else format_instructions(schema))
+
+
+class FileLoader:
+    def __init__(self, llm=None, fallback_llm=None):
+        self.llm = llm
+        self.fallback_llm = fallback_llm  # retried when the classification does not parse or validate
+
+    def detect_document_type(self, documents: List[Document]) -> DocumentTypeSchema:
+        """Detect the genre of document by reading first 2 page content by llm."""
+        
+        document_content = " ".join([doc.page_content for doc in documents])
+        native = get_settings().structured_output_mode == "native"
+        inputs = {"document_content": document_content}
+        try:
+            result: DocumentTypeSchema = chain_cache.chain(
+                "classification", DocumentTypeSchema, self.llm, _classification_prompt, native
+            ).invoke(inputs)
+        except OutputParserException:
+            if self.fallback_llm is None:
+                raise
+            print("[FileLoader] classification did not parse, escalating to fallback model")
+            result = chain_cache.chain(
+                "classification", DocumentTypeSchema, self.fallback_llm, _classification_prompt, native
+            ).invoke(inputs)
         return result
 
     def load_documents_from_url(self, url: str) -> List[Document]:
@@ -5,14 +5,15 @@ from typing import List, Dict
 import os 
 import json
 from app.utils.metadata_utils import MetadataService
+from app.retrieval.chunk_store import ChunkStore
 from app.metadata_extraction.metadata_ext import MetadataExtractor
 from pydantic import BaseModel
 from typing import Type
 from app.utils.metadata_utils import MetadataService
 class splitting_text:
-    def __init__(self, documentTypeSchema:Type[BaseModel], llm=None, embedding_model=None):
+    def __init__(self, documentTypeSchema:Type[BaseModel], llm=None, embedding_model=None, fallback_llm=None):
         self.llm = llm 
-        self.metadata_extractor = MetadataExtractor(llm = self.llm)
+        self.metadata_extractor = MetadataExtractor(llm = self.llm, fallback_llm = fallback_llm)
         self.metadata_services = MetadataService()
         self.documentTypeSchema = documentTypeSchema
         self.Keywordsfile_path = None
@@ -24,11 +25,12 @@ class splitting_text:
         text = " ".join(text.split())
         return text
 
-    def text_splitting(self, doc: List[Document]) -> List[Document]:
+    def text_splitting(self, doc: List[Document]) -> ChunkStore:
         """Split document into chunks for processing"""
 
-        all_chunks = []
-        splitter = RecursiveCharacterTextSplitter(chunk_size=800, chunk_overlap=100)
+        page_texts, page_metadata, spans = [], [], []
+        # start_index lets the context assembler merge the 100-char overlap of adjacent chunks
+        splitter = RecursiveCharacterTextSplitter(chunk_size=800, chunk_overlap=100, add_start_index=True)
         for i, page in enumerate(doc): 
                     # reset per page
             try:
@@ -85,22 +87,31 @@ class splitting_text:
 
             if text.strip():
                 uuid = str(uuid4())
-                temp_doc = Document(
-                    page_content=text,
-                    metadata={
-                        **page.metadata,
-                        **extracted_metadata,
-                        "page_no": i,
-                        "doc_id": uuid,
-                        "chunk_id": f"{uuid}_p{i}",
-                        "type": "text"
-                    }
-                )
-                chunks = splitter.split_documents([temp_doc])
-                print(type(f"Type of chunks is: {chunks}"))
-                all_chunks.extend(chunks)
+                page_texts.append(text)
+                # kept once per page; the store adds the per-chunk id, offsets and token count
+                page_metadata.append({
+                    **page.metadata,
+                    **extracted_metadata,
+                    "page_no": i,
+                    "doc_id": uuid,
+                    "chunk_id": f"{uuid}_p{i}",
+                    "type": "text"
+                })
+                page_spans = []
+                for piece in splitter.create_documents([text]):
+                    start = piece.metadata["start_index"]
+                    if start < 0:
+                        # offset unknown to the splitter; locate the chunk in its page
+                        start = text.find(piece.page_content)
+                    if start < 0:
+                        # offsets are the only copy of located chunks; keep this one's text
+                        print(f"[TextSplitter] chunk not found in page {i}; stored inline without offsets")
+                        page_spans.append(piece.page_content)
+                        continue
+                    page_spans.append((start, start + len(piece.page_content)))
+                spans.append(page_spans)
 
 
-        return all_chunks
+        return ChunkStore.from_pages(page_texts, page_metadata, spans)
     
 
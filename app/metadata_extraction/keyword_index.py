@@ -0,0 +1,197 @@
+import json
+import re
+from collections import deque
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from app.utils.token_utils import estimate_tokens
+
+# fields that are never turned into Pinecone filters
+SKIP_FILTER_FIELDS = {"obligations", "exclusions", "notes", "added_new_keyword"}
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase, replace punctuation with spaces and collapse whitespace."""
+    return " ".join(re.sub(r"[^\w]+", " ", text.lower()).split())
+
+
+class AhoCorasick:
+    """Multi-pattern exact matcher; finds every pattern occurrence in one pass over the text."""
+
+    def __init__(self, patterns: List[str]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.output: List[List[int]] = [[]]
+        self.patterns = patterns
+        for pattern_id, pattern in enumerate(patterns):
+            state = 0
+            for ch in pattern:
+                nxt = self.goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[state][ch] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                state = nxt
+            self.output[state].append(pattern_id)
+        self._build_failure_links()
+
+    def _build_failure_links(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                fallback = self.fail[state]
+                while fallback and ch not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[nxt] = self.goto[fallback].get(ch, 0)
+                self.output[nxt] = self.output[nxt] + self.output[self.fail[nxt]]
+
+    def find(self, text: str) -> List[Tuple[int, int]]:
+        """Return (pattern id, end index exclusive) for every match."""
+        matches = []
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(ch, 0)
+            for pattern_id in self.output[state]:
+                matches.append((pattern_id, i + 1))
+        return matches
+
+
+class KeywordIndex:
+    """
+    Index over a document's known-keyword vocabulary for building query filters locally.
+
+    Exact keyword mentions are found with an Aho-Corasick automaton; otherwise the
+    query embedding is compared against cached, L2-normalised keyword embeddings.
+    """
+
+    def __init__(self, known_keywords: Dict[str, list], embedding_model=None, similarity_threshold: float = 0.75,
+                 embeddings: Optional[np.ndarray] = None):
+        self.similarity_threshold = similarity_threshold
+        self.embedding_model = embedding_model
+        self.fields: List[str] = []
+        self.keywords: List[str] = []
+        for field, values in known_keywords.items():
+            if field in SKIP_FILTER_FIELDS or not isinstance(values, list):
+                continue
+            for value in values:
+                if isinstance(value, str) and normalize_text(value):
+                    self.fields.append(field)
+                    self.keywords.append(value)
+
+        normalized = [normalize_text(k) for k in self.keywords]
+        self.matcher = AhoCorasick(normalized)
+        self._pattern_lengths = [len(p) for p in normalized]
+        # previously computed keyword embeddings (e.g. restored from a session spill file)
+        self._embeddings: Optional[np.ndarray] = embeddings if embeddings is not None and len(embeddings) == len(self.keywords) else None
+
+    @property
+    def embeddings(self) -> np.ndarray:
+        """Keyword embedding matrix (n_keywords x dim), computed once on first use."""
+        if self._embeddings is None:
+            if not self.keywords or self.embedding_model is None:
+                self._embeddings = np.zeros((0, 0), dtype=np.float32)
+            else:
+                vectors = np.asarray(self.embedding_model.embed_documents(self.keywords), dtype=np.float32)
+                norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+                self._embeddings = vectors / np.where(norms == 0, 1, norms)
+        return self._embeddings
+
+    def computed_embeddings(self) -> Optional[np.ndarray]:
+        """The keyword embedding matrix if it has been computed, without computing it."""
+        return self._embeddings
+
+    def similarities(self, query_embedding) -> np.ndarray:
+        """Cosine similarity of the query against every keyword."""
+        matrix = self.embeddings
+        if matrix.size == 0:
+            return np.zeros(len(self.keywords), dtype=np.float32)
+        q = np.asarray(query_embedding, dtype=np.float32)
+        q = q / (np.linalg.norm(q) or 1.0)
+        return matrix @ q
+
+    def exact_matches(self, query: str) -> Set[int]:
+        """Keyword positions whose normalised text appears as whole words in the query."""
+        text = normalize_text(query)
+        found = set()
+        for pattern_id, end in self.matcher.find(text):
+            start = end - self._pattern_lengths[pattern_id]
+            if (start == 0 or text[start - 1] == " ") and (end == len(text) or text[end] == " "):
+                found.add(pattern_id)
+        return found
+
+    def build_filter(self, query: str, query_embedding=None) -> Optional[Dict[str, List[str]]]:
+        """
+        Build the query metadata dict ({field: [keywords]}) without an LLM.
+
+        Returns None when nothing matches confidently, so the caller can fall back
+        to LLM extraction.
+        """
+        selected = self.exact_matches(query)
+        if not selected and query_embedding is not None and self.keywords:
+            sims = self.similarities(query_embedding)
+            best = int(np.argmax(sims))
+            if sims[best] >= self.similarity_threshold:
+                selected = {best}
+        if not selected:
+            return None
+
+        metadata: Dict[str, List[str]] = {}
+        for idx in sorted(selected):
+            values = metadata.setdefault(self.fields[idx], [])
+            if self.keywords[idx] not in values:
+                values.append(self.keywords[idx])
+        return metadata
+
+    def prune(self, query_embedding, known_keywords: Dict[str, list], top_n: int = 8, token_budget: int = 400) -> Dict[str, list]:
+        """
+        Keep, per field, only the top_n keywords most similar to the query, then drop the
+        least similar ones until the compact JSON fits the token budget.
+
+        Fields that are not indexed (e.g. exclusions) are passed through as empty lists
+        so the LLM still sees every field name.
+        """
+        pruned: Dict[str, list] = {field: [] for field in known_keywords if field != "added_new_keyword"}
+        if not self.keywords:
+            return pruned
+        sims = self.similarities(query_embedding)
+        fields = np.asarray(self.fields)
+
+        selected = []
+        for field in pruned:
+            idx = np.flatnonzero(fields == field)
+            if idx.size:
+                selected.extend(idx[np.argsort(-sims[idx], kind="stable")[:top_n]].tolist())
+        # most similar first, so the budget trims the weakest keywords
+        selected.sort(key=lambda i: -sims[i])
+
+        used = estimate_tokens(json.dumps(pruned, separators=(",", ":")))
+        for i in selected:
+            cost = estimate_tokens(json.dumps(self.keywords[i])) + 1
+            if used + cost > token_budget:
+                break
+            pruned[self.fields[i]].append(self.keywords[i])
+            used += cost
+        return pruned
+
+
+def filter_agreement(a: Optional[dict], b: Optional[dict]) -> float:
+    """Jaccard agreement between two metadata dicts over their (field, value) pairs."""
+    def pairs(d):
+        out = set()
+        for field, values in (d or {}).items():
+            if field in SKIP_FILTER_FIELDS:
+                continue
+            for v in values if isinstance(values, list) else [values]:
+                out.add((field, str(v).lower()))
+        return out
+    pa, pb = pairs(a), pairs(b)
+    if not pa and not pb:
+        return 1.0
+    return len(pa & pb) / len(pa | pb)
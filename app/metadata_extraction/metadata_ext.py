@@ -1,27 +1,23 @@
 import json
 from langchain_core.exceptions import OutputParserException
 from langchain_core.documents import Document
-from langchain_core.output_parsers import PydanticOutputParser
 from langchain_core.prompts import ChatPromptTemplate
 from typing import Type
 from pydantic import BaseModel
+from app.config.config import get_settings
+from app.utils.chain_cache import chain_cache, schema_json
 # wrap parser with fixer once
 # pydantic_parser = PydanticOutputParser(pydantic_object=InsuranceMetadata)
 # fixing_parser = OutputFixingParser.from_llm(llm=llm, parser=pydantic_parser) 
 
 
-class MetadataExtractor:
-    def __init__(self, llm = None):
-        self.llm = llm
-
-    def extractMetadata_query(self, metadata_class : Type[BaseModel],document: Document, known_keywords: dict) -> BaseModel:
-        parser = PydanticOutputParser(pydantic_object=metadata_class)
+# Prompt texts; the schema block is left out when the model returns structured output natively
+_SCHEMA_BLOCK = """            Schema you must follow:
+            {schema}
 
-        schema_str = json.dumps(metadata_class.model_json_schema(), indent=2)
-        keywords_str = json.dumps(known_keywords, indent=2)
+"""
 
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", """You are an information extraction system. 
+_QUERY_SYSTEM_PROMPT = ("""You are an information extraction system. 
             Extract only the required metadata from the user query using the existing known keywords. 
 
             ⚠️ CRITICAL FORMATTING RULES:
@@ -40,35 +36,11 @@ class MetadataExtractor:
             - In that case, set added_new_keyword=true.
             - Do not include raw paragraphs in the output.
              
-            Schema you must follow:
-            {schema}
-
-            Existing Keywords:
+""", """            Existing Keywords:
             {keywords}
-            """),
-            ("human", "Text:\n{document_content}")
-        ])
-        chain = prompt | self.llm | parser
+            """)
 
-        try:
-            result = chain.invoke({
-                "schema": schema_str,
-                "keywords": keywords_str,
-                "document_content": document.page_content
-            })
-            return result
-        except OutputParserException as e:
-            print(f"⚠️ Parser failed on doc {document.metadata.get('source')} | error: {e}")
-            return metadata_class(added_new_keyword=False)
-    
-    def extractMetadata(self, metadata_class : Type[BaseModel], document: Document, known_keywords: dict = None) -> BaseModel:
-        parser = PydanticOutputParser(pydantic_object=metadata_class)
-
-        schema_str = json.dumps(metadata_class.model_json_schema(), indent=2)
-        # keywords_str = json.dumps(known_keywords, indent=2)
-
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", """You are an information extraction system. 
+_PAGE_SYSTEM_PROMPT = ("""You are an information extraction system. 
             Extract only the required metadata from the text according to schema given below. 
 
             ⚠️ CRITICAL FORMATTING RULES:
@@ -83,30 +55,87 @@ class MetadataExtractor:
             - Do not include raw paragraphs in the output.
             - always keep added_new_keyword as True. 
             
-            Schema you must follow:
-            {schema}
+""", """            
+            """)
 
-            
-            """),
-            ("human", "Text:\n{document_content}")
-        ])
-        # - Instead, extract only concise normalized keywords (2–5 words max each).
-        #     - Use existing keywords if they already exist in the provided list.
-        #     - Prefer to reuse existing keywords if they are semantically the same.  
-        #     - If you find a new keyword that is a **sub-type** or **more specific variant** of an existing one, keep both:  
-        #     *reuse the closest match from existing keywords*, and also add the new one.  
-        #     - In that case, set `added_new_keyword=true`.
-        # Existing Keywords:
-            # {keywords}
-        
-        chain = prompt | self.llm | parser
 
+def _extraction_prompt(system: tuple, schema: Type[BaseModel], native: bool) -> ChatPromptTemplate:
+    head, tail = system
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", head + ("" if native else _SCHEMA_BLOCK) + tail),
+        ("human", "Text:\n{document_content}")
+    ])
+    return prompt if native else prompt.partial(schema=schema_json(schema))
+
+
+def _query_prompt(schema: Type[BaseModel], native: bool) -> ChatPromptTemplate:
+    return _extraction_prompt(_QUERY_SYSTEM_PROMPT, schema, native)
+
+
+def _page_prompt(schema: Type[BaseModel], native: bool) -> ChatPromptTemplate:
+    return _extraction_prompt(_PAGE_SYSTEM_PROMPT, schema, native)
+
+
+class MetadataExtractor:
+    def __init__(self, llm = None, fallback_llm = None):
+        self.llm = llm
+        # stronger model retried when the primary's output fails to parse or validate
+        # (chain_cache chains raise both as OutputParserException); an empty extraction
+        # is a valid answer, since many pages carry no metadata
+        self.fallback_llm = fallback_llm
+        # prompts, parsers and chains come compiled from chain_cache, keyed by task and schema class
+        self.native = get_settings().structured_output_mode == "native"
+
+    def _invoke_with_escalation(self, build_chain, inputs: dict):
+        """Invoke with the primary model; escalate to fallback_llm on a parse or validation failure."""
+        try:
+            return build_chain(self.llm).invoke(inputs)
+        except OutputParserException:
+            if self.fallback_llm is None:
+                raise
+            print("[MetadataExtractor] escalating to fallback model (parse or validation failure)")
+        return build_chain(self.fallback_llm).invoke(inputs)
+
+    async def _ainvoke_with_escalation(self, build_chain, inputs: dict):
+        try:
+            return await build_chain(self.llm).ainvoke(inputs)
+        except OutputParserException:
+            if self.fallback_llm is None:
+                raise
+            print("[MetadataExtractor] escalating to fallback model (parse or validation failure)")
+        return await build_chain(self.fallback_llm).ainvoke(inputs)
+
+    def _query_chain(self, metadata_class : Type[BaseModel], document: Document, known_keywords: dict):
+        """Chain builder (llm -> chain) and inputs for query metadata extraction, shared by the sync and async paths."""
+        keywords_str = json.dumps(known_keywords, separators=(",", ":"))
+        return (lambda llm: chain_cache.chain("query_metadata", metadata_class, llm, _query_prompt, self.native)), {
+            "keywords": keywords_str,
+            "document_content": document.page_content
+        }
+
+    def extractMetadata_query(self, metadata_class : Type[BaseModel],document: Document, known_keywords: dict) -> BaseModel:
+        build_chain, inputs = self._query_chain(metadata_class, document, known_keywords)
+        try:
+            result = self._invoke_with_escalation(build_chain, inputs)
+            return result
+        except OutputParserException as e:
+            print(f"⚠️ Parser failed on doc {document.metadata.get('source')} | error: {e}")
+            return metadata_class(added_new_keyword=False)
+
+    async def aextractMetadata_query(self, metadata_class : Type[BaseModel],document: Document, known_keywords: dict) -> BaseModel:
+        build_chain, inputs = self._query_chain(metadata_class, document, known_keywords)
+        try:
+            return await self._ainvoke_with_escalation(build_chain, inputs)
+        except OutputParserException as e:
+            print(f"⚠️ Parser failed on doc {document.metadata.get('source')} | error: {e}")
+            return metadata_class(added_new_keyword=False)
+    
+    def extractMetadata(self, metadata_class : Type[BaseModel], document: Document, known_keywords: dict = None) -> BaseModel:
         try:
-            result = chain.invoke({
-                "schema": schema_str,
-                # "keywords": keywords_str,
-                "document_content": document.page_content
-            })
+            result = self._invoke_with_escalation(
+                lambda llm: chain_cache.chain("page_metadata", metadata_class, llm, _page_prompt, self.native),
+                {"document_content": document.page_content}
+            )
             return result
         except OutputParserException as e:
             print(f"⚠️ Parser failed on doc {document.metadata.get('source')} | error: {e}")
@@ -1,4 +1,5 @@
 from app.schemas.request_models import QuerySpec, LogicResult
+from app.utils.chain_cache import chain_cache
 
 
 def evaluate_with_llm(raw_query: str, top_clauses: list, llm):
@@ -38,7 +39,7 @@ def evaluate_with_llm(raw_query: str, top_clauses: list, llm):
         """
 
     # Directly parse to LogicResult using structured output
-    structured_llm = llm.with_structured_output(LogicResult)
+    structured_llm = chain_cache.structured_llm(llm, LogicResult)
     result: LogicResult = structured_llm.invoke(prompt)
     # print(f"result: {result}\n result_type{type(result)}")
 
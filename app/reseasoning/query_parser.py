@@ -1,13 +1,14 @@
 from app.utils.model_loader import ModelLoader
 from app.schemas.request_models import QuerySpec
 from app.prompts.prompts import PARSER_PROMPT
+from app.utils.chain_cache import chain_cache
 
 def parsing_query(query:str, llm) -> QuerySpec:
     # Bind the schema to the model
     # model_loader = ModelLoader(model_provider = "gemini")
     # llm = model_loader.load_llm()
 
-    structured_llm = llm.with_structured_output(QuerySpec)
+    structured_llm = chain_cache.structured_llm(llm, QuerySpec)
 
     # Compose the full prompt with instructions and user question
     full_prompt = PARSER_PROMPT + "\n" + query
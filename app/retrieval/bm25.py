@@ -0,0 +1,175 @@
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict, Field
+
+
+def default_preprocessing_func(text: str) -> List[str]:
+    """Same whitespace tokenizer used by langchain's BM25Retriever."""
+    return text.split()
+
+
+class BM25Index:
+    """
+    BM25 (Okapi / ATIRE idf) index backed by a term-major CSR matrix.
+
+    The per-(term, doc) BM25 weight is fully precomputed at index time, so a query
+    only has to sum the postings of its own terms and pick the top-k with
+    argpartition. Scores are identical to rank_bm25.BM25Okapi; equal scores are
+    ordered by document index, lowest first (rank_bm25's get_top_n leaves tie
+    order to an unstable argsort).
+    """
+
+    def __init__(self, tokenized_corpus: List[List[str]], k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25):
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        self.corpus_size = len(tokenized_corpus)
+        self.vocab: Dict[str, int] = {}
+
+        rows, cols, tfs = [], [], []
+        doc_len = np.zeros(self.corpus_size, dtype=np.float64)
+        for doc_idx, tokens in enumerate(tokenized_corpus):
+            doc_len[doc_idx] = len(tokens)
+            for token, tf in Counter(tokens).items():
+                term_id = self.vocab.setdefault(token, len(self.vocab))
+                rows.append(term_id)
+                cols.append(doc_idx)
+                tfs.append(tf)
+
+        self.doc_len = doc_len
+        self.avgdl = float(doc_len.sum() / self.corpus_size) if self.corpus_size else 0.0
+
+        term_ids = np.asarray(rows, dtype=np.int64)
+        doc_ids = np.asarray(cols, dtype=np.int32)
+        tf = np.asarray(tfs, dtype=np.float64)
+
+        # document frequency per term -> idf with rank_bm25's epsilon floor
+        df = np.bincount(term_ids, minlength=len(self.vocab)).astype(np.float64)
+        idf = np.log(self.corpus_size - df + 0.5) - np.log(df + 0.5)
+        self.average_idf = float(idf.mean()) if idf.size else 0.0
+        idf[idf < 0] = self.epsilon * self.average_idf
+        self.idf = idf
+
+        norm = self.k1 * (1 - self.b + self.b * doc_len / self.avgdl) if self.avgdl else np.full_like(doc_len, self.k1)
+        weights = idf[term_ids] * (tf * (self.k1 + 1) / (tf + norm[doc_ids]))
+
+        self.matrix = sparse.csr_matrix(
+            (weights, (term_ids, doc_ids)),
+            shape=(len(self.vocab), self.corpus_size),
+        )
+        self.matrix.sum_duplicates()
+
+    @classmethod
+    def from_texts(cls, texts: Iterable[str], preprocess_func: Callable[[str], List[str]] = default_preprocessing_func, **bm25_params) -> "BM25Index":
+        return cls([preprocess_func(t) for t in texts], **bm25_params)
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """Plain arrays for np.savez; `from_arrays` restores the index without re-tokenizing."""
+        terms = sorted(self.vocab, key=self.vocab.get)
+        return {
+            "terms": np.asarray(terms, dtype=str),
+            "data": self.matrix.data, "indices": self.matrix.indices, "indptr": self.matrix.indptr,
+            "idf": self.idf, "doc_len": self.doc_len,
+            "params": np.asarray([self.k1, self.b, self.epsilon, self.average_idf], dtype=np.float64),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> "BM25Index":
+        index = cls.__new__(cls)
+        index.k1, index.b, index.epsilon, index.average_idf = (float(v) for v in arrays["params"])
+        terms = arrays["terms"].tolist()
+        index.vocab = {term: term_id for term_id, term in enumerate(terms)}
+        index.doc_len = arrays["doc_len"]
+        index.corpus_size = len(index.doc_len)
+        index.avgdl = float(index.doc_len.sum() / index.corpus_size) if index.corpus_size else 0.0
+        index.idf = arrays["idf"]
+        index.matrix = sparse.csr_matrix(
+            (arrays["data"], arrays["indices"], arrays["indptr"]), shape=(len(terms), index.corpus_size)
+        )
+        return index
+
+    def get_scores(self, query_tokens: List[str]) -> np.ndarray:
+        """BM25 score of every document for the tokenized query."""
+        counts = Counter(t for t in query_tokens if t in self.vocab)
+        if not counts:
+            return np.zeros(self.corpus_size, dtype=np.float64)
+
+        indptr, indices, data = self.matrix.indptr, self.matrix.indices, self.matrix.data
+        doc_parts, weight_parts = [], []
+        for token, count in counts.items():
+            term_id = self.vocab[token]
+            start, end = indptr[term_id], indptr[term_id + 1]
+            doc_parts.append(indices[start:end])
+            weight_parts.append(data[start:end] * count)
+
+        return np.bincount(
+            np.concatenate(doc_parts),
+            weights=np.concatenate(weight_parts),
+            minlength=self.corpus_size,
+        )
+
+    def search(self, query_tokens: List[str], k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (doc indices, scores) of the top-k documents, best first; ties by lowest index."""
+        scores = self.get_scores(query_tokens)
+        k = min(k, self.corpus_size)
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        if k < self.corpus_size:
+            # every doc scoring at least the k-th best, so a tie at the cut keeps the lowest indices
+            kth = -np.partition(-scores, k - 1)[k - 1]
+            top = np.flatnonzero(scores >= kth)
+        else:
+            top = np.arange(self.corpus_size)
+        # score desc, then index asc
+        top = top[np.lexsort((top, -scores[top]))][:k]
+        return top, scores[top]
+
+
+class BM25SparseRetriever(BaseRetriever):
+    """Drop-in replacement for langchain's BM25Retriever using BM25Index."""
+
+    index: Any = None
+    """ Vectorized BM25 index."""
+    docs: Any = Field(repr=False)
+    """ List of documents, or a ChunkStore that builds them on access."""
+    k: int = 4
+    """ Number of documents to return."""
+    preprocess_func: Callable[[str], List[str]] = default_preprocessing_func
+    """ Preprocessing function to use on the text before BM25 vectorization."""
+
+    model_config = ConfigDict(
+        arbitrary_types_allowed=True,
+    )
+
+    @classmethod
+    def from_documents(
+        cls,
+        documents: Iterable[Document],
+        *,
+        bm25_params: Optional[Dict[str, Any]] = None,
+        preprocess_func: Callable[[str], List[str]] = default_preprocessing_func,
+        **kwargs: Any,
+    ) -> "BM25SparseRetriever":
+        docs = list(documents)
+        index = BM25Index.from_texts(
+            (d.page_content for d in docs),
+            preprocess_func=preprocess_func,
+            **(bm25_params or {}),
+        )
+        return cls(index=index, docs=docs, preprocess_func=preprocess_func, **kwargs)
+
+    def search_with_scores(self, query: str, k: Optional[int] = None) -> List[Tuple[Document, float]]:
+        """Top-k documents together with their BM25 scores."""
+        top, scores = self.index.search(self.preprocess_func(query), k or self.k)
+        return [(self.docs[i], float(s)) for i, s in zip(top, scores)]
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return [doc for doc, _ in self.search_with_scores(query)]
@@ -0,0 +1,186 @@
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+
+from app.schemas.request_models import ClauseHit
+from app.utils.token_utils import estimate_tokens
+
+
+class ChunkIndex:
+    """
+    Structural index of a document's chunks, built at ingest time.
+
+    Row i of the parallel arrays describes chunk i in reading order: its parent page
+    row, start/end character offsets within that page and the rows of the previous
+    and next chunk (-1 at the ends). Page texts are stored once, concatenated, and
+    chunk text is sliced out of its page, so the index costs little more than the
+    document text itself. Lookups by chunk id are a dict access plus array reads.
+    A chunk whose offsets could not be found has start = end = -1, keeps its text
+    in `inline` (row -> text) and takes no part in expansion.
+    """
+
+    def __init__(self, chunk_ids: List[str], page: np.ndarray, start: np.ndarray, end: np.ndarray,
+                 page_ids: List[str], page_no: np.ndarray, page_text: str, page_offsets: np.ndarray,
+                 inline: Optional[Dict[int, str]] = None):
+        self.chunk_ids = chunk_ids
+        self.page = page  # parent page row per chunk
+        self.start = start
+        self.end = end
+        self.page_ids = page_ids  # per-page doc_id
+        self.page_no = page_no
+        self.page_text = page_text
+        self.page_offsets = page_offsets  # page row -> [offset, next offset) in page_text
+        self.inline = inline or {}
+        self.rows: Dict[str, int] = {chunk_id: row for row, chunk_id in enumerate(chunk_ids)}
+        n = len(chunk_ids)
+        self.prev = np.arange(-1, n - 1, dtype=np.int32)
+        self.next = np.arange(1, n + 1, dtype=np.int32)
+        if n:
+            self.next[-1] = -1
+
+    @classmethod
+    def from_chunks(cls, chunks: List[Document], pages: List[Document]) -> "ChunkIndex":
+        """Build from the splitter's chunks (in order) and the page documents they were split from."""
+        page_rows = {page.metadata["doc_id"]: row for row, page in enumerate(pages)}
+        texts = [page.page_content for page in pages]
+        page_offsets = np.zeros(len(pages) + 1, dtype=np.int64)
+        page_offsets[1:] = np.cumsum([len(t) for t in texts])
+
+        page, start, end, inline = [], [], [], {}
+        for i, chunk in enumerate(chunks):
+            row = page_rows[chunk.metadata["doc_id"]]
+            s = chunk.metadata.get("start_index", -1)
+            if s is None or s < 0:
+                # offset unknown to the splitter; locate the chunk in its page
+                s = texts[row].find(chunk.page_content)
+            if s < 0:
+                inline[i] = chunk.page_content
+            page.append(row)
+            start.append(s)
+            end.append(s + len(chunk.page_content) if s >= 0 else -1)
+        return cls(
+            chunk_ids=[chunk.metadata["chunk_id"] for chunk in chunks],
+            page=np.asarray(page, dtype=np.int32),
+            start=np.asarray(start, dtype=np.int32),
+            end=np.asarray(end, dtype=np.int32),
+            page_ids=[p.metadata["doc_id"] for p in pages],
+            page_no=np.asarray([p.metadata.get("page_no", i) for i, p in enumerate(pages)], dtype=np.int32),
+            page_text="".join(texts),
+            page_offsets=page_offsets,
+            inline=inline,
+        )
+
+    def __len__(self) -> int:
+        return len(self.chunk_ids)
+
+    def page_content(self, page_row: int) -> str:
+        return self.page_text[self.page_offsets[page_row]:self.page_offsets[page_row + 1]]
+
+    def text(self, row: int) -> str:
+        if self.start[row] < 0:
+            return self.inline.get(row, "")
+        offset = self.page_offsets[self.page[row]]
+        return self.page_text[offset + self.start[row]:offset + self.end[row]]
+
+    def neighbours(self, chunk_id: str, window: int = 1) -> List[int]:
+        """Rows of up to `window` chunks before and after the chunk, on the same page."""
+        row = self.rows.get(chunk_id)
+        if row is None:
+            return []
+        page = self.page[row]
+        rows = []
+        for links in (self.prev, self.next):
+            r = links[row]
+            for _ in range(window):
+                if r < 0 or self.page[r] != page:
+                    break
+                if self.start[r] >= 0:
+                    rows.append(int(r))
+                r = links[r]
+        return sorted(rows)
+
+    def _hit(self, parent: ClauseHit, text: str, start: int, end: int, chunk_id: str) -> ClauseHit:
+        return ClauseHit(
+            doc_id=parent.doc_id,
+            page=parent.page,
+            chunk_id=chunk_id,
+            text=text,
+            metadata={
+                **parent.metadata,
+                "chunk_id": chunk_id,
+                "start_index": start,
+                "end_index": end,
+                "token_count": estimate_tokens(text),
+                "expanded_from": parent.chunk_id,
+            },
+            score=parent.score,
+        )
+
+    def expand_hits(self, hits: List[ClauseHit], mode: str = "neighbours", window: int = 1) -> List[ClauseHit]:
+        """
+        Small-to-big expansion without another retrieval round trip.
+
+        mode="neighbours": each hit is followed by its `window` neighbouring chunks
+        mode="page":       each hit is followed by its whole parent page
+        Hits unknown to the index, or whose offsets are unknown, are passed through unchanged.
+        """
+        if mode not in ("neighbours", "page"):
+            return list(hits)
+        expanded, seen = [], set()
+        for hit in hits:
+            if hit.chunk_id not in seen:
+                seen.add(hit.chunk_id)
+                expanded.append(hit)
+            row = self.rows.get(hit.chunk_id)
+            if row is None or self.start[row] < 0:
+                continue
+            if mode == "page":
+                page_id = f"{self.page_ids[self.page[row]]}_page"
+                if page_id not in seen:
+                    seen.add(page_id)
+                    text = self.page_content(self.page[row])
+                    expanded.append(self._hit(hit, text, 0, len(text), page_id))
+                continue
+            for r in self.neighbours(hit.chunk_id, window):
+                if self.chunk_ids[r] not in seen:
+                    seen.add(self.chunk_ids[r])
+                    expanded.append(self._hit(hit, self.text(r), int(self.start[r]), int(self.end[r]), self.chunk_ids[r]))
+        return expanded
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        return {
+            "chunk_ids": np.asarray(self.chunk_ids, dtype=str),
+            "page": self.page, "start": self.start, "end": self.end,
+            "page_ids": np.asarray(self.page_ids, dtype=str),
+            "page_no": self.page_no,
+            "page_text": np.asarray(self.page_text),
+            "page_offsets": self.page_offsets,
+            "inline_rows": np.asarray(list(self.inline), dtype=np.int32),
+            "inline_text": np.asarray(list(self.inline.values()), dtype=str),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> "ChunkIndex":
+        return cls(
+            chunk_ids=arrays["chunk_ids"].tolist(),
+            page=arrays["page"], start=arrays["start"], end=arrays["end"],
+            page_ids=arrays["page_ids"].tolist(),
+            page_no=arrays["page_no"],
+            page_text=str(arrays["page_text"]),
+            page_offsets=arrays["page_offsets"],
+            # absent from indexes saved before unlocated chunks kept their text
+            inline=dict(zip(arrays["inline_rows"].tolist(), arrays["inline_text"].tolist())) if "inline_rows" in arrays else None,
+        )
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez_compressed(path, **self.to_arrays())
+
+    @classmethod
+    def load(cls, path: str) -> Optional["ChunkIndex"]:
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as data:
+            return cls.from_arrays(data)
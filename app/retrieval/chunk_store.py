@@ -0,0 +1,133 @@
+import json
+import operator
+from collections.abc import Sequence
+from typing import Dict, Iterator, List, Tuple, Union
+
+import numpy as np
+from langchain_core.documents import Document
+
+from app.retrieval.chunk_index import ChunkIndex
+from app.utils.token_utils import estimate_tokens
+
+# per-chunk metadata fields; everything else is shared by the chunks of a page
+_CHUNK_FIELDS = ("chunk_id", "start_index", "end_index", "token_count")
+
+
+class ChunkStore(Sequence):
+    """
+    A document's chunks without a Document (and metadata dict) per chunk.
+
+    Chunk text lives in the ChunkIndex page-text arena as (page, start, end)
+    offsets. Metadata is stored once per page; values that repeat across pages
+    (loader fields such as producer or file_path, extracted keyword lists) are
+    interned so pages share one object. Indexing materialises a LangChain
+    Document with exactly the metadata the splitter used to give each chunk, so
+    the store can stand in for the chunk list (BM25 docs, vector store input);
+    only the chunks a query returns are ever built.
+    """
+
+    def __init__(self, index: ChunkIndex, page_metadata: List[dict]):
+        self.index = index
+        self.page_metadata = _intern_metadata(page_metadata)
+
+    @classmethod
+    def from_pages(cls, texts: List[str], page_metadata: List[dict],
+                   spans: List[List[Union[Tuple[int, int], str]]]) -> "ChunkStore":
+        """
+        Build from page texts, their metadata (incl. doc_id and page_no) and each
+        page's chunk (start, end) offsets. A chunk that could not be located in its
+        page is given as its text instead and kept inline. Chunk j of a page is
+        `{doc_id}_p{page_no}_c{j}`.
+        """
+        page_offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+        page_offsets[1:] = np.cumsum([len(t) for t in texts])
+        chunk_ids, page, start, end, inline = [], [], [], [], {}
+        for row, (meta, page_spans) in enumerate(zip(page_metadata, spans)):
+            for j, span in enumerate(page_spans):
+                if isinstance(span, str):
+                    inline[len(chunk_ids)] = span
+                    s = e = -1
+                else:
+                    s, e = span
+                chunk_ids.append(f"{meta['doc_id']}_p{meta['page_no']}_c{j}")
+                page.append(row)
+                start.append(s)
+                end.append(e)
+        index = ChunkIndex(
+            chunk_ids=chunk_ids,
+            page=np.asarray(page, dtype=np.int32),
+            start=np.asarray(start, dtype=np.int32),
+            end=np.asarray(end, dtype=np.int32),
+            page_ids=[meta["doc_id"] for meta in page_metadata],
+            page_no=np.asarray([meta["page_no"] for meta in page_metadata], dtype=np.int32),
+            page_text="".join(texts),
+            page_offsets=page_offsets,
+            inline=inline,
+        )
+        return cls(index, page_metadata)
+
+    @classmethod
+    def from_chunk_metadata(cls, index: ChunkIndex, metadata: List[dict]) -> "ChunkStore":
+        """Build from per-chunk metadata dicts (state exported before chunks were stored per page)."""
+        page_metadata: List[dict] = [{} for _ in range(len(index.page_ids))]
+        for row, meta in enumerate(metadata):
+            page = int(index.page[row])
+            if not page_metadata[page]:
+                page_metadata[page] = {k: v for k, v in meta.items() if k not in _CHUNK_FIELDS[1:]}
+                page_metadata[page]["chunk_id"] = f"{index.page_ids[page]}_p{int(index.page_no[page])}"
+        return cls(index, page_metadata)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self[i] for i in range(*row.indices(len(self)))]
+        row = operator.index(row)
+        if row < 0:
+            row += len(self)
+        return Document(page_content=self.text(row), metadata=self.metadata(row))
+
+    def __iter__(self) -> Iterator[Document]:
+        return (self[i] for i in range(len(self)))
+
+    @property
+    def chunk_ids(self) -> List[str]:
+        return self.index.chunk_ids
+
+    def text(self, row: int) -> str:
+        return self.index.text(row)
+
+    def texts(self) -> List[str]:
+        return [self.index.text(i) for i in range(len(self))]
+
+    def metadata(self, row: int) -> dict:
+        """A fresh copy of the chunk's metadata (lists are copied, so callers may mutate it)."""
+        start, end = int(self.index.start[row]), int(self.index.end[row])
+        metadata = {k: v.copy() if isinstance(v, (list, dict)) else v for k, v in self.page_metadata[self.index.page[row]].items()}
+        metadata.update(
+            chunk_id=self.index.chunk_ids[row], start_index=start, end_index=end,
+            token_count=estimate_tokens(self.text(row)),
+        )
+        return metadata
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """Per-page metadata as JSON; the chunk index is stored separately (see ChunkIndex.to_arrays)."""
+        return {"page_metadata": np.asarray(json.dumps(self.page_metadata, default=str))}
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray], index: ChunkIndex) -> "ChunkStore":
+        return cls(index, json.loads(str(arrays["page_metadata"])))
+
+
+def _intern_metadata(page_metadata: List[dict]) -> List[dict]:
+    """Make equal metadata values across pages one shared object."""
+    pool: Dict[Tuple[type, str], object] = {}
+
+    def intern(value):
+        if not isinstance(value, (str, list, dict)):
+            return value
+        key = (type(value), json.dumps(value, sort_keys=True, default=str))
+        return pool.setdefault(key, value)
+
+    return [{intern(k): intern(v) for k, v in meta.items()} for meta in page_metadata]
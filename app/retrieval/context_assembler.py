@@ -0,0 +1,118 @@
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from app.schemas.request_models import ClauseHit
+from app.utils.token_utils import estimate_tokens
+
+
+def _shingles(text: str, size: int = 3) -> Set[int]:
+    words = text.lower().split()
+    if len(words) < size:
+        return {hash(" ".join(words))}
+    return {hash(" ".join(words[i:i + size])) for i in range(len(words) - size + 1)}
+
+
+def _span(hit: ClauseHit) -> Optional[Tuple[int, int]]:
+    """(start, end) character offsets of the chunk within its page, if recorded at ingest."""
+    start = hit.metadata.get("start_index")
+    if start is None or start < 0:
+        return None
+    end = hit.metadata.get("end_index")
+    return int(start), int(end if end is not None else start + len(hit.text))
+
+
+def _token_count(hit: ClauseHit) -> int:
+    count = hit.metadata.get("token_count")
+    return int(count) if count is not None else estimate_tokens(hit.text)
+
+
+def _overlap(span: Tuple[int, int], spans: List[Tuple[int, int]]) -> int:
+    start, end = span
+    return sum(max(0, min(end, e) - max(start, s)) for s, e in spans)
+
+
+class ContextAssembler:
+    """
+    Turn ranked retrieval hits into the context block of an answer prompt.
+
+    Hits are taken in relevance order. Near-duplicates (shingle Jaccard above
+    `dedup_threshold`) are dropped, and each hit is charged only for the text that
+    does not overlap chunks already selected from the same page, until
+    `token_budget` is spent. Selected chunks are then grouped per page, ordered by
+    position and merged on their ingest-time offsets so the splitter's overlap is
+    sent once. Pages are emitted in order of their most relevant chunk.
+    """
+
+    def __init__(self, token_budget: int = 1500, dedup_threshold: float = 0.9):
+        self.token_budget = token_budget
+        self.dedup_threshold = dedup_threshold
+
+    def select(self, hits: Sequence[ClauseHit]) -> Tuple[List[ClauseHit], Dict[str, int]]:
+        """Hits that fit the budget, in relevance order, plus selection stats."""
+        selected: List[ClauseHit] = []
+        selected_shingles: List[Set[int]] = []
+        page_spans: Dict[tuple, List[Tuple[int, int]]] = {}
+        used, duplicates, over_budget = 0, 0, 0
+        for hit in hits:
+            shingles = _shingles(hit.text)
+            if any(len(shingles & other) / len(shingles | other) >= self.dedup_threshold for other in selected_shingles):
+                duplicates += 1
+                continue
+            page = (hit.doc_id, hit.page)
+            span = _span(hit)
+            cost = _token_count(hit)
+            if span is not None and span[1] > span[0]:
+                fresh = (span[1] - span[0]) - _overlap(span, page_spans.get(page, []))
+                cost = max(0, round(cost * fresh / (span[1] - span[0])))
+            if used + cost > self.token_budget and selected:
+                over_budget += 1
+                continue
+            used += cost
+            selected.append(hit)
+            selected_shingles.append(shingles)
+            if span is not None:
+                page_spans.setdefault(page, []).append(span)
+        stats = {"selected": len(selected), "duplicates": duplicates, "over_budget": over_budget, "tokens": used}
+        return selected, stats
+
+    @staticmethod
+    def merge(hits: Sequence[ClauseHit]) -> List[Tuple[int, str]]:
+        """
+        Group hits per page and merge overlapping/adjacent chunks on their offsets.
+
+        Returns:
+            (page number, merged text) blocks, ordered by the best rank on each page
+        """
+        pages: Dict[tuple, List[Tuple[int, ClauseHit]]] = {}
+        for rank, hit in enumerate(hits):
+            pages.setdefault((hit.doc_id, hit.page), []).append((rank, hit))
+
+        blocks = []
+        for (_, page), members in sorted(pages.items(), key=lambda item: min(rank for rank, _ in item[1])):
+            with_span = sorted(((_span(h), h) for _, h in members if _span(h) is not None), key=lambda x: x[0])
+            parts: List[str] = []
+            text, end = None, None
+            for (start, stop), hit in with_span:
+                if text is not None and start <= end:
+                    if stop > end:
+                        text += hit.text[end - start:]
+                        end = stop
+                    continue
+                if text is not None:
+                    parts.append(text)
+                text, end = hit.text, stop
+            if text is not None:
+                parts.append(text)
+            # legacy chunks without offsets are kept as-is
+            parts.extend(h.text for _, h in members if _span(h) is None)
+            blocks.append((page, " ... ".join(parts)))
+        return blocks
+
+    def assemble(self, hits: Sequence[ClauseHit]) -> Tuple[List[str], Dict[str, int]]:
+        """
+        Returns:
+            (one context block per page, stats incl. estimated prompt context tokens)
+        """
+        selected, stats = self.select(hits)
+        blocks = [f"[Page {page}]\n{text}" for page, text in self.merge(selected)]
+        stats["context_tokens"] = sum(estimate_tokens(block) for block in blocks)
+        return blocks, stats
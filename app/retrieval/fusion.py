@@ -0,0 +1,93 @@
+import hashlib
+from typing import Dict, List, Literal, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from app.schemas.request_models import ClauseHit
+
+LEGS = ("dense", "sparse")
+
+
+def chunk_key(doc: Document) -> str:
+    """Stable identity of a chunk: its chunk_id, or a content hash for legacy chunks."""
+    chunk_id = doc.metadata.get("chunk_id")
+    if chunk_id:
+        return str(chunk_id)
+    return hashlib.sha1(doc.page_content.encode("utf-8")).hexdigest()
+
+
+def fuse_results(
+    dense: Sequence[Tuple[Document, float]],
+    sparse: Sequence[Tuple[Document, float]],
+    weights: Sequence[float] = (0.7, 0.3),
+    method: Literal["rrf", "score"] = "rrf",
+    rrf_k: int = 60,
+    top_k: Optional[int] = None,
+) -> List[ClauseHit]:
+    """
+    Fuse the dense and sparse legs into a single ranked list of ClauseHit.
+
+    Chunks are deduplicated by chunk id. Every hit keeps its per-leg score and
+    rank next to the fused score.
+
+    method="rrf":   sum_leg  w / (rrf_k + rank)
+    method="score": sum_leg  w * min-max normalised leg score (missing -> 0)
+    """
+    keys: Dict[str, int] = {}
+    docs: List[Document] = []
+    legs = (dense, sparse)
+    # rows = unique chunks, cols = legs; NaN where a leg did not return the chunk
+    ranks = np.full((sum(len(l) for l in legs), len(legs)), np.nan)
+    scores = np.full_like(ranks, np.nan)
+
+    for col, results in enumerate(legs):
+        for rank, (doc, score) in enumerate(results, start=1):
+            key = chunk_key(doc)
+            row = keys.get(key)
+            if row is None:
+                row = keys[key] = len(docs)
+                docs.append(doc)
+            if np.isnan(ranks[row, col]):
+                ranks[row, col] = rank
+                scores[row, col] = score
+
+    ranks, scores = ranks[:len(docs)], scores[:len(docs)]
+    if not docs:
+        return []
+
+    w = np.asarray(weights, dtype=np.float64)
+    if method == "rrf":
+        fused = np.nansum(w / (rrf_k + ranks), axis=1)
+    elif method == "score":
+        lo = np.nanmin(scores, axis=0, initial=np.inf, where=~np.isnan(scores))
+        hi = np.nanmax(scores, axis=0, initial=-np.inf, where=~np.isnan(scores))
+        span = np.where(hi - lo > 0, hi - lo, 1.0)
+        norm = np.where(hi - lo > 0, (scores - lo) / span, 1.0)
+        fused = np.nansum(w * np.where(np.isnan(scores), 0.0, norm), axis=1)
+    else:
+        raise ValueError(f"Unsupported fusion method: {method}")
+
+    order = np.argsort(-fused, kind="stable")
+    if top_k is not None:
+        order = order[:top_k]
+
+    hits = []
+    for row in order:
+        doc = docs[row]
+        metadata = doc.metadata
+        leg_values = {}
+        for col, leg in enumerate(LEGS):
+            if not np.isnan(ranks[row, col]):
+                leg_values[f"{leg}_rank"] = int(ranks[row, col])
+                leg_values[f"{leg}_score"] = float(scores[row, col])
+        hits.append(ClauseHit(
+            doc_id=str(metadata.get("doc_id", "")),
+            page=int(metadata.get("page_no", -1)),
+            chunk_id=chunk_key(doc),
+            text=doc.page_content,
+            metadata=metadata,
+            score=float(fused[row]),
+            **leg_values,
+        ))
+    return hits
@@ -0,0 +1,143 @@
+import heapq
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from langchain_core.documents import Document
+
+from app.retrieval.fusion import chunk_key, fuse_results
+from app.retrieval.retriever import Retriever
+from app.schemas.request_models import ClauseHit
+from app.utils.metadata_utils import MetadataService
+
+# Scatter pool for library queries: one task per (document, leg)
+_LIBRARY_EXECUTOR = ThreadPoolExecutor(max_workers=32, thread_name_prefix="library-search")
+
+# metadata fields that are identifiers, not filterable values
+_SUMMARY_SKIP_FIELDS = {"doc_id", "chunk_id", "page_no", "source", "page", "start_index", "end_index", "token_count", "text"}
+
+
+def summarize_metadata(metadatas: Iterable[dict]) -> Dict[str, Set[str]]:
+    """Per-field set of every metadata value that occurs in a document's chunk (or page) metadata."""
+    summary: Dict[str, Set[str]] = {}
+    for metadata in metadatas:
+        for field, value in metadata.items():
+            if field in _SUMMARY_SKIP_FIELDS:
+                continue
+            for v in value if isinstance(value, list) else [value]:
+                if isinstance(v, (str, int, float, bool)):
+                    summary.setdefault(field, set()).add(str(v))
+    return summary
+
+
+def can_match(summary: Optional[Dict[str, Set[str]]], metadata_filter: Optional[dict]) -> bool:
+    """
+    False only when the summary proves no chunk of the document satisfies the filter.
+    Documents without a summary (e.g. restored from the database) are always kept.
+    """
+    if not metadata_filter or summary is None:
+        return True
+    for field, condition in metadata_filter.items():
+        allowed = condition["$in"] if isinstance(condition, dict) and "$in" in condition else [condition]
+        if not summary.get(field, set()) & {str(v) for v in allowed}:
+            return False
+    return True
+
+
+@dataclass
+class LibraryDocument:
+    """One document of a user's library and what is needed to search it."""
+    session_id: str
+    document_name: Optional[str]
+    retriever: Retriever  # sparse_retriever is None for dense-only (restored) documents
+    metadata_summary: Optional[Dict[str, Set[str]]] = None
+
+
+class LibrarySearch:
+    """
+    Hybrid retrieval across every document in a user's library.
+
+    Documents whose metadata summary cannot satisfy the filter are pruned first.
+    The dense and sparse legs of all remaining documents are then scattered to a
+    shared pool at once, so latency follows the slowest single call rather than
+    the library size. Per-leg results are merged with a global top-k heap and fused
+    exactly like single-document retrieval.
+    """
+
+    def __init__(self, documents: List[LibraryDocument], weights: Optional[List[float]] = None,
+                 fusion_method: str = "rrf", rrf_k: int = 60):
+        self.documents = documents
+        self.weights = weights or [0.7, 0.3]
+        self.fusion_method = fusion_method
+        self.rrf_k = rrf_k
+
+    def prune(self, metadata_filter: Optional[dict]) -> Tuple[List[LibraryDocument], List[LibraryDocument]]:
+        """Split the library into (documents to search, documents that cannot match)."""
+        kept, pruned = [], []
+        for document in self.documents:
+            (kept if can_match(document.metadata_summary, metadata_filter) else pruned).append(document)
+        return kept, pruned
+
+    @staticmethod
+    def _sparse_leg(retriever: Retriever, query: str, metadata_filter: Optional[dict], k: int):
+        results, elapsed = retriever._sparse_search(query, k)
+        if metadata_filter:
+            # BM25 has no server-side filter; apply it to the candidates locally
+            results = [(doc, score) for doc, score in results if MetadataService.matches_filter(doc.metadata, metadata_filter)]
+        return results, elapsed
+
+    def search(self, query: str, query_embedding=None, metadata_filter: Optional[dict] = None, k: int = 5) -> Tuple[List[ClauseHit], Dict[str, float]]:
+        """
+        Returns:
+            (global top-k fused hits tagged with session_id / document_name, stats)
+        """
+        start = time.perf_counter()
+        kept, pruned = self.prune(metadata_filter)
+
+        futures = []
+        for document in kept:
+            retriever = document.retriever
+            futures.append((document, "dense", _LIBRARY_EXECUTOR.submit(
+                retriever._dense_search, query, metadata_filter, k, query_embedding
+            )))
+            if retriever.sparse_retriever is not None:
+                futures.append((document, "sparse", _LIBRARY_EXECUTOR.submit(
+                    self._sparse_leg, retriever, query, metadata_filter, k
+                )))
+
+        legs: Dict[str, List[Tuple[Document, float]]] = {"dense": [], "sparse": []}
+        leg_ms = {"dense": 0.0, "sparse": 0.0}
+        owner: Dict[str, LibraryDocument] = {}
+        for document, leg, future in futures:
+            results, elapsed = future.result()
+            leg_ms[leg] = max(leg_ms[leg], elapsed * 1000)
+            for doc, score in results:
+                owner[chunk_key(doc)] = document
+            legs[leg].extend(results)
+
+        # global top-k per leg; dense cosine scores share one scale across namespaces
+        dense_top = heapq.nlargest(k, legs["dense"], key=lambda pair: pair[1])
+        sparse_top = heapq.nlargest(k, legs["sparse"], key=lambda pair: pair[1])
+        hits = fuse_results(
+            dense_top, sparse_top, weights=self.weights, method=self.fusion_method, rrf_k=self.rrf_k, top_k=k
+        )
+        hits = [
+            hit.model_copy(update={"metadata": {
+                **hit.metadata,
+                "session_id": owner[hit.chunk_id].session_id,
+                "document_name": owner[hit.chunk_id].document_name,
+            }})
+            for hit in hits
+        ]
+
+        stats = {
+            "documents": len(self.documents),
+            "searched": len(kept),
+            "pruned": len(pruned),
+            "dense_ms": leg_ms["dense"],
+            "sparse_ms": leg_ms["sparse"],
+            "total_ms": (time.perf_counter() - start) * 1000,
+        }
+        print(f"[LibrarySearch] searched {len(kept)}/{len(self.documents)} documents in {stats['total_ms']:.1f}ms")
+        return hits, stats
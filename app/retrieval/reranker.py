@@ -0,0 +1,102 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+from app.schemas.request_models import ClauseHit
+from app.config.config import get_settings
+from app.utils.config_loader import load_config
+from app.utils.offline_models import LexicalCrossEncoder
+
+# Global cross-encoder instance (loaded once, shared by every session)
+_cross_encoder = None
+_cross_encoder_lock = threading.Lock()
+
+
+def get_cross_encoder(model_name: Optional[str] = None):
+    global _cross_encoder
+    with _cross_encoder_lock:
+        if _cross_encoder is None and get_settings().reranker_provider == "lexical":
+            print("Using the offline lexical reranker")
+            _cross_encoder = LexicalCrossEncoder()
+        if _cross_encoder is None:
+            # optional dependency: only needed once a huggingface reranker is actually built
+            try:
+                from sentence_transformers import CrossEncoder
+            except ImportError as e:
+                raise ImportError(
+                    "reranker_provider='huggingface' requires the sentence-transformers package "
+                    "(pip install sentence-transformers), or set reranker_provider='lexical' / rerank_enabled=false"
+                ) from e
+            model_name = model_name or load_config()["reranker"]["huggingface"]["model_name"]
+            print(f"Loading cross-encoder {model_name} (one-time initialization)...")
+            _cross_encoder = CrossEncoder(model_name, device="cpu")
+    return _cross_encoder
+
+
+class CrossEncoderReranker:
+    """
+    Rerank fused retrieval hits with a small CPU cross-encoder.
+
+    All uncached (query, chunk) pairs are scored in a single batched forward pass.
+    The number of candidates is capped so the expected forward pass stays within
+    `latency_budget_ms`, using a running estimate of the per-pair cost. Scores are
+    cached per (query hash, chunk id).
+    """
+
+    def __init__(self, top_n: int = 3, max_candidates: int = 20, latency_budget_ms: float = 250.0, cache_size: int = 4096, model=None):
+        self.top_n = top_n
+        self.max_candidates = max_candidates
+        self.latency_budget_ms = latency_budget_ms
+        self.cache_size = cache_size
+        self.model = model
+        self._cache: "OrderedDict[tuple, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._pair_ms: Optional[float] = None  # EMA of forward-pass cost per pair
+
+    def _candidate_cap(self, latency_budget_ms: Optional[float] = None) -> int:
+        if not self._pair_ms:
+            return self.max_candidates
+        budget = self.latency_budget_ms if latency_budget_ms is None else latency_budget_ms
+        affordable = int(budget / self._pair_ms)
+        return max(self.top_n, min(self.max_candidates, affordable))
+
+    def _score_pairs(self, query: str, hits: List[ClauseHit]) -> List[float]:
+        model = self.model or get_cross_encoder()
+        start = time.perf_counter()
+        scores = model.predict([(query, hit.text) for hit in hits], batch_size=len(hits), show_progress_bar=False)
+        pair_ms = (time.perf_counter() - start) * 1000 / len(hits)
+        self._pair_ms = pair_ms if self._pair_ms is None else 0.8 * self._pair_ms + 0.2 * pair_ms
+        return [float(s) for s in scores]
+
+    def rerank(self, query: str, hits: List[ClauseHit], top_n: Optional[int] = None,
+               latency_budget_ms: Optional[float] = None) -> List[ClauseHit]:
+        """Return the top_n hits ordered by cross-encoder score. `latency_budget_ms` overrides the default budget."""
+        if not hits:
+            return []
+        top_n = top_n or self.top_n
+        candidates = hits[:self._candidate_cap(latency_budget_ms)]
+        query_hash = hashlib.sha1(query.strip().lower().encode("utf-8")).hexdigest()
+
+        cached = {}
+        with self._lock:
+            for h in candidates:
+                key = (query_hash, h.chunk_id)
+                cached[h.chunk_id] = self._cache.get(key)
+                if cached[h.chunk_id] is not None:
+                    self._cache.move_to_end(key)
+        missing = [h for h in candidates if cached[h.chunk_id] is None]
+        if missing:
+            for hit, score in zip(missing, self._score_pairs(query, missing)):
+                cached[hit.chunk_id] = score
+            with self._lock:
+                for hit in missing:
+                    self._cache[(query_hash, hit.chunk_id)] = cached[hit.chunk_id]
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        reranked = [h.model_copy(update={"rerank_score": cached[h.chunk_id]}) for h in candidates]
+        reranked.sort(key=lambda h: h.rerank_score, reverse=True)
+        print(f"[Reranker] scored {len(missing)}/{len(candidates)} pairs (cache hits: {len(candidates) - len(missing)})")
+        return reranked[:top_n]
@@ -1,69 +1,110 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from app.retrieval.fusion import fuse_results
+from app.schemas.request_models import ClauseHit
+
+# Shared pool for the dense (network bound) leg; the sparse leg runs on the caller's thread.
+_DENSE_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix="dense-retrieval")
 
-from langchain.retrievers import EnsembleRetriever
 
 class Retriever:
-    def __init__(self, pinecone_index, query = None, metadata = None, namespace=None, vectore_store = None,sparse_retriever = None, llm = None):
-        self.pinecone_index = pinecone_index
-        self.query = query
-        self.metadata = metadata
-        self.namespace = namespace
-        self.vector_store = vectore_store
+    """
+    Long-lived hybrid retriever for one session's document.
+
+    Built once after the vector store is created; query and metadata filter are
+    passed per call. The dense Pinecone search and the BM25 search run
+    concurrently, so retrieval latency is max(dense, sparse) instead of the sum.
+    """
+
+    def __init__(self, vector_store, sparse_retriever, namespace=None, dense_k: int = 5, sparse_k: int = 5,
+                 weights: Optional[List[float]] = None, fusion_method: str = "rrf", rrf_k: int = 60):
+        self.vector_store = vector_store
         self.sparse_retriever = sparse_retriever
-        self.llm = llm  
-        self.dense_retriever = self.vector_store.as_retriever(
-            search_type="similarity",
-            search_kwargs={"k": 5,"namespace": self.namespace, "filter": self.metadata}
-        )
-        self.hybrid_retriever = EnsembleRetriever(
-            retrievers=[self.dense_retriever, sparse_retriever],  # Use .retriever attribute
-            weights=[0.7, 0.3]  # Fix: 'weights' not 'weight'
-        )
+        self.namespace = namespace
+        self.dense_k = dense_k
+        self.sparse_k = sparse_k
+        self.weights = weights or [0.7, 0.3]
+        self.fusion_method = fusion_method
+        self.rrf_k = rrf_k
 
+    def _dense_search(self, query: str, metadata_filter: Optional[dict], k: int, query_embedding=None) -> Tuple[List[Tuple[Document, float]], float]:
+        start = time.perf_counter()
+        if query_embedding is not None:
+            # reuse the embedding the caller already computed
+            results = self.vector_store.similarity_search_by_vector_with_score(
+                query_embedding, k=k, filter=metadata_filter or None, namespace=self.namespace
+            )
+        else:
+            results = self.vector_store.similarity_search_with_score(
+                query, k=k, filter=metadata_filter or None, namespace=self.namespace
+            )
+        return results, time.perf_counter() - start
 
-    def retrieval_from_pinecone_vectoreStore(self):
+    async def _adense_search(self, query: str, metadata_filter: Optional[dict], k: int, query_embedding=None) -> Tuple[List[Tuple[Document, float]], float]:
+        start = time.perf_counter()
+        if query_embedding is not None:
+            results = await self.vector_store.asimilarity_search_by_vector_with_score(
+                query_embedding, k=k, filter=metadata_filter or None, namespace=self.namespace
+            )
+        else:
+            results = await self.vector_store.asimilarity_search_with_score(
+                query, k=k, filter=metadata_filter or None, namespace=self.namespace
+            )
+        return results, time.perf_counter() - start
+
+    def _sparse_search(self, query: str, k: int) -> Tuple[List[Tuple[Document, float]], float]:
+        start = time.perf_counter()
+        if self.sparse_retriever is None:
+            # dense-only (restored or evicted document): fusion sees an empty sparse leg
+            return [], 0.0
+        results = self.sparse_retriever.search_with_scores(query, k=k)
+        return results, time.perf_counter() - start
+
+    def retrieve(self, query: str, metadata_filter: Optional[dict] = None, k: Optional[int] = None, query_embedding=None) -> Tuple[List[ClauseHit], Dict[str, float]]:
         """
-        Retrieve the top matching chunks from Pinecone.
-        
-        Args:
-            pinecone_index: Your Pinecone index object.
-            embedding: The vector embedding of the query.
-            top_k: How many chunks to retrieve.
-            filter_meta: Optional metadata filter dict.
-        
+        Run dense and sparse retrieval in parallel and fuse the results.
+        `k` overrides the per-leg k, e.g. to fetch a wider candidate set for reranking.
+        `query_embedding` skips re-embedding the query in the dense leg.
+
         Returns:
-            List of ClauseHit objects (lightweight container for chunk info).
+            (fused hits with per-leg scores, per-leg timings in milliseconds)
         """
-        # res = self.pinecone_index.query(
-        #     vector= self.query,
-        #     top_k =top_k ,
-        #     include_metadata = True, 
-        #     include_values = False, 
-        #     filter = self.metadata,
-        #     namespace = self.namespace
-        #     )
-        
-        # Process the results into the expected format
-        # class ClauseHit:
-        #     def __init__(self, doc_id, page, chunk_id, text, metadata, score):
-        #         self.doc_id = doc_id
-        #         self.page = page
-        #         self.chunk_id = chunk_id
-        #         self.text = text
-        #         self.metadata = metadata
-        #         self.score = score
-        
-        # hits = []
-        # for match in res['matches']:
-        #     hits.append(ClauseHit(
-        #         doc_id=match['metadata'].get('doc_id', ''),
-        #         page=match['metadata'].get('page_no', -1),  # Use page_no instead of page
-        #         chunk_id=match['metadata'].get('chunk_id', ''),
-        #         text=match['metadata'].get('text', match.get('text', '')),
-        #         metadata=match['metadata'],
-        #         score=match['score']
-        #     ))
-        # return hits
-        results = self.hybrid_retriever.invoke(self.query)
-        for doc in results:
-            print(f"printing Doc content : {doc.page_content}")
-        return results
+        start = time.perf_counter()
+        dense_future = _DENSE_EXECUTOR.submit(self._dense_search, query, metadata_filter, k or self.dense_k, query_embedding)
+        sparse_docs, sparse_time = self._sparse_search(query, k or self.sparse_k)
+        dense_docs, dense_time = dense_future.result()
+
+        results = fuse_results(
+            dense_docs, sparse_docs, weights=self.weights, method=self.fusion_method, rrf_k=self.rrf_k
+        )
+        timings = {
+            "dense_ms": dense_time * 1000,
+            "sparse_ms": sparse_time * 1000,
+            "total_ms": (time.perf_counter() - start) * 1000,
+        }
+        print(f"[Retriever] dense={timings['dense_ms']:.1f}ms sparse={timings['sparse_ms']:.1f}ms total={timings['total_ms']:.1f}ms")
+        return results, timings
+
+    async def aretrieve(self, query: str, metadata_filter: Optional[dict] = None, k: Optional[int] = None, query_embedding=None) -> Tuple[List[ClauseHit], Dict[str, float]]:
+        """Async retrieve(): the dense leg is awaited on the vector store's async client while BM25 runs in a worker thread."""
+        start = time.perf_counter()
+        dense_task = self._adense_search(query, metadata_filter, k or self.dense_k, query_embedding)
+        # BM25 scoring is CPU work; keep it off the event loop so other queries proceed
+        sparse_task = asyncio.to_thread(self._sparse_search, query, k or self.sparse_k)
+        (dense_docs, dense_time), (sparse_docs, sparse_time) = await asyncio.gather(dense_task, sparse_task)
+
+        results = fuse_results(
+            dense_docs, sparse_docs, weights=self.weights, method=self.fusion_method, rrf_k=self.rrf_k
+        )
+        timings = {
+            "dense_ms": dense_time * 1000,
+            "sparse_ms": sparse_time * 1000,
+            "total_ms": (time.perf_counter() - start) * 1000,
+        }
+        print(f"[Retriever] dense={timings['dense_ms']:.1f}ms sparse={timings['sparse_ms']:.1f}ms total={timings['total_ms']:.1f}ms")
+        return results, timings
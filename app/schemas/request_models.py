@@ -3,6 +3,29 @@ from typing import List, Dict, Any, Optional, Union, Literal
 import json
 class QueryRequest(BaseModel):
     query: str
+    latency_budget_ms: Optional[float] = Field(
+        None, gt=0, description="End-to-end latency budget; optional stages are skipped or shortened to meet it"
+    )
+
+class BatchQueryRequest(BaseModel):
+    questions: List[str] = Field(
+        ...,
+        min_length=1,
+        description="List of questions to query against the document"
+    )
+    max_concurrency: Optional[int] = Field(
+        None,
+        ge=1,
+        description="Upper bound on concurrent retrievals/LLM calls (defaults to settings)"
+    )
+
+class LibraryQueryRequest(BaseModel):
+    query: str
+    metadata_filter: Optional[Dict[str, Any]] = Field(
+        None,
+        description="Pinecone-style filter, e.g. {\"coverage_type\": {\"$in\": [\"hospitalization\"]}}"
+    )
+    k: Optional[int] = Field(None, ge=1, description="Number of chunks to retrieve across the library")
 
     
 
@@ -28,24 +51,27 @@ class QueryRequest(BaseModel):
 #                     pass
 #         return values
 
-# class ClauseHit(BaseModel):
-#     doc_id : str # id of the document
-#     page: int # pdf page id 
-#     chunk_id: str  
-#     text: str # Evidence text used for answer.
-#     metadata: Dict[str, Any] = Field(default_factory=dict) # metadata
-#     score: float  # Retrieval similarity score
-#     boost: Optional[float] = None
-#     combined_score: Optional[float] = None
+class ClauseHit(BaseModel):
+    doc_id : str # id of the document
+    page: int # pdf page id 
+    chunk_id: str  
+    text: str # Evidence text used for answer.
+    metadata: Dict[str, Any] = Field(default_factory=dict) # metadata
+    score: float  # Fused retrieval score
+    dense_score: Optional[float] = None # cosine similarity from the vector store
+    sparse_score: Optional[float] = None # BM25 score
+    dense_rank: Optional[int] = None # 1-based rank in the dense leg
+    sparse_rank: Optional[int] = None # 1-based rank in the sparse leg
+    rerank_score: Optional[float] = None # cross-encoder relevance score
 
-#     @field_validator("metadata", mode="before")
-#     def parse_metadata(cls, v):
-#         if isinstance(v, str):
-#             try:
-#                 return json.loads(v) if v.strip() else {}
-#             except json.JSONDecodeError:
-#                 return {}
-#         return v
+    @field_validator("metadata", mode="before")
+    def parse_metadata(cls, v):
+        if isinstance(v, str):
+            try:
+                return json.loads(v) if v.strip() else {}
+            except json.JSONDecodeError:
+                return {}
+        return v
 
 # class LogicResult(BaseModel):
 #     answer: str
@@ -64,6 +90,9 @@ class QueryRequest(BaseModel):
 #         description="List of questions to query against the document"
 #     )
 
+class PackedAnswers(BaseModel):
+    answers: List[str] = Field(..., description="One answer per question, in the order the questions were asked")
+
 class DocumentTypeSchema(BaseModel):
     document_types: Literal[
         "HR/Employment",
@@ -1,10 +1,45 @@
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
+
+class SourceDocument(BaseModel):
+    doc_id: str
+    page: int
+    text: str
+    score: float
+    metadata: Dict[str, Any]
+    dense_score: Optional[float] = None
+    sparse_score: Optional[float] = None
+
 class QueryResponse(BaseModel): 
     session_id: str 
     query: str
     answer: str
     message: str
+    sources: List[SourceDocument] = []
+    timings: Optional[Dict[str, float]] = None
+    cached: Optional[str] = None  # "exact" / "semantic" when served from the answer cache
+    degradations: List[str] = []  # optional stages skipped or shortened to meet the latency budget
+
+class BatchAnswer(BaseModel):
+    query: str
+    answer: str
+    sources: List[SourceDocument] = []
+    timings: Optional[Dict[str, float]] = None
+    cached: Optional[str] = None
+
+class BatchQueryResponse(BaseModel):
+    session_id: str
+    answers: List[BatchAnswer]
+    message: str
+    timings: Optional[Dict[str, float]] = None
+
+class LibraryQueryResponse(BaseModel):
+    username: str
+    query: str
+    answer: Optional[str] = None
+    message: str
+    sources: List[SourceDocument] = []  # metadata carries session_id / document_name
+    stats: Optional[Dict[str, float]] = None
 
 class SessionResponse(BaseModel):
     session_id: str
@@ -20,10 +55,3 @@ class UploadResponse(BaseModel):
 class ErrorResponse(BaseModel):
     detail: str
     error_code: Optional[str] = None
-
-class SourceDocument(BaseModel):
-    doc_id: str
-    page: int
-    text: str
-    score: float
-    metadata: Dict[str, Any]
\ No newline at end of file
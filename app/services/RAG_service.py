@@ -2,23 +2,58 @@ from app.utils.model_loader import ModelLoader
 from app.ingestion.file_loader import FileLoader
 from app.ingestion.text_splitter import splitting_text
 from app.retrieval.retriever import Retriever
+from app.retrieval.reranker import CrossEncoderReranker
+from app.retrieval.library import summarize_metadata
+from app.retrieval.context_assembler import ContextAssembler
+from app.retrieval.chunk_index import ChunkIndex
+from app.retrieval.chunk_store import ChunkStore
 from app.embedding.embeder import QueryEmbedding
-from app.embedding.vectore_store import VectorStore
+from app.embedding.vectore_store import MemoryVectorStore, VectorStore, open_vector_store
+from app.database.session_store import get_session_store
 from app.metadata_extraction.metadata_ext import MetadataExtractor
+from app.metadata_extraction.keyword_index import KeywordIndex, filter_agreement
 from app.utils.metadata_utils import MetadataService
+from app.config.config import get_settings
+from app.utils.token_utils import estimate_tokens
+from app.utils.llm_scheduler import BACKGROUND, llm_priority
+from app.utils.model_router import get_router
+from app.utils.deadline import Deadline
+from app.utils.chain_cache import chain_cache
+from app.utils.memory_utils import deep_sizeof
+from app.schemas.request_models import DocumentTypeSchema, PackedAnswers
 from langchain_core.documents import Document
+from typing import List, Optional
+import asyncio
+import contextvars
+import hashlib
+import io
 import json
-from langchain_community.retrievers import BM25Retriever
+import os
+import threading
+import time
+import uuid
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from app.retrieval.bm25 import BM25Index, BM25SparseRetriever
+from app.services.answer_cache import AnswerCache
+from app.services.query_result import QueryResult
 from langchain.schema import Document
 
 # Global model instances (loaded once)
 _embedding_model = None
 
+# Runs the query-metadata LLM call while speculative retrieval is in flight; calls are
+# submitted in a copy of the caller's context so the LLM scheduler sees its priority
+_QUERY_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix="query-metadata")
+
+# Query embedding is CPU bound; async callers run it here instead of on the event loop
+_EMBED_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="embedding")
+
 def get_models():
     global  _embedding_model
     if _embedding_model is None:
         print("Loading models (one-time initialization)...")
-        embedding_loader = ModelLoader(model_provider="huggingface")
+        embedding_loader = ModelLoader(model_provider=get_settings().embedding_provider)
         _embedding_model = embedding_loader.load_llm()
     return _embedding_model
 
@@ -36,16 +71,35 @@ class RAGService:
         self.vector_store = None
         self.index = None
         self.namespace = None
+        self.document_id = None  # per upload; the shared session store keys document state by it
+        self.index_name = None
+        self.metadata_summary = None
+        self.chunk_index = None
+        self.keywords_path = None  # the document's known-keyword vocabulary (JSON)
         self.retriever = None
+        self.reranker = None
+        self.keyword_index = None
+        self._keyword_index_mtime = None
+        self.spilled = False  # heavy state written to spill_path() and released from memory
+        self._state_lock = threading.Lock()
         self.metadataservice = MetadataService()
+        settings = get_settings()
+        self.answer_cache = AnswerCache(
+            max_entries=settings.answer_cache_size,
+            ttl_seconds=settings.answer_cache_ttl_seconds,
+            similarity_threshold=settings.answer_cache_similarity_threshold
+        )
         print("[RAGService] Initialization complete.")
 
     def _init_models(self):
         """Initialize LLM and embedding Models"""
-        print("[RAGService] Loading LLM model (gemini)...")
-        self.model_loader = ModelLoader(model_provider="gemini")
-        self.llm = self.model_loader.load_llm()
-        print("[RAGService] LLM model loaded.")
+        print("[RAGService] Loading LLM models (per-task routing from config.yaml)...")
+        # answers use the full model; extraction tasks route to cheaper models via self.router
+        self.router = get_router()
+        self.llm = self.router.llm("answer")
+        # interactive answers (single queries, streaming) race a second provider when the first is slow
+        self.answer_llm = self.router.hedged("answer")
+        print("[RAGService] LLM models loaded.")
         print("[RAGService] Loading embedding model (huggingface)...")
         # self.model_loader = ModelLoader(model_provider="huggingface")
         self.embedding_model = get_models()
@@ -53,8 +107,14 @@ class RAGService:
 
     def load_and_split_document(self, type:str, path:str= None, url:str = None):
         """Load and chunk document from local path or URL"""
+        # ingestion LLM calls (classification, per-page metadata) yield to interactive queries
+        with llm_priority(BACKGROUND):
+            self._load_and_split_document(type, path, url)
+
+    def _load_and_split_document(self, type:str, path:str= None, url:str = None):
         print(f"[RAGService] Loading document. Type: {type}, Path: {path}, URL: {url}")
-        file_loader = FileLoader(llm = self.llm)
+        self.document_id = uuid.uuid4().hex
+        file_loader = FileLoader(llm = self.router.llm("classification"), fallback_llm = self.router.fallback("classification"))
         if type == "pdf":
             if path:
                 print(f"[RAGService] Loading PDF from path: {path}")
@@ -84,90 +144,989 @@ class RAGService:
         print(f"[RAGService] Document type scheme detected: {self.DocumentTypeScheme}")
         self.Document_Type = self.metadataservice.Return_document_model(self.DocumentTypeScheme)
         print(f"[RAGService] Document type model: {self.Document_Type}")
-        self.splitter = splitting_text(documentTypeSchema=self.Document_Type, llm=self.llm, embedding_model=self.embedding_model)
+        self.splitter = splitting_text(
+            documentTypeSchema=self.Document_Type, llm=self.router.llm("page_metadata"),
+            embedding_model=self.embedding_model, fallback_llm=self.router.fallback("page_metadata")
+        )
         print("[RAGService] Splitting document into chunks...")
         self.chunks = self.splitter.text_splitting(doc)
+        self.keywords_path = self.splitter.Keywordsfile_path
         print(f"[RAGService] Total chunks created: {len(self.chunks)}")
+        # answers cached for the previous chunks are no longer valid
+        self.answer_cache.invalidate()
+        self.chunk_index = self.chunks.index
 
-    def create_query_embedding(self, query: str):
-        print("[RAGService] Creating query embedding...")
-        self.query = query
-        self.query_embedder = QueryEmbedding(query=query, embedding_model=self.embedding_model)
-        self.query_embedding = self.query_embedder.get_embedding()
-        print(f"[RAGService] Query embedding created: {self.query_embedding}")
-        langchain_doc = Document(page_content=query)
+    async def aload(self, type: str, path: str = None, url: str = None):
+        """
+        Async ingestion: load, split and index a document without blocking the event loop.
+        The per-page extraction pipeline runs in a worker thread; the vector store upsert is async.
+        """
+        await asyncio.to_thread(self.load_and_split_document, type, path, url)
+        await self.acreate_vector_store()
+
+    def _get_keyword_index(self, known_keywords: dict) -> KeywordIndex:
+        """Keyword index for the local filter fast-path, rebuilt only when the vocabulary file changes."""
+        mtime = os.path.getmtime(self.keywords_path)
+        if self.keyword_index is None or self._keyword_index_mtime != mtime:
+            self.keyword_index = KeywordIndex(
+                known_keywords,
+                embedding_model=self.embedding_model,
+                similarity_threshold=get_settings().local_filter_similarity_threshold
+            )
+            self._keyword_index_mtime = mtime
+        return self.keyword_index
+
+    def _prompt_keywords(self, query_embedding, known_keywords: dict) -> dict:
+        """Keyword vocabulary for the query-metadata prompt, pruned to the query when enabled."""
+        settings = get_settings()
+        if not settings.keyword_prompt_pruning:
+            return known_keywords
+        # only the vocabulary relevant to this query goes into the prompt
+        prompt_keywords = self._get_keyword_index(known_keywords).prune(
+            query_embedding, known_keywords,
+            top_n=settings.keyword_prompt_top_n, token_budget=settings.keyword_prompt_token_budget
+        )
+        full_tokens = estimate_tokens(json.dumps(known_keywords, indent=2))
+        pruned_tokens = estimate_tokens(json.dumps(prompt_keywords, separators=(",", ":")))
+        print(f"[RAGService] Keyword vocabulary in prompt: ~{pruned_tokens} tokens (full: ~{full_tokens})")
+        return prompt_keywords
+
+    async def _aextract_query_metadata_llm(self, query: str, query_embedding, known_keywords: dict) -> dict:
+        """Async query metadata extraction (ainvoke); the pruned-vocabulary shadow check is sync-only."""
+        metadata_extractor = MetadataExtractor(llm=self.router.llm("query_metadata"), fallback_llm=self.router.fallback("query_metadata"))
+        prompt_keywords = self._prompt_keywords(query_embedding, known_keywords)
+        raw_metadata = await metadata_extractor.aextractMetadata_query(
+            self.Document_Type, Document(page_content=query), known_keywords=prompt_keywords
+        )
+        print(f"[RAGService] Query metadata extracted: {raw_metadata}")
+        return raw_metadata.model_dump(exclude_none=True)
+
+    def _extract_query_metadata_llm(self, query: str, query_embedding, known_keywords: dict) -> dict:
+        """Extract query metadata with an LLM call (slow path)."""
         print("[RAGService] Extracting metadata for the query...")
-        self.metadataExtractor = MetadataExtractor(llm=self.llm)
-        with open(self.splitter.Keywordsfile_path, "r") as f:
-            known_keywords = json.load(f)
-        raw_metadata = self.metadataExtractor.extractMetadata_query(self.Document_Type,langchain_doc, known_keywords = known_keywords)
+        settings = get_settings()
+        langchain_doc = Document(page_content=query)
+        metadata_extractor = MetadataExtractor(llm=self.router.llm("query_metadata"), fallback_llm=self.router.fallback("query_metadata"))
+        prompt_keywords = self._prompt_keywords(query_embedding, known_keywords)
+        raw_metadata = metadata_extractor.extractMetadata_query(self.Document_Type,langchain_doc, known_keywords = prompt_keywords)
         print(f"[RAGService] Query metadata extracted: {raw_metadata}")
-        # Convert to dictionary and format for Pinecone
         metadata_dict = raw_metadata.model_dump(exclude_none=True)
+        if settings.keyword_prompt_pruning and settings.keyword_prompt_shadow:
+            full_metadata = metadata_extractor.extractMetadata_query(self.Document_Type, langchain_doc, known_keywords=known_keywords)
+            agreement = filter_agreement(metadata_dict, full_metadata.model_dump(exclude_none=True))
+            print(f"[RAGService] Pruned-vocabulary shadow check: agreement={agreement:.2f}")
+        return metadata_dict
+
+    def _load_known_keywords(self) -> dict:
+        with open(self.keywords_path, "r") as f:
+            return json.load(f)
+
+    def _local_query_metadata(self, query: str, query_embedding, known_keywords: dict):
+        """
+        Fast-path: match the query against the document's keyword vocabulary.
+
+        Returns:
+            (metadata dict or None when nothing matches confidently, elapsed ms)
+        """
+        if not get_settings().local_query_filter:
+            return None, 0.0
+        start = time.perf_counter()
+        metadata_dict = self._get_keyword_index(known_keywords).build_filter(query, query_embedding)
+        local_ms = (time.perf_counter() - start) * 1000
+        print(f"[RAGService] Local query filter ({local_ms:.1f}ms): {metadata_dict}")
+        return metadata_dict, local_ms
+
+    def _to_query_filter(self, metadata_dict: Optional[dict]) -> Optional[dict]:
+        """Convert extracted query metadata into a Pinecone filter (None when there is no metadata)."""
+        if metadata_dict is None:
+            return None
         formatted_metadata = self.metadataservice.format_metadata_for_pinecone(metadata_dict)
-        
         # Remove problematic fields that cause serialization issues
-        self.query_metadata = {
+        return {
             k: v for k, v in formatted_metadata.items() 
             if k not in ["obligations", "exclusions", "notes", "added_new_keyword"]
         }
-    
-        print(f"[RAGService] Query metadata type: {type(self.query_metadata)}")
-        print(f"[RAGService] Query metadata: {self.query_metadata}")
+
+    def _resolve_query_filter(self, query: str, query_embedding, known_keywords: dict, deadline: Optional[Deadline] = None):
+        """Query metadata filter, local fast-path first. Returns (filter, source)."""
+        deadline = deadline or Deadline()
+        metadata_dict, local_ms = self._local_query_metadata(query, query_embedding, known_keywords)
+        if metadata_dict is None:
+            metadata_dict = self._query_metadata_within(query, query_embedding, known_keywords, deadline)
+            return self._to_query_filter(metadata_dict), "none" if metadata_dict is None else "llm"
+        # shadow comparisons are diagnostics; they never spend a query's latency budget
+        if get_settings().local_filter_shadow and deadline.budget_ms is None:
+            start = time.perf_counter()
+            llm_metadata = self._extract_query_metadata_llm(query, query_embedding, known_keywords)
+            llm_ms = (time.perf_counter() - start) * 1000
+            agreement = filter_agreement(metadata_dict, llm_metadata)
+            print(f"[RAGService] Local filter shadow check: agreement={agreement:.2f}, latency saved={llm_ms - local_ms:.1f}ms")
+        return self._to_query_filter(metadata_dict), "local"
+
+    def _query_metadata_within(self, query: str, query_embedding, known_keywords: dict, deadline: Deadline) -> Optional[dict]:
+        """
+        Query-metadata LLM call bounded by the deadline (keeping the answer reserve).
+        Returns None, and records the degradation, when it is skipped or times out.
+        """
+        settings = get_settings()
+        reserve = settings.deadline_answer_reserve_ms
+        if not deadline.affords(settings.deadline_llm_filter_ms, reserve):
+            deadline.degrade("llm_filter_skipped")
+            return None
+        future = _QUERY_EXECUTOR.submit(contextvars.copy_context().run, self._extract_query_metadata_llm, query, query_embedding, known_keywords)
+        try:
+            return future.result(timeout=deadline.timeout(reserve))
+        except FutureTimeoutError:
+            # the call finishes in the background; this query no longer waits for it
+            deadline.degrade("llm_filter_timeout")
+            return None
+
+    async def _aquery_metadata_within(self, query: str, query_embedding, known_keywords: dict, deadline: Deadline) -> Optional[dict]:
+        """Async _query_metadata_within(); a timed-out call is cancelled."""
+        settings = get_settings()
+        reserve = settings.deadline_answer_reserve_ms
+        if not deadline.affords(settings.deadline_llm_filter_ms, reserve):
+            deadline.degrade("llm_filter_skipped")
+            return None
+        try:
+            return await asyncio.wait_for(
+                self._aextract_query_metadata_llm(query, query_embedding, known_keywords), deadline.timeout(reserve)
+            )
+        except asyncio.TimeoutError:
+            deadline.degrade("llm_filter_timeout")
+            return None
+
+    def create_query_embedding(self, query: str):
+        """
+        Returns:
+            (query embedding, query filter, filter source)
+        """
+        print("[RAGService] Creating query embedding...")
+        query_embedding = QueryEmbedding(query=query, embedding_model=self.embedding_model).get_embedding()
+        print(f"[RAGService] Query embedding created: {query_embedding}")
+        query_filter, source = self._resolve_query_filter(query, query_embedding, self._load_known_keywords())
+        print(f"[RAGService] Query metadata: {query_filter}")
+        return query_embedding, query_filter, source
 
     def create_vector_store(self):
         print("[RAGService] Creating vector store...")
         self.vector_store_class_instance = VectorStore(self.chunks, self.embedding_model)
         self.index, self.namespace, self.vector_store = self.vector_store_class_instance.create_vectorestore()
+        self._build_retriever()
+
+    async def acreate_vector_store(self):
+        print("[RAGService] Creating vector store (async)...")
+        self.vector_store_class_instance = VectorStore(self.chunks, self.embedding_model)
+        self.index, self.namespace, self.vector_store = await self.vector_store_class_instance.acreate_vectorestore()
+        await asyncio.to_thread(self._build_retriever)
+
+    def _build_retriever(self):
+        """Everything derived from the chunks once they are in the vector store: BM25, retriever, summaries."""
+        self.index_name = self.vector_store_class_instance.index_name
+        # per-field metadata values, used to skip this document in library queries it cannot match
+        self.metadata_summary = summarize_metadata(self.chunks.page_metadata)
+        if self.chunk_index is not None:
+            self.chunk_index.save(self.chunk_index_path())
         print(f"[RAGService] Vector store created. Index: {self.index}, Namespace: {self.namespace}")
+        fingerprint = hashlib.sha1("|".join(self.chunks.chunk_ids).encode("utf-8")).hexdigest()
+        if fingerprint != self.answer_cache.fingerprint:
+            self.answer_cache.invalidate(fingerprint)
         ### Sparse Retriever(BM25)
-        self.sparse_retriever=BM25Retriever.from_documents(self.chunks)
-        self.sparse_retriever.k=3 ##top- k documents to retriever
+        self.sparse_retriever=BM25SparseRetriever(index=BM25Index.from_texts(self.chunks.texts()), docs=self.chunks)
+        # one retriever per session, query and filter are passed per call
+        self.retriever = self._make_retriever(self.sparse_retriever)
 
-        
+    def _make_retriever(self, sparse_retriever) -> Retriever:
+        settings = get_settings()
+        return Retriever(
+            self.vector_store, sparse_retriever, namespace=self.namespace,
+            dense_k=settings.retrieval_k, sparse_k=settings.retrieval_k,
+            weights=settings.fusion_weights, fusion_method=settings.fusion_method, rrf_k=settings.rrf_k
+        )
+
+    def chunk_index_path(self) -> str:
+        """Where this document's chunk index is persisted (one file per upload)."""
+        return os.path.join(get_settings().chunk_index_dir, f"{self.document_id}.npz")
+
+    @property
+    def heavy_state_loaded(self) -> bool:
+        return self.chunks is not None
+
+    def memory_footprint(self) -> dict:
+        """
+        Approximate bytes of session-owned state, per component. Models, LLM clients
+        and the vector store are shared across sessions and not counted. Chunk
+        texts are in the chunk index ("chunk_index"); "chunks" is the per-page metadata.
+        """
+        seen = set()
+        chunks = self.chunks
+        sparse_retriever = getattr(self, "sparse_retriever", None)
+        footprint = {
+            "chunk_index": deep_sizeof(vars(self.chunk_index), seen) if self.chunk_index is not None else 0,
+            "chunks": deep_sizeof(chunks.page_metadata, seen) if chunks is not None else 0,
+            "bm25": deep_sizeof(vars(sparse_retriever.index), seen) if sparse_retriever is not None else 0,
+            "keyword_index": (
+                deep_sizeof(vars(self.keyword_index), seen) + deep_sizeof(vars(self.keyword_index.matcher), seen)
+                if self.keyword_index is not None else 0
+            ),
+            "answer_cache": self.answer_cache.memory_bytes(seen),
+            "metadata_summary": deep_sizeof(self.metadata_summary, seen),
+        }
+        footprint["total"] = sum(footprint.values())
+        return footprint
+
+    def release_heavy_state(self):
+        """
+        Drop the per-document in-memory state (chunks, BM25, chunk index,
+        keyword index, cached answers, last query). Until it is rehydrated the
+        document stays queryable dense-only through the vector store, like a
+        library document whose session is gone; the metadata summary is kept for
+        library pruning.
+        """
+        with self._state_lock:
+            self._drop_heavy_state()
+
+    def _drop_heavy_state(self):
+        if self.chunks is None:
+            return
+        self.chunks = None
+        self.chunk_index = None
+        self.keyword_index = None
+        self._keyword_index_mtime = None
+        self.sparse_retriever = None
+        if getattr(self, "vector_store_class_instance", None) is not None:
+            self.vector_store_class_instance.text_chunks = None
+        self.answer_cache.invalidate(self.answer_cache.fingerprint)
+        if self.vector_store is not None:
+            self.retriever = self._make_retriever(None)
+
+    def spill_path(self) -> str:
+        """
+        Where this document's spilled state is written: one file per process and
+        upload, so workers sharing the spill directory never touch each other's files.
+        """
+        return os.path.join(get_settings().session_spill_dir, f"{os.getpid()}-{self.document_id}.npz")
+
+    def spill(self) -> bool:
+        """
+        Write the state `rehydrate` needs to disk, then release it from memory.
+
+        The file holds the per-page chunk metadata (JSON), the BM25 arrays and the
+        keyword embeddings; chunk texts come back from the chunk index saved at
+        ingest, which is only included when that file is missing. Returns False (nothing
+        released) when the document has no vector store to serve queries meanwhile.
+        """
+        with self._state_lock:
+            if self.chunks is None or self.sparse_retriever is None or self.namespace is None:
+                return False
+            arrays = self._chunk_arrays(chunk_index_kept=os.path.exists(self.chunk_index_path()))
+            if "keyword_embeddings" in arrays:
+                arrays["keyword_mtime"] = np.asarray(self._keyword_index_mtime, dtype=np.float64)
+            path = self.spill_path()
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            np.savez_compressed(path, **arrays)
+            self.spilled = True
+            self._drop_heavy_state()
+        return True
+
+    def _chunk_arrays(self, chunk_index_kept: bool) -> dict:
+        """Chunk metadata, BM25 and keyword embeddings as arrays; the chunk index only if its file is not kept."""
+        arrays = {f"bm25_{k}": v for k, v in self.sparse_retriever.index.to_arrays().items()}
+        arrays.update(self.chunks.to_arrays())
+        if not chunk_index_kept:
+            arrays.update({f"chunk_index_{k}": v for k, v in self.chunk_index.to_arrays().items()})
+        if self.keyword_index is not None and self.keyword_index.computed_embeddings() is not None:
+            arrays["keyword_embeddings"] = self.keyword_index.computed_embeddings()
+        return arrays
+
+    @staticmethod
+    def _chunks_from_arrays(arrays: dict, chunk_index: Optional[ChunkIndex]) -> ChunkStore:
+        chunk_index_arrays = {k[len("chunk_index_"):]: v for k, v in arrays.items() if k.startswith("chunk_index_")}
+        if chunk_index_arrays:
+            chunk_index = ChunkIndex.from_arrays(chunk_index_arrays)
+        if chunk_index is None:
+            raise FileNotFoundError("Chunk texts are neither stored nor available from a chunk index")
+        if "page_metadata" in arrays:
+            return ChunkStore.from_arrays(arrays, chunk_index)
+        # exported before chunk metadata was stored per page
+        return ChunkStore.from_chunk_metadata(chunk_index, json.loads(str(arrays["metadata"])))
+
+    def rehydrate(self):
+        """
+        Reload spilled state: chunks, BM25 and the hybrid retriever, chunk index,
+        keyword index. If the spill file (or the chunk index it needs) is gone, the
+        state is rebuilt from the shared session store, else from the chunk index
+        on disk, else the document stays dense-only; `spilled` is cleared either way.
+        """
+        with self._state_lock:
+            if self.chunks is not None or not self.spilled:
+                return
+            start = time.perf_counter()
+            path = self.spill_path()
+            try:
+                with np.load(path, allow_pickle=False) as data:
+                    arrays = {k: data[k] for k in data.files}
+                chunks = self._chunks_from_arrays(arrays, ChunkIndex.load(self.chunk_index_path()))
+            except FileNotFoundError as e:
+                print(f"[RAGService] Spilled state of {self.document_id} is unavailable ({e}), rebuilding")
+                self._rebuild_unspilled()
+                self.spilled = False
+                return
+            index = BM25Index.from_arrays({k[len("bm25_"):]: v for k, v in arrays.items() if k.startswith("bm25_")})
+            self.sparse_retriever = BM25SparseRetriever(index=index, docs=chunks)
+            self.chunk_index = chunks.index
+            keywords_path = self.keywords_path
+            if "keyword_embeddings" in arrays and keywords_path and os.path.exists(keywords_path) \
+                    and os.path.getmtime(keywords_path) == float(arrays["keyword_mtime"]):
+                # saves re-embedding the vocabulary on the first local-filter query
+                self.keyword_index = KeywordIndex(
+                    self._load_known_keywords(),
+                    embedding_model=self.embedding_model,
+                    similarity_threshold=get_settings().local_filter_similarity_threshold,
+                    embeddings=arrays["keyword_embeddings"]
+                )
+                self._keyword_index_mtime = float(arrays["keyword_mtime"])
+            self.retriever = self._make_retriever(self.sparse_retriever)
+            self.chunks = chunks
+            self.spilled = False
+            os.remove(path)
+            print(f"[RAGService] Rehydrated {len(chunks)} chunks from {path} in {(time.perf_counter() - start) * 1000:.1f}ms")
+
+    def _rebuild_unspilled(self):
+        """rehydrate() without a spill file; called with the state lock held."""
+        store = get_session_store()
+        state = store.get_document(self.document_id) if store.shared and self.document_id else None
+        if state is not None:
+            self._restore_document(self._state_arrays(state))
+            source = "the session store"
+        else:
+            chunk_index = ChunkIndex.load(self.chunk_index_path())
+            if chunk_index is None:
+                print(f"[RAGService] No state left for {self.document_id}, serving it dense-only")
+                return
+            # the per-page metadata went with the spill file; keep the ids the chunk index has
+            page_metadata = [
+                {"page_no": int(page_no), "doc_id": page_id, "chunk_id": f"{page_id}_p{int(page_no)}", "type": "text"}
+                for page_id, page_no in zip(chunk_index.page_ids, chunk_index.page_no)
+            ]
+            self.chunks = ChunkStore(chunk_index, page_metadata)
+            self.chunk_index = chunk_index
+            self.sparse_retriever = BM25SparseRetriever(index=BM25Index.from_texts(self.chunks.texts()), docs=self.chunks)
+            source = "the chunk index"
+        self.retriever = self._make_retriever(self.sparse_retriever)
+        print(f"[RAGService] Rebuilt {len(self.chunks)} chunks of {self.document_id} from {source}")
+
+    def ensure_loaded(self):
+        """Rehydrate spilled state before a query needs it (no-op when resident)."""
+        if self.spilled:
+            self.rehydrate()
+
+    def discard_spill(self):
+        if self.spilled and os.path.exists(self.spill_path()):
+            os.remove(self.spill_path())
+        self.spilled = False
+
+    def export_state(self) -> bytes:
+        """
+        Everything another worker needs to serve this document, as one npz blob:
+        chunks, BM25, chunk index, keyword vocabulary (and embeddings), the
+        document type and the vector store address. In-memory vector stores are
+        process-local, so their vectors are included too.
+        """
+        self.ensure_loaded()
+        with self._state_lock:
+            arrays = self._chunk_arrays(chunk_index_kept=False)
+            with open(self.keywords_path, "r") as f:
+                arrays["keywords"] = np.asarray(f.read())
+            if isinstance(self.vector_store, MemoryVectorStore):
+                arrays["vectors"] = self.vector_store.vectors
+            arrays["service"] = np.asarray(json.dumps({
+                "document_id": self.document_id,
+                "namespace": self.namespace,
+                "index_name": self.index_name,
+                "document_type": self.DocumentTypeScheme.model_dump() if self.DocumentTypeScheme is not None else None,
+                "metadata_summary": self.metadata_summary,
+                "fingerprint": self.answer_cache.fingerprint,
+            }, default=str))
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, **arrays)
+        return buffer.getvalue()
+
+    @staticmethod
+    def _state_arrays(state: bytes) -> dict:
+        with np.load(io.BytesIO(state), allow_pickle=False) as data:
+            return {k: data[k] for k in data.files}
+
+    @classmethod
+    def from_state(cls, state: bytes) -> "RAGService":
+        """A service for a document indexed elsewhere, from `export_state` output."""
+        start = time.perf_counter()
+        service = cls()
+        arrays = cls._state_arrays(state)
+        info = json.loads(str(arrays["service"]))
+        service.namespace, service.index_name = info["namespace"], info["index_name"]
+        # state exported before per-upload ids was keyed by the namespace
+        service.document_id = info.get("document_id") or info["namespace"]
+        service.metadata_summary = info["metadata_summary"]
+        service.answer_cache.invalidate(info["fingerprint"])
+        if info["document_type"] is not None:
+            service.DocumentTypeScheme = DocumentTypeSchema(**info["document_type"])
+            service.Document_Type = service.metadataservice.Return_document_model(service.DocumentTypeScheme)
+
+        # local copy of the vocabulary: the query-filter paths read it from a file
+        service.keywords_path = os.path.join(get_settings().chunk_index_dir, f"{service.document_id}.keywords.json")
+        os.makedirs(os.path.dirname(service.keywords_path) or ".", exist_ok=True)
+        with open(service.keywords_path, "w") as f:
+            f.write(str(arrays["keywords"]))
+        service._restore_document(arrays)
+
+        service.vector_store = open_vector_store(service.index_name, service.namespace, service.embedding_model)
+        if service.vector_store is None and "vectors" in arrays:
+            service.vector_store = MemoryVectorStore.from_vectors(service.chunks, arrays["vectors"], service.embedding_model, service.namespace)
+        service.retriever = service._make_retriever(service.sparse_retriever)
+        print(f"[RAGService] Restored document {service.document_id} ({len(service.chunks)} chunks) in {(time.perf_counter() - start) * 1000:.1f}ms")
+        return service
+
+    def _restore_document(self, arrays: dict):
+        """Chunks, chunk index (saved locally), BM25 and keyword index from `export_state` arrays."""
+        chunks = self._chunks_from_arrays(arrays, None)
+        self.chunk_index = chunks.index
+        self.chunk_index.save(self.chunk_index_path())
+        if "keyword_embeddings" in arrays and self.keywords_path and os.path.exists(self.keywords_path):
+            self.keyword_index = KeywordIndex(
+                self._load_known_keywords(),
+                embedding_model=self.embedding_model,
+                similarity_threshold=get_settings().local_filter_similarity_threshold,
+                embeddings=arrays["keyword_embeddings"]
+            )
+            self._keyword_index_mtime = os.path.getmtime(self.keywords_path)
+        index = BM25Index.from_arrays({k[len("bm25_"):]: v for k, v in arrays.items() if k.startswith("bm25_")})
+        self.sparse_retriever = BM25SparseRetriever(index=index, docs=chunks)
+        self.chunks = chunks
+
+    def _speculative_retrieve(self, retriever: Retriever, raw_query: str, query_embedding, known_keywords: dict, k: int, deadline: Deadline):
+        """
+        Overlap retrieval with the query-metadata LLM call.
+
+        If the local fast-path yields a filter there is nothing to overlap and a
+        filtered retrieval runs directly. Otherwise an unfiltered retrieval with a
+        wider k runs while the LLM extracts the metadata; the filter is then applied
+        locally to the candidates, and a filtered re-query is issued only when too
+        few dense hits survive. Under a deadline the LLM call is skipped or abandoned
+        (keeping the unfiltered candidates) and the re-query is skipped when they
+        would eat into the time reserved for the answer.
+
+        Returns:
+            (hits, timings, query filter, filter source)
+        """
+        settings = get_settings()
+        metadata_dict, _ = self._local_query_metadata(raw_query, query_embedding, known_keywords)
+        if metadata_dict is not None:
+            query_filter = self._to_query_filter(metadata_dict)
+            hits, timings = retriever.retrieve(raw_query, query_filter, k=k, query_embedding=query_embedding)
+            return hits, timings, query_filter, "local"
+
+        reserve = settings.deadline_answer_reserve_ms
+        if not deadline.affords(settings.deadline_llm_filter_ms, reserve):
+            deadline.degrade("llm_filter_skipped")
+            hits, timings = retriever.retrieve(raw_query, None, k=k, query_embedding=query_embedding)
+            return hits, timings, None, "none"
+
+        start = time.perf_counter()
+        metadata_future = _QUERY_EXECUTOR.submit(contextvars.copy_context().run, self._extract_query_metadata_llm, raw_query, query_embedding, known_keywords)
+        wide_hits, timings = retriever.retrieve(
+            raw_query, None, k=k * settings.speculative_k_multiplier, query_embedding=query_embedding
+        )
+        try:
+            query_filter = self._to_query_filter(metadata_future.result(timeout=deadline.timeout(reserve)))
+        except FutureTimeoutError:
+            deadline.degrade("llm_filter_timeout")
+            timings["metadata_ms"] = (time.perf_counter() - start) * 1000
+            return wide_hits[:2 * k], timings, None, "none"
+        timings["metadata_ms"] = (time.perf_counter() - start) * 1000
+
+        survivors, enough = self._speculative_survivors(wide_hits, query_filter)
+        if not enough:
+            # the re-query should take about as long as the wide retrieval did
+            if deadline.affords(timings["total_ms"], reserve):
+                hits, requery_timings = retriever.retrieve(raw_query, query_filter, k=k, query_embedding=query_embedding)
+                timings["requery_ms"] = requery_timings["total_ms"]
+                return hits, timings, query_filter, "llm"
+            deadline.degrade("requery_skipped")
+            return (survivors or wide_hits)[:2 * k], timings, query_filter, "llm"
+        return survivors[:2 * k], timings, query_filter, "llm"
+
+    @staticmethod
+    def _speculative_survivors(wide_hits, query_filter: dict):
+        """Candidates that satisfy the filter, and whether enough dense hits survived to skip a re-query."""
+        # the sparse leg is never filtered, so only dense hits have to satisfy the filter
+        survivors = [
+            hit for hit in wide_hits
+            if hit.sparse_rank is not None or MetadataService.matches_filter(hit.metadata, query_filter)
+        ]
+        dense_survivors = sum(1 for hit in survivors if hit.dense_rank is not None)
+        print(f"[RAGService] Speculative retrieval: {dense_survivors} dense hits survive filter {query_filter}")
+        return survivors, dense_survivors >= get_settings().speculative_min_survivors
+
+    async def _aspeculative_retrieve(self, retriever: Retriever, raw_query: str, query_embedding, known_keywords: dict, k: int, deadline: Deadline):
+        """Async _speculative_retrieve(): the metadata LLM call is a task awaited after the wide retrieval."""
+        settings = get_settings()
+        metadata_dict, _ = self._local_query_metadata(raw_query, query_embedding, known_keywords)
+        if metadata_dict is not None:
+            query_filter = self._to_query_filter(metadata_dict)
+            hits, timings = await retriever.aretrieve(raw_query, query_filter, k=k, query_embedding=query_embedding)
+            return hits, timings, query_filter, "local"
+
+        reserve = settings.deadline_answer_reserve_ms
+        if not deadline.affords(settings.deadline_llm_filter_ms, reserve):
+            deadline.degrade("llm_filter_skipped")
+            hits, timings = await retriever.aretrieve(raw_query, None, k=k, query_embedding=query_embedding)
+            return hits, timings, None, "none"
+
+        start = time.perf_counter()
+        metadata_task = asyncio.ensure_future(self._aextract_query_metadata_llm(raw_query, query_embedding, known_keywords))
+        wide_hits, timings = await retriever.aretrieve(
+            raw_query, None, k=k * settings.speculative_k_multiplier, query_embedding=query_embedding
+        )
+        try:
+            query_filter = self._to_query_filter(await asyncio.wait_for(metadata_task, deadline.timeout(reserve)))
+        except asyncio.TimeoutError:
+            deadline.degrade("llm_filter_timeout")
+            timings["metadata_ms"] = (time.perf_counter() - start) * 1000
+            return wide_hits[:2 * k], timings, None, "none"
+        timings["metadata_ms"] = (time.perf_counter() - start) * 1000
 
-    def retrive_documents(self, raw_query: str):
+        survivors, enough = self._speculative_survivors(wide_hits, query_filter)
+        if not enough:
+            if deadline.affords(timings["total_ms"], reserve):
+                hits, requery_timings = await retriever.aretrieve(raw_query, query_filter, k=k, query_embedding=query_embedding)
+                timings["requery_ms"] = requery_timings["total_ms"]
+                return hits, timings, query_filter, "llm"
+            deadline.degrade("requery_skipped")
+            return (survivors or wide_hits)[:2 * k], timings, query_filter, "llm"
+        return survivors[:2 * k], timings, query_filter, "llm"
+
+    def _get_reranker(self) -> CrossEncoderReranker:
+        if self.reranker is None:
+            settings = get_settings()
+            self.reranker = CrossEncoderReranker(
+                top_n=settings.rerank_top_n,
+                max_candidates=settings.rerank_candidates,
+                latency_budget_ms=settings.rerank_latency_budget_ms
+            )
+        return self.reranker
+
+    def _rerank_within(self, raw_query: str, hits, deadline: Deadline):
+        """Rerank in whatever time is left before the answer reserve: shortened, or skipped entirely."""
+        settings = get_settings()
+        available_ms = deadline.remaining_ms() - settings.deadline_answer_reserve_ms
+        if available_ms <= 0:
+            deadline.degrade("rerank_skipped")
+            return hits[:settings.retrieval_k]
+        latency_budget_ms = None
+        if available_ms < settings.rerank_latency_budget_ms:
+            deadline.degrade("rerank_shortened")
+            latency_budget_ms = available_ms
+        return self._get_reranker().rerank(raw_query, hits, latency_budget_ms=latency_budget_ms)
+
+    def _retrieve_for_query(self, raw_query: str, query_embedding, known_keywords: dict, deadline: Optional[Deadline] = None):
+        """
+        Filter resolution, hybrid retrieval and optional reranking for one query.
+        Optional stages are skipped or shortened as the deadline requires.
+
+        Reads the retriever once: a concurrent spill or rehydrate swaps
+        `self.retriever`, and this query keeps using the one it started with.
+
+        Returns:
+            (hits for the prompt, timings, query filter, filter source)
+        """
+        settings = get_settings()
+        deadline = deadline or Deadline()
+        # fetch a wider candidate set when the cross-encoder picks the final top_n
+        k = settings.rerank_candidates if settings.rerank_enabled else settings.retrieval_k
+        retriever = self.retriever
+        if settings.speculative_retrieval:
+            hits, timings, query_filter, source = self._speculative_retrieve(retriever, raw_query, query_embedding, known_keywords, k, deadline)
+        else:
+            query_filter, source = self._resolve_query_filter(raw_query, query_embedding, known_keywords, deadline)
+            hits, timings = retriever.retrieve(raw_query, query_filter, k=k, query_embedding=query_embedding)
+        if settings.rerank_enabled:
+            start = time.perf_counter()
+            hits = self._rerank_within(raw_query, hits, deadline)
+            timings["rerank_ms"] = (time.perf_counter() - start) * 1000
+        return hits, timings, query_filter, source
+
+    async def _aretrieve_for_query(self, raw_query: str, query_embedding, known_keywords: dict, deadline: Optional[Deadline] = None):
+        """Async _retrieve_for_query(); reranking (CPU) runs in a worker thread."""
+        settings = get_settings()
+        deadline = deadline or Deadline()
+        k = settings.rerank_candidates if settings.rerank_enabled else settings.retrieval_k
+        retriever = self.retriever
+        if settings.speculative_retrieval:
+            hits, timings, query_filter, source = await self._aspeculative_retrieve(retriever, raw_query, query_embedding, known_keywords, k, deadline)
+        else:
+            metadata_dict, _ = self._local_query_metadata(raw_query, query_embedding, known_keywords)
+            source = "local"
+            if metadata_dict is None:
+                metadata_dict = await self._aquery_metadata_within(raw_query, query_embedding, known_keywords, deadline)
+                source = "none" if metadata_dict is None else "llm"
+            query_filter = self._to_query_filter(metadata_dict)
+            hits, timings = await retriever.aretrieve(raw_query, query_filter, k=k, query_embedding=query_embedding)
+        if settings.rerank_enabled:
+            start = time.perf_counter()
+            hits = await asyncio.to_thread(self._rerank_within, raw_query, hits, deadline)
+            timings["rerank_ms"] = (time.perf_counter() - start) * 1000
+        return hits, timings, query_filter, source
+
+    async def aembed_query(self, query: str):
+        """Embed on the dedicated embedding executor so the event loop stays free."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_EMBED_EXECUTOR, self.embedding_model.embed_query, query)
+
+    async def aretrieve(self, raw_query: str) -> QueryResult:
+        """Async retrive_documents()."""
+        print("[RAGService] Retrieving documents from vector store (async)...")
+        if self.spilled:
+            await asyncio.to_thread(self.rehydrate)
+        query_embedding = await self.aembed_query(raw_query)
+        known_keywords = await asyncio.to_thread(self._load_known_keywords)
+        hits, timings, query_filter, source = await self._aretrieve_for_query(raw_query, query_embedding, known_keywords)
+        return QueryResult(raw_query, None, hits, timings, query_filter=query_filter, filter_source=source)
+
+    def retrive_documents(self, raw_query: str) -> QueryResult:
+        """Retrieval only: the result's answer is None."""
         print("[RAGService] Retrieving documents from vector store...")
-        self.create_query_embedding(raw_query)
-        
-        self.retriever = Retriever(self.index,raw_query,self.query_metadata, self.namespace, self.vector_store,sparse_retriever = self.sparse_retriever,llm = self.llm)
-        self.result = self.retriever.retrieval_from_pinecone_vectoreStore()
-        # self.result = self.retriever.invoke(raw_query)
-        # print(f"[RAGService] Retrieval result: {self.result}")
-    
-    def answer_query(self, raw_query:str) -> str:
-        """Answer user query using retrieved documents and LLM"""
-        print(f"[RAGService] Answering query: {raw_query}")
-        # top_clause = self.result['matches']
-        # top_clause_dicts = [r.to_dict() for r in top_clause]
-        # self.top_clauses = top_clause_dicts
-        # keys_to_remove = {"file_path", "source", "producer", "keywords", "subject", "added_new_keyword", "author", "chunk_id"}
-        # for r in top_clause_dicts:
-        #     meta = r.get("metadata", {})
-        #     for k in keys_to_remove:
-        #         meta.pop(k, None)
-
-        # context_clauses = json.dumps(top_clause_dicts, separators=(",", ":"))
-        context_clauses = [doc.page_content for doc in self.result]
+        self.ensure_loaded()
+        query_embedding = QueryEmbedding(query=raw_query, embedding_model=self.embedding_model).get_embedding()
+        return self._retrieve_uncached(raw_query, query_embedding)
+
+    @staticmethod
+    def _response_text(response) -> str:
+        # Extract string content from response object
+        if hasattr(response, 'content'):
+            return response.content
+        elif isinstance(response, str):
+            return response
+        else:
+            return str(response)
+
+    def _context_blocks(self, hits, token_budget: Optional[int] = None) -> List[str]:
+        """Deduplicated, overlap-merged context blocks that fit the prompt token budget."""
+        settings = get_settings()
+        assembler = ContextAssembler(
+            token_budget=token_budget or settings.context_token_budget,
+            dedup_threshold=settings.context_dedup_threshold
+        )
+        chunk_index = self.chunk_index  # read once: a concurrent spill may drop it
+        if settings.context_expansion != "none" and chunk_index is not None:
+            # small-to-big: add neighbouring chunks / the parent page straight from the index
+            hits = chunk_index.expand_hits(hits, mode=settings.context_expansion, window=settings.context_expansion_window)
+        blocks, stats = assembler.assemble(hits)
+        print(f"[RAGService] Context: {stats['selected']}/{len(hits)} chunks, {stats['duplicates']} near-duplicates dropped, ~{stats['context_tokens']} tokens")
+        return blocks
+
+    def _answer_prompt(self, raw_query: str, hits, deadline: Optional[Deadline] = None) -> str:
+        settings = get_settings()
+        token_budget = None
+        remaining_ms = deadline.remaining_ms() if deadline is not None else None
+        if remaining_ms is not None and remaining_ms < settings.deadline_answer_reserve_ms:
+            # behind schedule: a shorter prompt is the remaining lever on answer latency
+            deadline.degrade("context_reduced")
+            fraction = max(settings.deadline_min_context_fraction, remaining_ms / settings.deadline_answer_reserve_ms)
+            token_budget = max(1, int(settings.context_token_budget * fraction))
+        context_clauses = self._context_blocks(hits, token_budget)
 
         print(f"context_clauses: {context_clauses}")
 
-        prompt = f"""
+        return f"""
         You are a legal/insurance domain expert and policy analyst. 
         Use the following extracted clauses from policy documents to answer the question.  
         If you can't find the answer, say "I don't know".
         Context clauses:
-        {"".join(context_clauses)}
+        {chr(10).join(context_clauses)}
         Question: {raw_query}
         """
+
+    def _generate_answer(self, raw_query: str, hits, llm=None, deadline: Optional[Deadline] = None) -> str:
+        prompt = self._answer_prompt(raw_query, hits, deadline)
         print("[RAGService] Invoking LLM with prompt...")
-        response = self.llm.invoke(prompt)
+        response = (llm or self.answer_llm).invoke(prompt)
         print(f"[RAGService] LLM response: {response}")
-        
-        # Extract string content from response object
-        if hasattr(response, 'content'):
-            return response.content
-        elif isinstance(response, str):
-            return response
-        else:
-            return str(response)
\ No newline at end of file
+        return self._response_text(response)
+
+    async def _agenerate_answer(self, raw_query: str, hits, deadline: Optional[Deadline] = None) -> str:
+        prompt = self._answer_prompt(raw_query, hits, deadline)
+        print("[RAGService] Invoking LLM with prompt (async)...")
+        response = await self.answer_llm.ainvoke(prompt)
+        return self._response_text(response)
+
+    def _stream_answer(self, prompt: str):
+        """Yield answer text pieces as the LLM produces them."""
+        print("[RAGService] Streaming LLM response...")
+        for chunk in self.answer_llm.stream(prompt):
+            text = self._response_text(chunk)
+            if text:
+                yield text
+
+    def _generate_packed_answers(self, questions: List[str], hits_per_question: List[list]) -> List[str]:
+        """Answer several questions in one LLM call over their deduplicated, shared context."""
+        # interleave the questions' hits by rank so the shared budget is spent fairly
+        shared = {}
+        for rank in range(max((len(hits) for hits in hits_per_question), default=0)):
+            for hits in hits_per_question:
+                if rank < len(hits):
+                    shared.setdefault(hits[rank].chunk_id, hits[rank])
+        blocks = self._context_blocks(list(shared.values()), token_budget=get_settings().context_token_budget * len(questions))
+        context_clauses = [f"[{i}] {block}" for i, block in enumerate(blocks, 1)]
+        numbered_questions = [f"{i}. {q}" for i, q in enumerate(questions, 1)]
+        prompt = f"""
+        You are a legal/insurance domain expert and policy analyst. 
+        Use the following extracted clauses from policy documents to answer each question.  
+        If you can't find the answer to a question, answer "I don't know".
+        Return exactly one answer per question, in the same order.
+        Context clauses:
+        {chr(10).join(context_clauses)}
+        Questions:
+        {chr(10).join(numbered_questions)}
+        """
+        print(f"[RAGService] Invoking LLM for {len(questions)} packed questions ({len(shared)} shared clauses)...")
+        result: PackedAnswers = chain_cache.structured_llm(self.llm, PackedAnswers).invoke(prompt)
+        answers = list(result.answers)[:len(questions)]
+        return answers + ["I don't know"] * (len(questions) - len(answers))
+
+    def batch_query(self, questions: List[str], max_concurrency: Optional[int] = None) -> List[QueryResult]:
+        """
+        Answer many questions over this document.
+
+        All questions are embedded in one batched forward pass, retrieval runs for all
+        of them concurrently, and answers are generated with bounded concurrency (or
+        packed `batch_pack_size` questions per LLM call over their shared context).
+        Questions already in the answer cache skip retrieval and generation.
+
+        Returns:
+            one QueryResult per question, in order
+        """
+        self.ensure_loaded()
+        settings = get_settings()
+        max_concurrency = max_concurrency or settings.batch_max_concurrency
+        start = time.perf_counter()
+        query_embeddings = self.embedding_model.embed_documents(questions)
+        embed_ms = (time.perf_counter() - start) * 1000
+
+        results: List[Optional[QueryResult]] = [None] * len(questions)
+        if settings.answer_cache_enabled:
+            for i, (question, embedding) in enumerate(zip(questions, query_embeddings)):
+                cached = self.answer_cache.get(question, embedding)
+                if cached is not None:
+                    results[i] = QueryResult(
+                        question, cached.answer, cached.hits,
+                        {"embed_ms": embed_ms, "cache_saved_ms": cached.compute_ms},
+                        cached=cached.match
+                    )
+        pending = [i for i, r in enumerate(results) if r is None]
+
+        if pending:
+            known_keywords = self._load_known_keywords()
+            # build the keyword index (and its embeddings) once, before the worker threads need it
+            _ = self._get_keyword_index(known_keywords).embeddings
+
+            # workers run in copies of the caller's context, so its LLM priority applies to their calls
+            context = contextvars.copy_context()
+
+            def in_context(fn):
+                return lambda *args: context.copy().run(fn, *args)
+
+            with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="batch-query") as pool:
+                retrievals = dict(zip(pending, pool.map(
+                    in_context(lambda i: self._retrieve_for_query(questions[i], query_embeddings[i], known_keywords)),
+                    pending
+                )))
+
+                def timed(fn, *args):
+                    t = time.perf_counter()
+                    return fn(*args), (time.perf_counter() - t) * 1000
+
+                answers, answer_ms = {}, {}
+                pack_size = max(1, settings.batch_pack_size)
+                if pack_size == 1:
+                    generated = pool.map(in_context(lambda i: timed(self._generate_answer, questions[i], retrievals[i][0], self.llm)), pending)
+                    for i, (answer, ms) in zip(pending, generated):
+                        answers[i], answer_ms[i] = answer, ms
+                else:
+                    packs = [pending[j:j + pack_size] for j in range(0, len(pending), pack_size)]
+                    packed = pool.map(
+                        in_context(lambda ids: timed(self._generate_packed_answers, [questions[i] for i in ids], [retrievals[i][0] for i in ids])),
+                        packs
+                    )
+                    for ids, (pack_answers, ms) in zip(packs, packed):
+                        for i, answer in zip(ids, pack_answers):
+                            answers[i], answer_ms[i] = answer, ms
+
+            for i in pending:
+                hits, timings, query_filter, source = retrievals[i]
+                timings = {**timings, "embed_ms": embed_ms, "answer_ms": answer_ms[i]}
+                results[i] = QueryResult(
+                    questions[i], answers[i], hits, timings, query_filter=query_filter, filter_source=source
+                )
+                if settings.answer_cache_enabled:
+                    self.answer_cache.put(
+                        questions[i], query_embeddings[i], answers[i], hits,
+                        compute_ms=timings.get("total_ms", 0.0) + answer_ms[i]
+                    )
+
+        total_ms = (time.perf_counter() - start) * 1000
+        print(f"[RAGService] Batch of {len(questions)} questions ({len(questions) - len(pending)} cached) answered in {total_ms:.1f}ms")
+        return results
+
+    def _lookup_answer_cache(self, raw_query: str):
+        """
+        Exact lookup first (no embedding needed), then the semantic one.
+
+        Returns:
+            (cached answer or None, query embedding or None if never computed)
+        """
+        settings = get_settings()
+        cached = self.answer_cache.get_exact(raw_query) if settings.answer_cache_enabled else None
+        query_embedding = None
+        if cached is None:
+            query_embedding = QueryEmbedding(query=raw_query, embedding_model=self.embedding_model).get_embedding()
+            if settings.answer_cache_enabled:
+                cached = self.answer_cache.get(raw_query, query_embedding)
+        if cached is not None:
+            print(f"[RAGService] Answer cache {cached.match} hit for: {raw_query}")
+        return cached, query_embedding
+
+    def _retrieve_uncached(self, raw_query: str, query_embedding, deadline: Optional[Deadline] = None) -> QueryResult:
+        hits, timings, query_filter, source = self._retrieve_for_query(
+            raw_query, query_embedding, self._load_known_keywords(), deadline
+        )
+        return QueryResult(raw_query, None, hits, timings, query_filter=query_filter, filter_source=source)
+
+    @staticmethod
+    def _cached_result(raw_query: str, cached, timings: dict) -> QueryResult:
+        return QueryResult(raw_query, cached.answer, cached.hits, {**timings, "cache_saved_ms": cached.compute_ms}, cached=cached.match)
+
+    @staticmethod
+    def _deadline(latency_budget_ms: Optional[float]) -> Deadline:
+        """The query's deadline: the request's budget, else the configured default (None = no deadline)."""
+        return Deadline(latency_budget_ms if latency_budget_ms is not None else get_settings().query_latency_budget_ms)
+
+    def run_query(self, raw_query: str, latency_budget_ms: Optional[float] = None) -> QueryResult:
+        """
+        Retrieve and answer one query, serving repeated and near-duplicate questions
+        from the answer cache. With a latency budget, optional stages (LLM query
+        filter, re-query, rerank, full context) are skipped or shortened as needed.
+
+        Nothing about the query is kept on the service, so concurrent calls on the
+        same document are independent.
+
+        Returns:
+            QueryResult with answer, hits, timings, cached ("exact", "semantic" or None)
+            and degradations (the optional stages skipped or shortened)
+        """
+        deadline = self._deadline(latency_budget_ms)
+        self.ensure_loaded()
+        start = time.perf_counter()
+        cached, query_embedding = self._lookup_answer_cache(raw_query)
+        if cached is not None:
+            return self._cached_result(raw_query, cached, {"total_ms": (time.perf_counter() - start) * 1000})
+
+        result = self._retrieve_uncached(raw_query, query_embedding, deadline)
+        answer_start = time.perf_counter()
+        result.answer = self._generate_answer(raw_query, result.hits, deadline=deadline)
+        result.timings["answer_ms"] = (time.perf_counter() - answer_start) * 1000
+        result.timings.update(deadline.timings())
+        result.degradations = deadline.degradations
+        compute_ms = (time.perf_counter() - start) * 1000
+        # degraded answers are not cached: a later query with time to spare should get the full pipeline
+        if get_settings().answer_cache_enabled and not deadline.degradations:
+            self.answer_cache.put(raw_query, query_embedding, result.answer, result.hits, compute_ms)
+        return result
+
+    async def aquery(self, raw_query: str, latency_budget_ms: Optional[float] = None) -> QueryResult:
+        """Async run_query(): same answer cache, deadline, retrieval and answer, without blocking the event loop."""
+        settings = get_settings()
+        deadline = self._deadline(latency_budget_ms)
+        if self.spilled:
+            await asyncio.to_thread(self.rehydrate)
+        start = time.perf_counter()
+        cached = self.answer_cache.get_exact(raw_query) if settings.answer_cache_enabled else None
+        query_embedding = None
+        if cached is None:
+            query_embedding = await self.aembed_query(raw_query)
+            if settings.answer_cache_enabled:
+                cached = self.answer_cache.get(raw_query, query_embedding)
+        if cached is not None:
+            print(f"[RAGService] Answer cache {cached.match} hit for: {raw_query}")
+            return self._cached_result(raw_query, cached, {"total_ms": (time.perf_counter() - start) * 1000})
+
+        known_keywords = await asyncio.to_thread(self._load_known_keywords)
+        hits, timings, query_filter, source = await self._aretrieve_for_query(
+            raw_query, query_embedding, known_keywords, deadline
+        )
+        answer_start = time.perf_counter()
+        answer = await self._agenerate_answer(raw_query, hits, deadline)
+        timings["answer_ms"] = (time.perf_counter() - answer_start) * 1000
+        timings.update(deadline.timings())
+        compute_ms = (time.perf_counter() - start) * 1000
+        if settings.answer_cache_enabled and not deadline.degradations:
+            self.answer_cache.put(raw_query, query_embedding, answer, hits, compute_ms)
+        return QueryResult(
+            raw_query, answer, hits, timings, degradations=deadline.degradations,
+            query_filter=query_filter, filter_source=source
+        )
+
+    def stream_query(self, raw_query: str, latency_budget_ms: Optional[float] = None):
+        """
+        Streaming variant of run_query. Yields (event, payload) pairs:
+
+            ("retrieval", QueryResult without the answer)  as soon as the sources are known
+            ("token", str)                                 for every answer piece
+            ("done", QueryResult)                          timings incl. time_to_first_token_ms
+        """
+        deadline = self._deadline(latency_budget_ms)
+        self.ensure_loaded()
+        start = time.perf_counter()
+        cached, query_embedding = self._lookup_answer_cache(raw_query)
+        if cached is not None:
+            result = self._cached_result(raw_query, cached, {})
+            timings = result.timings
+            yield "retrieval", QueryResult(raw_query, None, result.hits, dict(timings), cached=result.cached)
+            timings["time_to_first_token_ms"] = (time.perf_counter() - start) * 1000
+            yield "token", result.answer
+            timings["total_ms"] = (time.perf_counter() - start) * 1000
+            yield "done", result
+            return
+
+        result = self._retrieve_uncached(raw_query, query_embedding, deadline)
+        timings = result.timings
+        # the prompt is built first so a reduced context is reported with the sources
+        prompt = self._answer_prompt(raw_query, result.hits, deadline)
+        yield "retrieval", QueryResult(
+            raw_query, None, result.hits, dict(timings), degradations=list(deadline.degradations),
+            query_filter=result.query_filter, filter_source=result.filter_source
+        )
+
+        answer_start = time.perf_counter()
+        pieces = []
+        for piece in self._stream_answer(prompt):
+            if not pieces:
+                timings["time_to_first_token_ms"] = (time.perf_counter() - start) * 1000
+            pieces.append(piece)
+            yield "token", piece
+        timings["answer_ms"] = (time.perf_counter() - answer_start) * 1000
+        compute_ms = (time.perf_counter() - start) * 1000
+        timings["end_to_end_ms"] = compute_ms
+        timings.update(deadline.timings())
+        print(f"[RAGService] Streamed answer: ttft={timings.get('time_to_first_token_ms', compute_ms):.1f}ms total={compute_ms:.1f}ms")
+        if get_settings().answer_cache_enabled and not deadline.degradations:
+            self.answer_cache.put(raw_query, query_embedding, "".join(pieces), result.hits, compute_ms)
+        yield "done", QueryResult(
+            raw_query, "".join(pieces), result.hits, timings, degradations=list(deadline.degradations),
+            query_filter=result.query_filter, filter_source=result.filter_source
+        )
+
+    def answer_query(self, raw_query:str) -> str:
+        """Answer user query using retrieved documents and LLM"""
+        print(f"[RAGService] Answering query: {raw_query}")
+        return self.run_query(raw_query).answer
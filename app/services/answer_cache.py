@@ -0,0 +1,137 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, List, Optional
+
+import numpy as np
+
+from app.utils.memory_utils import deep_sizeof
+
+
+def normalize_query(query: str) -> str:
+    """Case/whitespace/trailing-punctuation insensitive cache key."""
+    return " ".join(query.lower().split()).rstrip("?.! ")
+
+
+@dataclass
+class CachedAnswer:
+    query: str
+    answer: str
+    hits: List[Any]
+    compute_ms: float  # what producing the answer originally cost
+    created_at: float = field(default_factory=time.time)
+    match: str = "exact"  # "exact" or "semantic" when served
+
+
+class AnswerCache:
+    """
+    Per-document cache of answers.
+
+    Exact hits are looked up by normalised query text. Near-duplicates are found
+    with a cosine search over the cached questions' embeddings (a small in-memory
+    matrix). Entries are evicted LRU beyond `max_entries` and expire after
+    `ttl_seconds`. The whole cache is dropped when the document fingerprint
+    (its chunk ids) changes.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 3600, similarity_threshold: float = 0.95):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.fingerprint: Optional[str] = None
+        self._entries: "OrderedDict[str, CachedAnswer]" = OrderedDict()
+        self._keys: List[str] = []
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.latency_saved_ms = 0.0
+
+    def _remove(self, key: str):
+        self._entries.pop(key, None)
+        if key in self._keys:
+            row = self._keys.index(key)
+            self._keys.pop(row)
+            self._matrix = np.delete(self._matrix, row, axis=0)
+
+    def _expired(self, entry: CachedAnswer) -> bool:
+        return time.time() - entry.created_at > self.ttl_seconds
+
+    def _serve(self, key: str, match: str) -> Optional[CachedAnswer]:
+        entry = self._entries[key]
+        if self._expired(entry):
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        if match == "exact":
+            self.exact_hits += 1
+        else:
+            self.semantic_hits += 1
+        self.latency_saved_ms += entry.compute_ms
+        return CachedAnswer(entry.query, entry.answer, entry.hits, entry.compute_ms, entry.created_at, match)
+
+    def get_exact(self, query: str) -> Optional[CachedAnswer]:
+        key = normalize_query(query)
+        with self._lock:
+            if key in self._entries:
+                return self._serve(key, "exact")
+        return None
+
+    def get(self, query: str, query_embedding=None) -> Optional[CachedAnswer]:
+        """Exact hit first, then the most similar cached question above the threshold."""
+        key = normalize_query(query)
+        with self._lock:
+            if key in self._entries:
+                served = self._serve(key, "exact")
+                if served:
+                    return served
+            if query_embedding is not None and self._keys:
+                q = np.asarray(query_embedding, dtype=np.float32)
+                q = q / (np.linalg.norm(q) or 1.0)
+                sims = self._matrix @ q
+                best = int(np.argmax(sims))
+                if sims[best] >= self.similarity_threshold:
+                    served = self._serve(self._keys[best], "semantic")
+                    if served:
+                        return served
+            self.misses += 1
+        return None
+
+    def put(self, query: str, query_embedding, answer: str, hits: List[Any], compute_ms: float):
+        key = normalize_query(query)
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = CachedAnswer(query, answer, list(hits), compute_ms)
+            if query_embedding is not None:
+                v = np.asarray(query_embedding, dtype=np.float32)
+                v = v / (np.linalg.norm(v) or 1.0)
+                self._matrix = v[None, :] if not self._keys else np.vstack([self._matrix, v])
+                self._keys.append(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, fingerprint: Optional[str] = None):
+        """Drop every entry, e.g. because the document's chunks changed."""
+        with self._lock:
+            self._entries.clear()
+            self._keys = []
+            self._matrix = np.zeros((0, 0), dtype=np.float32)
+            self.fingerprint = fingerprint
+
+    def memory_bytes(self, seen: Optional[set] = None) -> int:
+        """Approximate bytes held by the cached answers, their hits and the embedding matrix."""
+        with self._lock:
+            return deep_sizeof(self._entries, seen) + deep_sizeof(self._keys, seen) + deep_sizeof(self._matrix, seen)
+
+    def metrics(self) -> dict:
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0,
+            "latency_saved_ms": self.latency_saved_ms,
+        }
@@ -0,0 +1,118 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from app.config.config import get_settings
+from app.core.session_manager import SessionManager, session_manager
+from app.embedding.embeder import QueryEmbedding
+from app.embedding.vectore_store import open_vector_store
+from app.retrieval.library import LibraryDocument, LibrarySearch
+from app.retrieval.retriever import Retriever
+from app.services.RAG_service import get_models
+from app.utils.model_router import get_router
+
+# Dense-only retrievers for documents whose session is no longer in memory, keyed by
+# (index, namespace); bounded LRU (library_restored_retrievers_max) shared by request threads
+_restored_retrievers: "OrderedDict[Tuple[str, str], Retriever]" = OrderedDict()
+_restored_lock = threading.Lock()
+
+
+class LibraryService:
+    """Answer queries across every document a user has uploaded."""
+
+    def __init__(self, manager: SessionManager):
+        self.manager = manager
+
+    def _restored_retriever(self, index_name: str, namespace: str) -> Optional[Retriever]:
+        key = (index_name, namespace)
+        with _restored_lock:
+            if key in _restored_retrievers:
+                _restored_retrievers.move_to_end(key)
+                return _restored_retrievers[key]
+        # opened outside the lock; a concurrent request for the same key keeps the first one stored
+        vector_store = open_vector_store(index_name, namespace, get_models())
+        if vector_store is None:
+            # in-memory stores do not outlive the process that built them
+            return None
+        with _restored_lock:
+            retriever = _restored_retrievers.setdefault(key, Retriever(vector_store, None, namespace=namespace))
+            _restored_retrievers.move_to_end(key)
+            while len(_restored_retrievers) > get_settings().library_restored_retrievers_max:
+                _restored_retrievers.popitem(last=False)
+        return retriever
+
+    def documents(self, username: str) -> List[LibraryDocument]:
+        """
+        The user's library. Live sessions are searched hybrid (dense + BM25) and carry
+        metadata summaries; sessions only known to the database are searched dense-only.
+        """
+        documents = []
+        live = {}
+        for session in self.manager.get_user_sessions(username):
+            service = session.rag_service
+            if service is not None and service.retriever is not None:
+                live[session.session_id] = session
+                documents.append(LibraryDocument(
+                    session_id=session.session_id,
+                    document_name=session.document_info.get("filename"),
+                    retriever=service.retriever,
+                    metadata_summary=service.metadata_summary,
+                ))
+        for row in self.manager.db.get_user_sessions(username):
+            if row["session_id"] in live or not row["pinecone_index"] or not row["pinecone_namespace"]:
+                continue
+            retriever = self._restored_retriever(row["pinecone_index"], row["pinecone_namespace"])
+            if retriever is None:
+                continue
+            documents.append(LibraryDocument(
+                session_id=row["session_id"],
+                document_name=row["document_name"],
+                retriever=retriever,
+            ))
+        return documents
+
+    def _generate_answer(self, query: str, hits) -> str:
+        context_clauses = [
+            f"[{hit.metadata.get('document_name') or hit.metadata.get('session_id')}] {hit.text}" for hit in hits
+        ]
+        prompt = f"""
+        You are a legal/insurance domain expert and policy analyst.
+        Use the following extracted clauses from the user's documents to answer the question.
+        Each clause is prefixed with the document it comes from; mention the document when it matters.
+        If you can't find the answer, say "I don't know".
+        Context clauses:
+        {chr(10).join(context_clauses)}
+        Question: {query}
+        """
+        response = get_router().llm("answer").invoke(prompt)
+        return response.content if hasattr(response, "content") else str(response)
+
+    def query(self, username: str, query: str, metadata_filter: Optional[dict] = None, k: Optional[int] = None) -> dict:
+        """
+        Returns:
+            dict with answer, hits and stats (documents searched / pruned, timings)
+        """
+        settings = get_settings()
+        documents = self.documents(username)
+        if not documents:
+            return {"answer": None, "hits": [], "stats": {"documents": 0}}
+
+        start = time.perf_counter()
+        query_embedding = QueryEmbedding(query=query, embedding_model=get_models()).get_embedding()
+        embed_ms = (time.perf_counter() - start) * 1000
+        search = LibrarySearch(
+            documents, weights=settings.fusion_weights, fusion_method=settings.fusion_method, rrf_k=settings.rrf_k
+        )
+        hits, stats = search.search(query, query_embedding, metadata_filter, k=k or settings.library_k)
+        stats["embed_ms"] = embed_ms
+
+        answer = None
+        if hits:
+            answer_start = time.perf_counter()
+            answer = self._generate_answer(query, hits)
+            stats["answer_ms"] = (time.perf_counter() - answer_start) * 1000
+        return {"answer": answer, "hits": hits, "stats": stats}
+
+
+library_service = LibraryService(session_manager)
@@ -0,0 +1,19 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+
+@dataclass
+class QueryResult:
+    """
+    Everything one query produced. RAGService builds a new one per call and keeps
+    no per-query state itself, so concurrent queries on the same document cannot
+    see each other's sources.
+    """
+    query: str
+    answer: Optional[str]  # None for retrieval-only calls
+    hits: List[Any]
+    timings: Dict[str, float]
+    cached: Optional[str] = None  # "exact", "semantic" or None
+    degradations: List[str] = field(default_factory=list)  # optional stages skipped or shortened
+    query_filter: Optional[dict] = None  # metadata filter the retrieval used
+    filter_source: Optional[str] = None  # "local", "llm" or "none"
@@ -0,0 +1,130 @@
+import json
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Callable, Type
+
+from langchain_core.exceptions import OutputParserException
+from langchain_core.output_parsers import PydanticOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import Runnable, RunnableLambda
+from pydantic import BaseModel, ValidationError
+
+# Schema-derived strings and parsers: built once per schema class
+
+
+@lru_cache(maxsize=None)
+def schema_json(schema: Type[BaseModel]) -> str:
+    return json.dumps(schema.model_json_schema(), indent=2)
+
+
+@lru_cache(maxsize=None)
+def output_parser(schema: Type[BaseModel]) -> PydanticOutputParser:
+    return PydanticOutputParser(pydantic_object=schema)
+
+
+@lru_cache(maxsize=None)
+def format_instructions(schema: Type[BaseModel]) -> str:
+    return output_parser(schema).get_format_instructions()
+
+
+def _require_result(result):
+    # native structured output yields None when the model's reply does not fit the schema
+    if result is None:
+        raise OutputParserException("structured output returned no result")
+    return result
+
+
+def _validation_as_parse_error(chain: Runnable) -> Runnable:
+    """
+    `chain` with pydantic ValidationErrors re-raised as OutputParserException, so a
+    native reply that does not validate fails exactly like one the parser rejects.
+    """
+    def invoke(inputs, config):
+        try:
+            return chain.invoke(inputs, config)
+        except ValidationError as e:
+            raise OutputParserException(f"structured output failed validation: {e}") from e
+
+    async def ainvoke(inputs, config):
+        try:
+            return await chain.ainvoke(inputs, config)
+        except ValidationError as e:
+            raise OutputParserException(f"structured output failed validation: {e}") from e
+
+    return RunnableLambda(invoke, afunc=ainvoke)
+
+
+class ChainCache:
+    """
+    Compiled `prompt | llm | parser` chains keyed by (task, schema class, model).
+
+    `prompt_factory(schema, native)` builds the task's prompt with the schema-derived
+    parts already bound; it runs once per key. With native=True the model is bound
+    via `with_structured_output` (provider-side JSON mode / tool calling) and the
+    prompt can omit the schema and format instructions; models that do not support
+    it fall back to the parser chain. Bounded LRU, since callers may pass short-lived
+    model objects.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._chains: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, key: tuple, llm):
+        with self._lock:
+            entry = self._chains.get(key)
+            # keys hold id(llm); the stored reference guards against a reused id
+            if entry is not None and entry[0] is llm:
+                self._chains.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def _store(self, key: tuple, llm, runnable):
+        with self._lock:
+            self._chains[key] = (llm, runnable)
+            self._chains.move_to_end(key)
+            while len(self._chains) > self.max_entries:
+                self._chains.popitem(last=False)
+
+    def chain(self, task: str, schema: Type[BaseModel], llm,
+              prompt_factory: Callable[[Type[BaseModel], bool], ChatPromptTemplate], native: bool = False) -> Runnable:
+        key = ("chain", task, schema, id(llm), native)
+        chain = self._lookup(key, llm)
+        if chain is None:
+            structured = self._native_llm(llm, schema) if native else None
+            if structured is not None:
+                chain = _validation_as_parse_error(prompt_factory(schema, True) | structured | RunnableLambda(_require_result))
+            else:
+                chain = prompt_factory(schema, False) | llm | output_parser(schema)
+            self._store(key, llm, chain)
+        return chain
+
+    def structured_llm(self, llm, schema: Type[BaseModel]) -> Runnable:
+        """Cached `llm.with_structured_output(schema)`."""
+        key = ("structured", schema, id(llm))
+        structured = self._lookup(key, llm)
+        if structured is None:
+            structured = llm.with_structured_output(schema)
+            self._store(key, llm, structured)
+        return structured
+
+    @staticmethod
+    def _native_llm(llm, schema: Type[BaseModel]):
+        try:
+            return llm.with_structured_output(schema)
+        except (NotImplementedError, AttributeError):
+            print(f"[ChainCache] {type(llm).__name__} has no native structured output, using the parser chain")
+            return None
+
+    def metrics(self) -> dict:
+        return {"entries": len(self._chains), "hits": self.hits, "misses": self.misses}
+
+
+# Global chain cache (shared by every session and ingestion job)
+chain_cache = ChainCache()
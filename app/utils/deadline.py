@@ -0,0 +1,46 @@
+import math
+import time
+from typing import List, Optional
+
+
+class Deadline:
+    """
+    Latency budget of one query, passed down the pipeline.
+
+    Stages ask whether they still fit (`affords`) before running and record a
+    degradation when they are skipped or shortcut. With no budget every stage
+    fits and nothing is degraded.
+    """
+
+    def __init__(self, budget_ms: Optional[float] = None):
+        self.budget_ms = budget_ms
+        self.start = time.perf_counter()
+        self.degradations: List[str] = []
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.start) * 1000
+
+    def remaining_ms(self) -> float:
+        if self.budget_ms is None:
+            return math.inf
+        return self.budget_ms - self.elapsed_ms()
+
+    def affords(self, stage_ms: float, reserve_ms: float = 0.0) -> bool:
+        """Whether a stage expected to take `stage_ms` fits, keeping `reserve_ms` for later stages."""
+        return self.remaining_ms() - reserve_ms >= stage_ms
+
+    def timeout(self, reserve_ms: float = 0.0) -> Optional[float]:
+        """Seconds a stage may wait while keeping `reserve_ms` (None without a budget)."""
+        if self.budget_ms is None:
+            return None
+        return max(0.0, (self.remaining_ms() - reserve_ms) / 1000)
+
+    def degrade(self, stage: str):
+        if stage not in self.degradations:
+            self.degradations.append(stage)
+            print(f"[Deadline] {stage} ({self.elapsed_ms():.0f}/{self.budget_ms:.0f}ms used)")
+
+    def timings(self) -> dict:
+        if self.budget_ms is None:
+            return {}
+        return {"deadline_ms": self.budget_ms, "deadline_remaining_ms": self.remaining_ms()}
@@ -0,0 +1,249 @@
+import asyncio
+import bisect
+import contextvars
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional
+
+from langchain_core.runnables import Runnable
+
+# Runs primary / hedge requests for the sync paths, each in a copy of the caller's
+# context so the LLM scheduler sees the caller's priority
+_HEDGE_EXECUTOR = ThreadPoolExecutor(max_workers=16, thread_name_prefix="llm-hedge")
+
+# bucket upper bounds (ms) for the exported histogram
+_BUCKETS_MS = [50, 100, 200, 350, 500, 750, 1000, 1500, 2000, 3000, 5000, 8000, 13000, 20000, 30000]
+
+
+class LatencyHistogram:
+    """Recent latencies of one provider and metric (rolling window) plus cumulative bucket counts."""
+
+    def __init__(self, window: int = 512):
+        self.samples = deque(maxlen=window)
+        self.buckets = [0] * (len(_BUCKETS_MS) + 1)
+        self.lock = threading.Lock()
+
+    def record(self, latency_ms: float):
+        with self.lock:
+            self.samples.append(latency_ms)
+            self.buckets[bisect.bisect_left(_BUCKETS_MS, latency_ms)] += 1
+
+    def percentile(self, p: float) -> Optional[float]:
+        with self.lock:
+            if not self.samples:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            labels = [f"<={b}ms" for b in _BUCKETS_MS] + [f">{_BUCKETS_MS[-1]}ms"]
+            counts = dict(zip(labels, self.buckets))
+            n = len(self.samples)
+        return {"samples": n, "p50_ms": self.percentile(50), "p95_ms": self.percentile(95), "p99_ms": self.percentile(99), "buckets": counts}
+
+
+# Global histograms (shared by every session), keyed "<provider>:ttft" (first
+# streamed token) and "<provider>:total" (full invoke response); the two are
+# kept apart since a full response takes much longer than its first token
+_histograms: Dict[str, LatencyHistogram] = {}
+_histograms_lock = threading.Lock()
+_hedge_counts = {"requests": 0, "hedged": 0, "hedge_wins": 0}
+
+
+def get_histogram(provider: str, metric: str = "total") -> LatencyHistogram:
+    """`metric` is "ttft" or "total"."""
+    with _histograms_lock:
+        return _histograms.setdefault(f"{provider}:{metric}", LatencyHistogram())
+
+
+def hedging_metrics() -> dict:
+    with _histograms_lock:
+        providers = dict(_histograms)
+    return {**_hedge_counts, "providers": {name: h.snapshot() for name, h in providers.items()}}
+
+
+class HedgedLLM(Runnable):
+    """
+    Interactive answer model with hedged requests.
+
+    The request goes to the primary provider. If it has not produced its first
+    token (or, for invoke, its response) within the hedge delay, the same request
+    is sent to the secondary provider and whichever answers first wins; the other
+    is cancelled (async) or abandoned (sync). The delay is the primary's recent
+    latency at `percentile` (first-token latency for stream, full-response
+    latency for invoke), clamped to [min_delay_ms, max_delay_ms]; until
+    `min_samples` latencies are known, max_delay_ms is used.
+    """
+
+    def __init__(self, primary, secondary, primary_name: str, secondary_name: str, percentile: float = 95,
+                 min_delay_ms: float = 300, max_delay_ms: float = 5000, min_samples: int = 20):
+        self.primary = primary
+        self.secondary = secondary
+        self.primary_name = primary_name
+        self.secondary_name = secondary_name
+        self.percentile = percentile
+        self.min_delay_ms = min_delay_ms
+        self.max_delay_ms = max_delay_ms
+        self.min_samples = min_samples
+
+    def hedge_delay(self, metric: str = "total") -> float:
+        """Seconds to wait for the primary before hedging; `metric` is "ttft" for stream, "total" for invoke."""
+        histogram = get_histogram(self.primary_name, metric)
+        if len(histogram) < self.min_samples:
+            return self.max_delay_ms / 1000
+        delay = histogram.percentile(self.percentile)
+        return min(self.max_delay_ms, max(self.min_delay_ms, delay)) / 1000
+
+    def _timed(self, llm, name: str, input, config, kwargs):
+        start = time.perf_counter()
+        output = llm.invoke(input, config, **kwargs)
+        get_histogram(name, "total").record((time.perf_counter() - start) * 1000)
+        return output, name
+
+    def _count(self, key: str):
+        with _histograms_lock:
+            _hedge_counts[key] += 1
+
+    def invoke(self, input, config=None, **kwargs):
+        self._count("requests")
+        primary = _HEDGE_EXECUTOR.submit(contextvars.copy_context().run, self._timed, self.primary, self.primary_name, input, config, kwargs)
+        done, _ = wait([primary], timeout=self.hedge_delay())
+        if done and primary.exception() is None:
+            return primary.result()[0]
+        self._count("hedged")
+        print(f"[HedgedLLM] {self.primary_name} slow or failed, hedging to {self.secondary_name}")
+        secondary = _HEDGE_EXECUTOR.submit(contextvars.copy_context().run, self._timed, self.secondary, self.secondary_name, input, config, kwargs)
+        pending = {primary, secondary}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is secondary:
+                        self._count("hedge_wins")
+                    for loser in pending:
+                        loser.cancel()  # a running loser finishes in the background
+                    return future.result()[0]
+                error = future.exception()
+        raise error
+
+    async def _atimed(self, llm, name: str, input, config, kwargs):
+        start = time.perf_counter()
+        try:
+            output = await llm.ainvoke(input, config, **kwargs)
+        except asyncio.CancelledError:
+            # a cancelled loser records its elapsed time (a lower bound) so slow
+            # responses are not dropped from the histogram
+            get_histogram(name, "total").record((time.perf_counter() - start) * 1000)
+            raise
+        get_histogram(name, "total").record((time.perf_counter() - start) * 1000)
+        return output, name
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        self._count("requests")
+        primary = asyncio.ensure_future(self._atimed(self.primary, self.primary_name, input, config, kwargs))
+        done, _ = await asyncio.wait({primary}, timeout=self.hedge_delay())
+        if done and primary.exception() is None:
+            return primary.result()[0]
+        self._count("hedged")
+        print(f"[HedgedLLM] {self.primary_name} slow or failed, hedging to {self.secondary_name}")
+        secondary = asyncio.ensure_future(self._atimed(self.secondary, self.secondary_name, input, config, kwargs))
+        pending = {primary, secondary}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is secondary:
+                            self._count("hedge_wins")
+                        return task.result()[0]
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stream(self, input, config=None, **kwargs):
+        """Hedge on time-to-first-token, then stream only the winner's chunks."""
+        self._count("requests")
+        events: "queue.Queue" = queue.Queue()
+        stops: List[threading.Event] = []
+        end = object()
+
+        def produce(llm, name):
+            source, stop = len(stops), threading.Event()
+            stops.append(stop)
+            start = time.perf_counter()
+
+            def run():
+                first = True
+                try:
+                    for chunk in llm.stream(input, config, **kwargs):
+                        if first:
+                            get_histogram(name, "ttft").record((time.perf_counter() - start) * 1000)
+                            first = False
+                        if stop.is_set():
+                            return
+                        events.put((source, chunk))
+                    events.put((source, end))
+                except Exception as e:
+                    events.put((source, e))
+            _HEDGE_EXECUTOR.submit(contextvars.copy_context().run, run)
+
+        def hedge(reason: str):
+            self._count("hedged")
+            print(f"[HedgedLLM] {reason} from {self.primary_name}, hedging to {self.secondary_name}")
+            produce(self.secondary, self.secondary_name)
+
+        produce(self.primary, self.primary_name)
+        deadline = time.monotonic() + self.hedge_delay("ttft")
+        winner, failed = None, 0
+        while winner is None:
+            timeout = max(0.0, deadline - time.monotonic()) if len(stops) == 1 else None
+            try:
+                source, item = events.get(timeout=timeout)
+            except queue.Empty:
+                hedge("no first token")
+                continue
+            if isinstance(item, Exception):
+                failed += 1
+                if len(stops) == 1:
+                    hedge("error")
+                elif failed == len(stops):
+                    raise item
+                continue
+            winner = source
+            if winner == 1:
+                self._count("hedge_wins")
+            for i, stop in enumerate(stops):
+                if i != winner:
+                    stop.set()
+            if item is end:
+                return
+            yield item
+
+        while True:
+            source, item = events.get()
+            if source != winner:
+                continue
+            if item is end:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    def with_structured_output(self, schema, **kwargs):
+        return self.primary.with_structured_output(schema, **kwargs)
+
+    def __getattr__(self, name):
+        if name == "primary":
+            raise AttributeError(name)
+        return getattr(self.primary, name)
@@ -0,0 +1,354 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+from langchain_core.runnables import Runnable
+
+from app.utils.token_utils import estimate_tokens
+
+# Priority classes: lower value is served first
+INTERACTIVE = 0  # user-facing queries: query metadata, answers
+BACKGROUND = 1  # ingestion: per-page metadata extraction, document classification
+
+_priority: contextvars.ContextVar[int] = contextvars.ContextVar("llm_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def llm_priority(priority: int):
+    """Run the LLM calls made inside the block with the given priority class."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def is_rate_limited(error: Exception) -> bool:
+    """Best-effort detection of provider quota errors (HTTP 429 / RESOURCE_EXHAUSTED)."""
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    if status == 429:
+        return True
+    message = str(error).lower()
+    return "429" in message or "resource_exhausted" in message or "rate limit" in message or "quota" in message
+
+
+class TokenBucket:
+    """Refills continuously at `per_minute / 60` units per second, up to `per_minute`."""
+
+    def __init__(self, per_minute: Optional[float], clock: Callable[[], float] = time.monotonic):
+        self.capacity = float(per_minute) if per_minute else None
+        self.level = self.capacity
+        self.updated = clock()
+
+    def _refill(self, now: float):
+        if self.capacity is not None:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60.0)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` units are available (0 if they are now)."""
+        if self.capacity is None:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.level) * 60.0 / self.capacity)
+
+    def take(self, amount: float):
+        if self.capacity is not None:
+            self.level -= min(amount, self.capacity)
+
+    def drain(self):
+        if self.capacity is not None:
+            self.level = 0.0
+
+
+class _ProviderLimiter:
+    """Quota state and wait queue for one provider:model."""
+
+    def __init__(self, requests_per_minute: Optional[float], tokens_per_minute: Optional[float],
+                 clock: Callable[[], float] = time.monotonic):
+        self.requests = TokenBucket(requests_per_minute, clock)
+        self.tokens = TokenBucket(tokens_per_minute, clock)
+        self.condition = threading.Condition()
+        self.queue: list = []  # heap of (priority, seq)
+        self.async_waiters: Dict[tuple, tuple] = {}  # queue entry -> (event loop, asyncio.Event) of async callers
+        self.cooldown_until = 0.0
+        self.backoff_level = 0
+        self.waits = deque(maxlen=512)
+        self.calls = 0
+        self.rate_limited = 0
+        self.retries = 0
+
+
+class LLMScheduler:
+    """
+    Process-wide gate in front of every chat-model call.
+
+    Each provider:model has a requests/min and a tokens/min token bucket. Callers
+    queue by priority class (interactive before background, FIFO within a class);
+    only the head of the queue may take from the buckets, so queued ingestion
+    pages never delay a user's query. A 429 from the provider drains the buckets
+    and puts the model in an exponentially growing, jittered cooldown that
+    relaxes again after successful calls. `clock` (monotonic seconds) is
+    replaceable for tests.
+    """
+
+    def __init__(self, limits: Optional[Dict[str, dict]] = None, max_retries: int = 5,
+                 backoff_base: float = 1.0, backoff_max: float = 60.0, output_token_estimate: int = 256,
+                 clock: Callable[[], float] = time.monotonic):
+        self.limits = limits or {}
+        self.clock = clock
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.output_token_estimate = output_token_estimate
+        self._limiters: Dict[str, _ProviderLimiter] = {}
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+
+    def _limiter(self, key: str) -> _ProviderLimiter:
+        with self._lock:
+            if key not in self._limiters:
+                limits = self.limits.get(key, {})
+                self._limiters[key] = _ProviderLimiter(
+                    limits.get("requests_per_minute"), limits.get("tokens_per_minute"), self.clock
+                )
+            return self._limiters[key]
+
+    @staticmethod
+    def _wake(limiter: _ProviderLimiter):
+        """Wake every waiter, sync and async, to re-check the queue (limiter lock held)."""
+        limiter.condition.notify_all()
+        for loop, event in limiter.async_waiters.values():
+            loop.call_soon_threadsafe(event.set)
+
+    def _try_admit(self, limiter: _ProviderLimiter, entry: tuple, tokens: int, start: float) -> Tuple[Optional[float], Optional[float]]:
+        """
+        With the limiter lock held: (seconds waited, None) if `entry` may send now,
+        else (None, seconds until the head re-checks the buckets; None until woken).
+        """
+        if limiter.queue[0] != entry:
+            return None, None
+        now = self.clock()
+        timeout = max(
+            limiter.cooldown_until - now,
+            limiter.requests.wait_time(1, now),
+            limiter.tokens.wait_time(tokens, now),
+        )
+        if timeout > 0:
+            return None, timeout
+        limiter.requests.take(1)
+        limiter.tokens.take(tokens)
+        heapq.heappop(limiter.queue)
+        limiter.calls += 1
+        waited = self.clock() - start
+        limiter.waits.append(waited)
+        self._wake(limiter)
+        return waited, None
+
+    def acquire(self, key: str, tokens: int, priority: Optional[int] = None) -> float:
+        """Block until the call may be sent. Returns the time waited in seconds."""
+        limiter = self._limiter(key)
+        entry = (INTERACTIVE if priority is None else priority, next(self._seq))
+        start = self.clock()
+        with limiter.condition:
+            heapq.heappush(limiter.queue, entry)
+            while True:
+                waited, timeout = self._try_admit(limiter, entry, tokens, start)
+                if waited is not None:
+                    return waited
+                # woken when the head changes; the head re-checks the buckets after `timeout`
+                limiter.condition.wait(timeout)
+
+    async def aacquire(self, key: str, tokens: int, priority: Optional[int] = None) -> float:
+        """
+        Async acquire(): waits on the event loop instead of holding a thread, in the
+        same queue as sync callers. A cancelled caller leaves the queue without
+        taking from the buckets.
+        """
+        limiter = self._limiter(key)
+        entry = (INTERACTIVE if priority is None else priority, next(self._seq))
+        start = self.clock()
+        event = asyncio.Event()
+        with limiter.condition:
+            heapq.heappush(limiter.queue, entry)
+            limiter.async_waiters[entry] = (asyncio.get_running_loop(), event)
+        try:
+            while True:
+                with limiter.condition:
+                    # cleared under the lock: a wake-up after this check sets it again
+                    event.clear()
+                    waited, timeout = self._try_admit(limiter, entry, tokens, start)
+                if waited is not None:
+                    return waited
+                try:
+                    await asyncio.wait_for(event.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        except asyncio.CancelledError:
+            with limiter.condition:
+                if entry in limiter.queue:
+                    limiter.queue.remove(entry)
+                    heapq.heapify(limiter.queue)
+                    self._wake(limiter)
+            raise
+        finally:
+            with limiter.condition:
+                limiter.async_waiters.pop(entry, None)
+
+    def _on_rate_limited(self, key: str) -> float:
+        limiter = self._limiter(key)
+        with limiter.condition:
+            delay = min(self.backoff_max, self.backoff_base * (2 ** limiter.backoff_level))
+            delay *= random.uniform(0.75, 1.25)
+            limiter.backoff_level += 1
+            limiter.rate_limited += 1
+            limiter.retries += 1
+            limiter.cooldown_until = max(limiter.cooldown_until, self.clock() + delay)
+            # the provider says we are over quota: stop sending until the buckets refill
+            limiter.requests.drain()
+            limiter.tokens.drain()
+            self._wake(limiter)
+        print(f"[LLMScheduler] {key} rate limited, backing off {delay:.1f}s")
+        return delay
+
+    def _on_success(self, key: str):
+        limiter = self._limiter(key)
+        if limiter.backoff_level:
+            with limiter.condition:
+                limiter.backoff_level = max(0, limiter.backoff_level - 1)
+
+    def _tokens(self, prompt: Any) -> int:
+        return estimate_tokens(str(prompt)) + self.output_token_estimate
+
+    def call(self, key: str, fn: Callable[[], Any], prompt: Any = None, priority: Optional[int] = None):
+        """Run `fn` once admitted, retrying on rate-limit errors."""
+        priority = _priority.get() if priority is None else priority
+        tokens = self._tokens(prompt)
+        for attempt in range(self.max_retries + 1):
+            self.acquire(key, tokens, priority)
+            try:
+                result = fn()
+            except Exception as e:
+                if attempt < self.max_retries and is_rate_limited(e):
+                    self._on_rate_limited(key)
+                    continue
+                raise
+            self._on_success(key)
+            return result
+
+    async def acall(self, key: str, fn: Callable[[], Any], prompt: Any = None, priority: Optional[int] = None):
+        """Async call(): waits on the event loop (see aacquire), `fn` returns an awaitable."""
+        priority = _priority.get() if priority is None else priority
+        tokens = self._tokens(prompt)
+        for attempt in range(self.max_retries + 1):
+            await self.aacquire(key, tokens, priority)
+            try:
+                result = await fn()
+            except Exception as e:
+                if attempt < self.max_retries and is_rate_limited(e):
+                    self._on_rate_limited(key)
+                    continue
+                raise
+            self._on_success(key)
+            return result
+
+    def stream(self, key: str, fn: Callable[[], Iterator], prompt: Any = None, priority: Optional[int] = None) -> Iterator:
+        """Streaming call(); retried only if the rate-limit error arrives before the first chunk."""
+        priority = _priority.get() if priority is None else priority
+        tokens = self._tokens(prompt)
+        for attempt in range(self.max_retries + 1):
+            self.acquire(key, tokens, priority)
+            started = False
+            try:
+                for chunk in fn():
+                    started = True
+                    yield chunk
+            except Exception as e:
+                if not started and attempt < self.max_retries and is_rate_limited(e):
+                    self._on_rate_limited(key)
+                    continue
+                raise
+            self._on_success(key)
+            return
+
+    def metrics(self) -> Dict[str, dict]:
+        out = {}
+        for key, limiter in list(self._limiters.items()):
+            with limiter.condition:
+                waits = sorted(limiter.waits)
+                out[key] = {
+                    "queue_depth": len(limiter.queue),
+                    "queue_depth_interactive": sum(1 for p, _ in limiter.queue if p == INTERACTIVE),
+                    "queue_depth_background": sum(1 for p, _ in limiter.queue if p != INTERACTIVE),
+                    "calls": limiter.calls,
+                    "rate_limited": limiter.rate_limited,
+                    "retries": limiter.retries,
+                    "cooldown_remaining_s": max(0.0, limiter.cooldown_until - self.clock()),
+                    "wait_mean_ms": 1000 * sum(waits) / len(waits) if waits else 0.0,
+                    "wait_p95_ms": 1000 * waits[int(0.95 * (len(waits) - 1))] if waits else 0.0,
+                    "wait_max_ms": 1000 * waits[-1] if waits else 0.0,
+                }
+        return out
+
+
+class ScheduledLLM(Runnable):
+    """
+    Runnable wrapper that routes a chat model's calls through the LLMScheduler.
+    Works anywhere the model did: `prompt | llm | parser`, with_structured_output, stream.
+    """
+
+    def __init__(self, llm, key: str, scheduler: Optional[LLMScheduler] = None):
+        self.llm = llm
+        self.key = key
+        self.scheduler = scheduler or get_scheduler()
+
+    def invoke(self, input, config=None, **kwargs):
+        return self.scheduler.call(self.key, lambda: self.llm.invoke(input, config, **kwargs), prompt=input)
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        return await self.scheduler.acall(self.key, lambda: self.llm.ainvoke(input, config, **kwargs), prompt=input)
+
+    def stream(self, input, config=None, **kwargs):
+        return self.scheduler.stream(self.key, lambda: self.llm.stream(input, config, **kwargs), prompt=input)
+
+    def with_structured_output(self, schema, **kwargs):
+        return ScheduledLLM(self.llm.with_structured_output(schema, **kwargs), self.key, self.scheduler)
+
+    def __getattr__(self, name):
+        if name == "llm":
+            raise AttributeError(name)
+        return getattr(self.llm, name)
+
+
+# Global scheduler (shared by every session and ingestion job)
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> LLMScheduler:
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            from app.config.config import get_settings
+            from app.utils.config_loader import load_config
+            settings = get_settings()
+            limits = {
+                f"{name}:{entry['model_name']}": entry.get("rate_limits", {})
+                for name, entry in load_config()["llm"].items()
+            }
+            _scheduler = LLMScheduler(
+                limits,
+                max_retries=settings.llm_max_retries,
+                backoff_base=settings.llm_backoff_base_seconds,
+                backoff_max=settings.llm_backoff_max_seconds,
+                output_token_estimate=settings.llm_output_token_estimate,
+            )
+    return _scheduler
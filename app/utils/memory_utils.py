@@ -0,0 +1,41 @@
+import sys
+from typing import Optional
+
+import numpy as np
+from langchain_core.documents import Document
+from pydantic import BaseModel
+from scipy import sparse
+
+
+def deep_sizeof(obj, seen: Optional[set] = None) -> int:
+    """
+    Approximate bytes held by `obj` and everything it references.
+
+    Follows containers, numpy / scipy arrays, LangChain Documents and pydantic
+    models; other objects count only their own shallow size, so shared clients
+    (models, vector stores) reachable from an object are never charged to it.
+    Objects already in `seen` are not counted again, which lets callers share
+    one `seen` set across components that reference the same chunks.
+    """
+    seen = set() if seen is None else seen
+    if obj is None or id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes + sys.getsizeof(obj)
+    if sparse.issparse(obj):
+        return sum(a.nbytes for a in (obj.data, obj.indices, obj.indptr)) + sys.getsizeof(obj)
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (str, bytes, int, float, bool)):
+        return size
+    if isinstance(obj, dict):
+        return size + sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return size + sum(deep_sizeof(item, seen) for item in obj)
+    if isinstance(obj, Document):
+        return size + deep_sizeof(obj.page_content, seen) + deep_sizeof(obj.metadata, seen)
+    if isinstance(obj, BaseModel):
+        return size + deep_sizeof(obj.__dict__, seen)
+    if hasattr(obj, "__dataclass_fields__"):
+        return size + deep_sizeof(vars(obj), seen)
+    return size
@@ -30,6 +30,20 @@ class MetadataService:
                 formatted[key] = value
         return formatted
 
+    @staticmethod
+    def matches_filter(metadata: dict, metadata_filter: dict) -> bool:
+        """
+        Evaluate a Pinecone-style filter ({key: {"$in": [...]}} or {key: value}) against chunk metadata locally.
+        List-valued metadata matches when any of its values matches.
+        """
+        for key, condition in (metadata_filter or {}).items():
+            value = metadata.get(key)
+            values = value if isinstance(value, list) else [value]
+            allowed = condition["$in"] if isinstance(condition, dict) and "$in" in condition else [condition]
+            if not any(v in allowed for v in values):
+                return False
+        return True
+
     def Return_document_model(self, doc_type_schema: DocumentTypeSchema):
         """
         Returns appropriate metadata model based on document type
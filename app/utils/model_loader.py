@@ -4,6 +4,9 @@ from dotenv import load_dotenv
 from pydantic import BaseModel, Field
 from typing import Literal, Optional,Any
 from app.utils.config_loader import load_config
+from app.utils.llm_scheduler import ScheduledLLM
+from app.utils.offline_models import FakeChatModel, HashEmbeddings
+from app.config.config import get_settings
 from langchain_groq import ChatGroq 
 from langchain_google_genai import ChatGoogleGenerativeAI
 from dotenv import load_dotenv
@@ -20,7 +23,7 @@ class ConfigLoader:
     
 
 class ModelLoader(BaseModel):
-    model_provider: Literal["groq", "gemini", "openai","gemini_lite", "huggingface"] = "gemini" 
+    model_provider: Literal["groq", "gemini", "openai","gemini_lite", "huggingface", "fake", "hash"] = "gemini" 
     config: Optional[ConfigLoader] = Field(default = None, exclude = True) # either the config is ConfigLoader object or None
 
     def model_post_init(self, __context: Any)->None:
@@ -72,8 +75,19 @@ class ModelLoader(BaseModel):
             os.environ["HF_TOKEN"] = api_key  # Ensure the token is set in the environment
             model_name = self.config["embedding_model"]["huggingface"]["model_name"]
             llm = HuggingFaceEmbeddings(model=model_name)
+        elif self.model_provider == "fake":
+            # offline chat model for benchmarks: no network, configurable latency
+            print("Loading offline fake chat model:")
+            model_name = self.config["llm"]["fake"]["model_name"]
+            llm = FakeChatModel(model_name=model_name, **self.config["llm"]["fake"].get("latency", {}))
+        elif self.model_provider == "hash":
+            print("Loading offline hash embeddings:")
+            llm = HashEmbeddings(dimension=self.config["embedding_model"]["hash"]["dimension"])
         else: 
             raise ValueError(f"Unsupported model provider: {self.model_provider}")
+        if self.model_provider in ("groq", "gemini", "gemini_lite", "fake") and get_settings().llm_scheduler_enabled:
+            # every chat-model call goes through the shared rate-limit-aware scheduler
+            llm = ScheduledLLM(llm, key=f"{self.model_provider}:{model_name}")
         return llm
 
 
@@ -0,0 +1,181 @@
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from langchain_core.runnables import Runnable
+
+from app.utils.config_loader import load_config
+from app.utils.hedging import HedgedLLM
+from app.utils.model_loader import ModelLoader
+from app.utils.token_utils import estimate_tokens
+
+# Chat models loaded once per provider and shared by every task and session
+_llms: Dict[str, Any] = {}
+_llms_lock = threading.Lock()
+
+
+def get_llm(provider: str):
+    with _llms_lock:
+        if provider not in _llms:
+            _llms[provider] = ModelLoader(model_provider=provider).load_llm()
+        return _llms[provider]
+
+
+class _TaskStats:
+    def __init__(self):
+        self.calls = 0
+        self.latency_ms = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.lock = threading.Lock()
+
+    def record(self, latency_ms: float, prompt_tokens: int, completion_tokens: int):
+        with self.lock:
+            self.calls += 1
+            self.latency_ms += latency_ms
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+
+
+def _usage(prompt: Any, output: Any):
+    """(prompt tokens, completion tokens): provider usage metadata when present, else estimates."""
+    usage = getattr(output, "usage_metadata", None)
+    if usage:
+        return usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+    text = getattr(output, "content", None)
+    return estimate_tokens(str(prompt)), estimate_tokens(text if isinstance(text, str) else str(output))
+
+
+class TaskLLM(Runnable):
+    """A chat model bound to one routing task; records latency and tokens for that task."""
+
+    def __init__(self, llm, task: str, provider: str, stats: _TaskStats):
+        self.llm = llm
+        self.task = task
+        self.provider = provider
+        self.stats = stats
+
+    def invoke(self, input, config=None, **kwargs):
+        start = time.perf_counter()
+        output = self.llm.invoke(input, config, **kwargs)
+        self.stats.record((time.perf_counter() - start) * 1000, *_usage(input, output))
+        return output
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        start = time.perf_counter()
+        output = await self.llm.ainvoke(input, config, **kwargs)
+        self.stats.record((time.perf_counter() - start) * 1000, *_usage(input, output))
+        return output
+
+    def stream(self, input, config=None, **kwargs):
+        start = time.perf_counter()
+        pieces = []
+        for chunk in self.llm.stream(input, config, **kwargs):
+            pieces.append(getattr(chunk, "content", chunk))
+            yield chunk
+        output = "".join(p for p in pieces if isinstance(p, str))
+        self.stats.record((time.perf_counter() - start) * 1000, estimate_tokens(str(input)), estimate_tokens(output))
+
+    def with_structured_output(self, schema, **kwargs):
+        return TaskLLM(self.llm.with_structured_output(schema, **kwargs), self.task, self.provider, self.stats)
+
+    def __getattr__(self, name):
+        if name == "llm":
+            raise AttributeError(name)
+        return getattr(self.llm, name)
+
+
+class ModelRouter:
+    """
+    Per-task model routing from config.yaml:
+
+        routing:
+          page_metadata: {model: gemini_lite, fallback: gemini}
+
+    `llm(task)` is the task's primary model and `fallback(task)` the stronger model
+    callers escalate to when the primary's output fails to parse or validate;
+    escalated calls are accounted separately as "<task>:escalated". A `hedge`
+    provider makes `hedged(task)` race it against a slow primary (accounted as
+    "<task>:hedge"). Unknown tasks use `default`.
+    """
+
+    def __init__(self, routes: Dict[str, dict], default: str = "gemini"):
+        self.routes = routes
+        self.default = default
+        self._stats: Dict[str, _TaskStats] = {}
+        self._bound: Dict[tuple, TaskLLM] = {}
+        self._lock = threading.Lock()
+
+    def _task_stats(self, task: str) -> _TaskStats:
+        with self._lock:
+            return self._stats.setdefault(task, _TaskStats())
+
+    def _bind(self, task: str, provider: str) -> TaskLLM:
+        # one TaskLLM per (task, provider), so compiled chains keyed on the model are reused
+        key = (task, provider)
+        if key not in self._bound:
+            bound = TaskLLM(get_llm(provider), task, provider, self._task_stats(task))
+            with self._lock:
+                self._bound.setdefault(key, bound)
+        return self._bound[key]
+
+    def llm(self, task: str) -> TaskLLM:
+        return self._bind(task, self.routes.get(task, {}).get("model", self.default))
+
+    def fallback(self, task: str) -> Optional[TaskLLM]:
+        provider = self.routes.get(task, {}).get("fallback")
+        return self._bind(f"{task}:escalated", provider) if provider else None
+
+    def hedged(self, task: str):
+        """The task's model, hedged to its `hedge` provider when one is configured and hedging is on."""
+        from app.config.config import get_settings
+        settings = get_settings()
+        route = self.routes.get(task, {})
+        primary = self.llm(task)
+        if not settings.hedging_enabled or not route.get("hedge"):
+            return primary
+        return HedgedLLM(
+            primary, self._bind(f"{task}:hedge", route["hedge"]),
+            primary_name=primary.provider, secondary_name=route["hedge"],
+            percentile=settings.hedge_percentile,
+            min_delay_ms=settings.hedge_min_delay_ms,
+            max_delay_ms=settings.hedge_max_delay_ms,
+            min_samples=settings.hedge_min_samples,
+        )
+
+    def metrics(self) -> Dict[str, dict]:
+        out = {}
+        for task, stats in list(self._stats.items()):
+            base, _, kind = task.partition(":")
+            route = self.routes.get(base, {})
+            out[task] = {
+                "model": {"escalated": route.get("fallback"), "hedge": route.get("hedge")}.get(kind, route.get("model", self.default)),
+                "calls": stats.calls,
+                "escalations": self._stats[f"{task}:escalated"].calls if f"{task}:escalated" in self._stats else 0,
+                "latency_ms_total": stats.latency_ms,
+                "latency_ms_mean": stats.latency_ms / stats.calls if stats.calls else 0.0,
+                "prompt_tokens": stats.prompt_tokens,
+                "completion_tokens": stats.completion_tokens,
+            }
+        return out
+
+
+# Global router (shared by every session and ingestion job)
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> ModelRouter:
+    global _router
+    with _router_lock:
+        if _router is None:
+            from app.config.config import get_settings
+            config = load_config()
+            routes, default = config.get("routing", {}), config.get("routing_default", "gemini")
+            override = get_settings().llm_provider_override
+            if override:
+                # e.g. "fake": every task, fallback and hedge goes to one provider (offline benchmarks)
+                routes = {task: {key: override for key in route} for task, route in routes.items()}
+                default = override
+            _router = ModelRouter(routes, default=default)
+    return _router
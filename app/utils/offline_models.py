@@ -0,0 +1,223 @@
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from typing import Any, List, Literal, Optional, Type, Union, get_args, get_origin
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+from pydantic import BaseModel, PrivateAttr
+
+from app.schemas.metadata_schema import CommonMetaData
+from app.schemas.request_models import DocumentTypeSchema, PackedAnswers
+from app.utils.token_utils import estimate_tokens
+
+_WORD = re.compile(r"[A-Za-z][A-Za-z\-]{3,}")
+
+
+def _structured_schemas() -> List[Type[BaseModel]]:
+    """Schemas the fake chat model can recognise in a prompt (parser mode)."""
+    metadata = []
+    pending = [CommonMetaData]
+    while pending:
+        cls = pending.pop()
+        metadata.append(cls)
+        pending.extend(cls.__subclasses__())
+    return [DocumentTypeSchema, PackedAnswers, *metadata]
+
+
+def _schema_for_prompt(text: str) -> Optional[Type[BaseModel]]:
+    """The most specific known schema whose field names all appear (quoted) in the prompt."""
+    best = None
+    for schema in _structured_schemas():
+        fields = schema.model_fields
+        if all(f'"{name}"' in text for name in fields) and (best is None or len(fields) > len(best.model_fields)):
+            best = schema
+    return best
+
+
+def _content_words(text: str) -> List[str]:
+    # the document / query text follows the last "Text:" (extraction) or "Document content:" (classification)
+    starts = [text.rfind(marker) + len(marker) for marker in ("Text:", "Document content:") if marker in text]
+    body = text[max(starts):] if starts else text
+    words = list(dict.fromkeys(w.lower() for w in _WORD.findall(body)))
+    return words or ["term"]
+
+
+def _fake_value(annotation: Any, name: str, text: str, words: List[str], rng: random.Random):
+    origin, args = get_origin(annotation), get_args(annotation)
+    if origin is Union:
+        return _fake_value(next(a for a in args if a is not type(None)), name, text, words, rng)
+    if origin is Literal:
+        # prefer the option the content talks about, e.g. "Insurance" for a policy document
+        present = set(words)
+        matching = [a for a in args if any(w in present for w in _WORD.findall(str(a).lower()))]
+        options = matching or list(args)
+        return options[rng.randrange(len(options))]
+    if origin in (list, List):
+        if name == "answers":
+            # packed answers: one per numbered question
+            questions = re.findall(r"^\s*\d+\.\s*(.+)$", text.rsplit("Questions:", 1)[-1], re.M)
+            return [_fake_answer(f"{text}\nQuestion: {q}") for q in questions] or ["I don't know"]
+        inner = args[0] if args else str
+        return [_fake_value(inner, name, text, words, rng) for _ in range(rng.randint(1, 2))]
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return fake_instance(annotation, text)
+    if annotation is bool:
+        return True
+    if annotation is int:
+        return rng.randint(0, 10)
+    if annotation is float:
+        return round(rng.random(), 2)
+    if annotation is str:
+        return " ".join(rng.sample(words, min(len(words), rng.randint(1, 3))))
+    return None
+
+
+def fake_instance(schema: Type[BaseModel], text: str) -> BaseModel:
+    """A schema-valid instance derived deterministically from the prompt text."""
+    rng = random.Random(int(hashlib.md5(f"{schema.__name__}|{text}".encode("utf-8")).hexdigest(), 16))
+    words = _content_words(text)
+    values = {name: _fake_value(field.annotation, name, text, words, rng) for name, field in schema.model_fields.items()}
+    return schema(**values)
+
+
+def _fake_answer(text: str) -> str:
+    question = re.findall(r"Question:\s*(.+)", text)
+    clauses = re.findall(r"\[Page \d+\]\s*\n?(.+)", text)
+    evidence = " ".join(clauses[0].split()[:30]) if clauses else "I don't know"
+    subject = question[-1].strip() if question else "the question"
+    return f"Regarding {subject}: {evidence}."
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Offline chat model for benchmarks and CI: no network, deterministic output.
+
+    Prompts that carry a known schema (document type, any metadata schema, packed
+    answers) get schema-valid JSON; everything else gets a free-text answer built
+    from the question and the first context clause. `with_structured_output`
+    returns instances directly. Each call sleeps for a latency drawn from a
+    lognormal around `latency_ms` (`latency_jitter` is sigma; 0 means fixed), and
+    streaming adds `token_latency_ms` between chunks.
+    """
+
+    model_name: str = "fake-chat"
+    latency_ms: float = 0.0
+    latency_jitter: float = 0.0
+    token_latency_ms: float = 0.0
+    seed: int = 0
+    _rng: random.Random = PrivateAttr()
+    _rng_lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    def model_post_init(self, __context: Any) -> None:
+        self._rng = random.Random(self.seed)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _latency(self) -> float:
+        """Seconds for the next call."""
+        if self.latency_ms <= 0:
+            return 0.0
+        with self._rng_lock:
+            factor = math.exp(self._rng.gauss(0.0, self.latency_jitter)) if self.latency_jitter > 0 else 1.0
+        return self.latency_ms * factor / 1000
+
+    @staticmethod
+    def _prompt_text(messages) -> str:
+        return "\n".join(m.content if isinstance(m.content, str) else str(m.content) for m in messages)
+
+    def _reply(self, text: str) -> AIMessage:
+        schema = _schema_for_prompt(text)
+        content = json.dumps(fake_instance(schema, text).model_dump()) if schema else _fake_answer(text)
+        usage = {"input_tokens": estimate_tokens(text), "output_tokens": estimate_tokens(content)}
+        usage["total_tokens"] = usage["input_tokens"] + usage["output_tokens"]
+        return AIMessage(content=content, usage_metadata=usage)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self._latency())
+        return ChatResult(generations=[ChatGeneration(message=self._reply(self._prompt_text(messages)))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self._latency())
+        return ChatResult(generations=[ChatGeneration(message=self._reply(self._prompt_text(messages)))])
+
+    def _pieces(self, messages) -> List[str]:
+        return re.findall(r"\S+\s*", self._reply(self._prompt_text(messages)).content)
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self._latency())
+        for i, piece in enumerate(self._pieces(messages)):
+            if i and self.token_latency_ms:
+                time.sleep(self.token_latency_ms / 1000)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=piece))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self._latency())
+        for i, piece in enumerate(self._pieces(messages)):
+            if i and self.token_latency_ms:
+                await asyncio.sleep(self.token_latency_ms / 1000)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=piece))
+
+    def with_structured_output(self, schema, **kwargs):
+        def text_of(input) -> str:
+            return self._prompt_text(self._convert_input(input).to_messages())
+
+        def structured(input):
+            time.sleep(self._latency())
+            return fake_instance(schema, text_of(input))
+
+        async def astructured(input):
+            await asyncio.sleep(self._latency())
+            return fake_instance(schema, text_of(input))
+
+        return RunnableLambda(structured, afunc=astructured)
+
+
+class HashEmbeddings(Embeddings):
+    """
+    Deterministic offline embeddings: signed feature hashing of word unigrams and
+    bigrams into `dimension` buckets, L2-normalised. Texts sharing words get
+    similar vectors, so retrieval behaves plausibly without a model download.
+    """
+
+    def __init__(self, dimension: int = 1024):
+        self.dimension = dimension
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        tokens = [w.lower() for w in _WORD.findall(text)]
+        for feature in tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]:
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dimension
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+class LexicalCrossEncoder:
+    """Offline stand-in for the cross-encoder: share of query words found in the passage."""
+
+    def predict(self, pairs, batch_size: Optional[int] = None, show_progress_bar: bool = False) -> List[float]:
+        scores = []
+        for query, passage in pairs:
+            query_words = {w.lower() for w in _WORD.findall(query)}
+            passage_words = {w.lower() for w in _WORD.findall(passage)}
+            scores.append(len(query_words & passage_words) / len(query_words) if query_words else 0.0)
+        return scores
@@ -0,0 +1,6 @@
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate (~4 characters per token for English text).
+    Good enough for budgeting prompts; Gemini does not expose its tokenizer locally.
+    """
+    return max(1, (len(text) + 3) // 4) if text else 0
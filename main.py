@@ -37,6 +37,12 @@ async def startup_event():
         print("Database connection verified successfully")
     except Exception as e:
         print(f"Warning: Database initialization failed: {e}")
+    # expire idle sessions and keep session state within the memory budget
+    session_manager.start_sweeper()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    session_manager.stop_sweeper()
 
 # Include API routes
 app.include_router(api_router, prefix="/api/v1")
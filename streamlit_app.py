@@ -144,6 +144,27 @@ class RAGApp:
             st.error(f"Query error: {e}")
         return None
     
+    def query_document_stream(self, query: str):
+        """Stream a query response; yields (event, data) pairs parsed from the SSE stream"""
+        with requests.post(
+            f"{API_BASE_URL}/query/{self.session_id}/stream",
+            json={"query": query},
+            stream=True,
+            timeout=(10, 300)
+        ) as response:
+            if response.status_code != 200:
+                error_detail = response.json().get('detail', 'Unknown error') if response.text else f"HTTP {response.status_code}"
+                yield "error", {"detail": error_detail}
+                return
+            event = "message"
+            for line in response.iter_lines(decode_unicode=True):
+                if not line:
+                    continue
+                if line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    yield event, json.loads(line[len("data:"):].strip())
+
     def get_session_status(self) -> Optional[dict]:
         """Get current session status"""
         try:
@@ -296,6 +317,13 @@ def show_document_library(app: RAGApp):
         if app.create_session():
             st.rerun()
 
+def filter_values(query_filter: Optional[Dict]) -> Dict:
+    """The values of a Pinecone-style query filter ({key: {"$in": [...]}} or {key: value}) per key"""
+    return {
+        key: condition["$in"] if isinstance(condition, dict) and "$in" in condition else condition
+        for key, condition in (query_filter or {}).items()
+    }
+
 def show_query_metadata(metadata: Dict):
     """Display extracted query metadata in a professional format"""
     if not metadata:
@@ -662,56 +690,51 @@ Source: {metadata.get('source', 'N/A')}
                 """)
 
 def process_chat_query(app: RAGApp, query: str):
-    """Process chat query with loading animation"""
+    """Process chat query, rendering sources and answer tokens as they stream in"""
     with st.chat_message("user"):
         st.markdown(query)
     
     with st.chat_message("assistant"):
-        with st.spinner("🤔 Thinking..."):
-            # Processing animation
-            progress_steps = [
-                "🔍 Understanding your question...",
-                "🔎 Searching document...",
-                "🧠 Generating response...",
-                "✅ Almost ready..."
-            ]
-            
-            progress_bar = st.progress(0)
-            for i, step in enumerate(progress_steps):
-                progress_bar.progress((i + 1) * 25, step)
-                time.sleep(0.4)
-            
-            response_data = app.query_document(query)
-            progress_bar.empty()
-            
-            if response_data:
-                answer = response_data.get("answer", "No answer available")
-                st.markdown(answer)
-                
-                # Extract metadata and sources
-                query_metadata = response_data.get("query_metadata", {})
-                sources = response_data.get("sources", [])
-                
-                # Show expandable sections for metadata and sources
-                if query_metadata:
-                    with st.expander("📊 Query Analysis", expanded=False):
-                        show_query_metadata(query_metadata)
-                
-                if sources:
-                    with st.expander("📚 Source Documents", expanded=False):
-                        show_document_sources(sources)
-                
-                # Add to chat history with metadata
-                st.session_state.messages.append({
-                    "role": "assistant", 
-                    "content": answer,
-                    "metadata": query_metadata,
-                    "sources": sources
-                })
-            else:
-                error_msg = "❌ Sorry, I couldn't process your question. Please try again."
-                st.markdown(error_msg)
-                st.session_state.messages.append({"role": "assistant", "content": error_msg})
+        status = st.empty()
+        status.caption("🔎 Searching document...")
+        answer_placeholder = st.empty()
+        answer, sources, query_metadata, error = "", [], {}, None
+        try:
+            for event, data in app.query_document_stream(query):
+                if event == "sources":
+                    sources = data.get("sources", [])
+                    status.caption("🧠 Generating response...")
+                    if sources:
+                        with st.expander("📚 Source Documents", expanded=False):
+                            show_document_sources(sources)
+                elif event == "token":
+                    answer += data
+                    answer_placeholder.markdown(answer + "▌")
+                elif event == "done":
+                    query_metadata = filter_values(data.get("query_filter"))
+                    ttft = data.get("timings", {}).get("time_to_first_token_ms")
+                    status.caption(f"⏱️ First token after {ttft / 1000:.2f}s" if ttft is not None else "")
+                elif event == "error":
+                    error = data.get("detail", "Unknown error")
+        except Exception as e:
+            error = str(e)
+
+        if answer and not error:
+            answer_placeholder.markdown(answer)
+            # Add to chat history with metadata
+            st.session_state.messages.append({
+                "role": "assistant", 
+                "content": answer,
+                "metadata": query_metadata,
+                "sources": sources
+            })
+        else:
+            status.empty()
+            error_msg = "❌ Sorry, I couldn't process your question. Please try again."
+            if error:
+                st.error(f"Query failed: {error}")
+            answer_placeholder.markdown(error_msg)
+            st.session_state.messages.append({"role": "assistant", "content": error_msg})
 
 def main():
     st.set_page_config(
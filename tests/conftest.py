@@ -0,0 +1,80 @@
+"""
+Shared fixtures. Every test runs offline: the fake chat model, hash embeddings,
+the in-memory vector store and the lexical reranker (see app/utils/offline_models.py).
+"""
+import os
+import tempfile
+
+# before any app import: settings are read from the environment
+_DATA_DIR = tempfile.mkdtemp(prefix="claridoc-tests-")
+for key, value in {
+    "LLM_PROVIDER_OVERRIDE": "fake",
+    "EMBEDDING_PROVIDER": "hash",
+    "VECTOR_STORE_PROVIDER": "memory",
+    "RERANKER_PROVIDER": "lexical",
+    "HEDGING_ENABLED": "false",
+    "SESSION_STORE": "local",
+    "DATABASE_PATH": os.path.join(_DATA_DIR, "sessions.db"),
+    "CHUNK_INDEX_DIR": os.path.join(_DATA_DIR, "chunk_index"),
+    "SESSION_SPILL_DIR": os.path.join(_DATA_DIR, "session_spill"),
+}.items():
+    os.environ.setdefault(key, value)
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+WORDS = (
+    "insurance policy waiting period pre-existing disease hospitalization cover exclusion premium claim "
+    "insurer cosmetic surgery maternity ambulance dental optical rider lapse renewal"
+).split()
+
+
+def make_pages(directory, n_pages: int = 8, seed: int = 7):
+    """Synthetic policy pages. `source` points into `directory`, so the keyword file lands there too."""
+    rng = np.random.default_rng(seed)
+    source = os.path.join(str(directory), "policy")
+    return [
+        Document(page_content=" ".join(rng.choice(WORDS, 300)) + ".", metadata={"source": source, "page": p})
+        for p in range(n_pages)
+    ]
+
+
+@pytest.fixture
+def fake_llm():
+    """The offline chat model every task routes to, with its latency zeroed for the test."""
+    from app.utils.model_router import get_llm
+    llm = get_llm("fake").llm
+    latency = llm.latency_ms
+    llm.latency_ms = 0
+    yield llm
+    llm.latency_ms = latency
+
+
+@pytest.fixture
+def pages(tmp_path):
+    return make_pages(tmp_path)
+
+
+@pytest.fixture
+def load_pages(monkeypatch):
+    """Make FileLoader.load_pdf return the given pages instead of reading a file."""
+    from app.ingestion.file_loader import FileLoader
+
+    def install(pages):
+        monkeypatch.setattr(
+            FileLoader, "load_pdf",
+            lambda self, path: [Document(page_content=p.page_content, metadata=dict(p.metadata)) for p in pages],
+        )
+    return install
+
+
+@pytest.fixture
+def rag_service(fake_llm, pages, load_pages):
+    """An ingested and indexed RAGService over `pages`."""
+    from app.services.RAG_service import RAGService
+    load_pages(pages)
+    service = RAGService()
+    service.load_and_split_document("pdf", path="policy.pdf")
+    service.create_vector_store()
+    return service
@@ -0,0 +1,51 @@
+import time
+
+import pytest
+
+from app.services.answer_cache import AnswerCache
+
+QUERY = "what is the waiting period for pre-existing disease?"
+
+
+def test_exact_hits_ignore_case_whitespace_and_trailing_punctuation():
+    cache = AnswerCache()
+    cache.put(QUERY, None, "36 months", [], compute_ms=120.0)
+    served = cache.get_exact("  What is the waiting period for  pre-existing disease ")
+    assert served.answer == "36 months" and served.match == "exact"
+    assert cache.get_exact("is maternity covered?") is None
+    assert cache.metrics()["latency_saved_ms"] == 120.0
+
+
+def test_near_duplicates_are_served_above_the_threshold():
+    cache = AnswerCache(similarity_threshold=0.9)
+    cache.put(QUERY, [1.0, 0.0], "36 months", [], compute_ms=100.0)
+    assert cache.get("waiting period for a pre-existing illness", [0.99, 0.1]).match == "semantic"
+    assert cache.get("is maternity covered?", [0.0, 1.0]) is None
+    assert cache.metrics()["semantic_hits"] == 1 and cache.metrics()["misses"] == 1
+
+
+def test_entries_expire_and_are_evicted_least_recently_used():
+    cache = AnswerCache(max_entries=2, ttl_seconds=60)
+    for query in ("a", "b", "c"):
+        cache.put(query, None, query, [], compute_ms=1.0)
+    assert cache.get_exact("a") is None and cache.get_exact("c").answer == "c"
+
+    cache._entries["c"].created_at = time.time() - 120
+    assert cache.get_exact("c") is None
+    assert cache.metrics()["entries"] == 1
+
+
+@pytest.mark.benchmark(group="answer-cache")
+@pytest.mark.parametrize("mode", ["hit", "miss"])
+def test_benchmark_hit_against_miss(benchmark, rag_service, fake_llm, monkeypatch, mode):
+    # a 20 ms provider round trip for every answer that is generated
+    fake_llm.latency_ms = 20
+    if mode == "hit":
+        assert rag_service.run_query(QUERY).cached is None
+    else:
+        monkeypatch.setenv("ANSWER_CACHE_ENABLED", "false")
+
+    result = benchmark.pedantic(lambda: rag_service.run_query(QUERY), rounds=10, iterations=1)
+    assert result.cached == ("exact" if mode == "hit" else None)
+    if mode == "hit":
+        benchmark.extra_info["cache_saved_ms"] = round(result.timings["cache_saved_ms"], 2)
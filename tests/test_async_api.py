@@ -0,0 +1,111 @@
+import asyncio
+import time
+
+import pytest
+
+from app.services.RAG_service import RAGService
+
+QUERY = "waiting period for pre-existing disease"
+
+
+class SlowSparse:
+    """Wraps a sparse retriever; each search blocks its thread for `seconds`."""
+
+    def __init__(self, inner, seconds):
+        self.inner = inner
+        self.seconds = seconds
+
+    def search_with_scores(self, query, k=None):
+        time.sleep(self.seconds)
+        return self.inner.search_with_scores(query, k)
+
+
+async def _ticks_during(coro, interval=0.01):
+    """Run `coro` while counting how often the event loop gets to run another task."""
+    ticks = 0
+    done = asyncio.Event()
+
+    async def ticker():
+        nonlocal ticks
+        while not done.is_set():
+            await asyncio.sleep(interval)
+            ticks += 1
+
+    task = asyncio.create_task(ticker())
+    try:
+        return await coro, ticks
+    finally:
+        done.set()
+        await task
+
+
+@pytest.mark.asyncio
+async def test_aretrieve_matches_retrieve(rag_service):
+    hits, _ = rag_service.retriever.retrieve(QUERY)
+    ahits, timings = await rag_service.retriever.aretrieve(QUERY)
+    assert [h.chunk_id for h in ahits] == [h.chunk_id for h in hits]
+    assert set(timings) == {"dense_ms", "sparse_ms", "total_ms"}
+
+
+@pytest.mark.asyncio
+async def test_sparse_leg_does_not_block_the_event_loop(rag_service, monkeypatch):
+    retriever = rag_service.retriever
+    monkeypatch.setattr(retriever, "sparse_retriever", SlowSparse(retriever.sparse_retriever, 0.3))
+
+    (hits, timings), ticks = await _ticks_during(retriever.aretrieve(QUERY))
+    assert hits and timings["sparse_ms"] >= 300
+    assert ticks >= 10
+
+
+@pytest.mark.asyncio
+async def test_aload_then_aquery(fake_llm, pages, load_pages, monkeypatch):
+    monkeypatch.setenv("ANSWER_CACHE_ENABLED", "false")
+    load_pages(pages)
+    service = RAGService()
+    await service.aload("pdf", path="policy.pdf")
+
+    result = await service.aquery(QUERY)
+    assert result.query == QUERY and result.hits and result.answer
+    assert [h.chunk_id for h in result.hits] == [h.chunk_id for h in service.run_query(QUERY).hits]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("route, method", [
+    ("delete_session", "delete_session"),
+    ("get_sessions_metrics", "metrics"),
+])
+async def test_session_routes_do_not_block_the_event_loop(route, method, monkeypatch):
+    from app.api.v1 import routes
+
+    def slow(*args, **kwargs):
+        time.sleep(0.3)
+        return {}
+
+    monkeypatch.setattr(routes.session_manager, method, slow)
+    args = ("some-session",) if route == "delete_session" else ()
+    _, ticks = await _ticks_during(getattr(routes, route)(*args))
+    assert ticks >= 10
+
+
+@pytest.mark.benchmark(group="async-queries")
+@pytest.mark.parametrize("route", ["blocking", "async"])
+@pytest.mark.parametrize("n", [1, 8, 32])
+def test_benchmark_concurrent_queries(benchmark, rag_service, fake_llm, monkeypatch, route, n):
+    # a 50 ms provider round trip per LLM call; `n` requests arrive at once
+    monkeypatch.setenv("ANSWER_CACHE_ENABLED", "false")
+    fake_llm.latency_ms = 50
+    queries = [f"{QUERY} {i}" for i in range(n)]
+
+    async def blocking(query):
+        return rag_service.run_query(query)
+
+    handler = rag_service.aquery if route == "async" else blocking
+
+    async def requests():
+        return await asyncio.gather(*(handler(query) for query in queries))
+
+    results = benchmark.pedantic(lambda: asyncio.run(requests()), rounds=2, iterations=1)
+    assert [r.query for r in results] == queries
+    benchmark.extra_info["requests"] = n
+    if benchmark.stats:  # None under --benchmark-disable
+        benchmark.extra_info["queries_per_second"] = round(n / benchmark.stats.stats.mean, 1)
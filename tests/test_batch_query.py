@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+
+from app.utils.model_router import get_router
+from tests.conftest import WORDS
+
+QUESTIONS = [
+    "what is the waiting period for pre-existing disease?",
+    "is maternity covered?",
+    "are dental and optical excluded?",
+    "how is the premium paid?",
+    "is ambulance cover included?",
+]
+
+
+def _answer_calls():
+    return get_router().metrics().get("answer", {}).get("calls", 0)
+
+
+@pytest.fixture
+def no_answer_cache(monkeypatch):
+    monkeypatch.setenv("ANSWER_CACHE_ENABLED", "false")
+
+
+def test_matches_single_queries_in_order(rag_service, no_answer_cache):
+    single = [rag_service.run_query(q) for q in QUESTIONS]
+    batch = rag_service.batch_query(QUESTIONS, max_concurrency=3)
+
+    assert [r.query for r in batch] == QUESTIONS
+    for one, many in zip(single, batch):
+        assert [h.chunk_id for h in many.hits] == [h.chunk_id for h in one.hits]
+        assert many.answer == one.answer
+        assert many.filter_source == one.filter_source
+
+
+def test_packed_answers_use_fewer_llm_calls(rag_service, no_answer_cache, monkeypatch):
+    monkeypatch.setenv("BATCH_PACK_SIZE", "3")
+    before = _answer_calls()
+    batch = rag_service.batch_query(QUESTIONS)
+
+    assert _answer_calls() - before == 2
+    assert all(r.answer for r in batch)
+    assert [r.query for r in batch] == QUESTIONS
+
+
+def test_cached_questions_skip_generation(rag_service, monkeypatch):
+    monkeypatch.setenv("ANSWER_CACHE_ENABLED", "true")
+    rag_service.answer_cache.invalidate()
+    first = rag_service.run_query(QUESTIONS[0])
+    before = _answer_calls()
+    batch = rag_service.batch_query(QUESTIONS[:2])
+
+    assert batch[0].cached == "exact" and batch[0].answer == first.answer
+    assert batch[1].cached is None
+    assert _answer_calls() - before == 1
+
+
+def test_worker_llm_calls_keep_the_callers_priority(rag_service, no_answer_cache, monkeypatch):
+    from app.utils import llm_scheduler
+
+    priorities = []
+    call = llm_scheduler.LLMScheduler.call
+
+    def recording_call(self, *args, **kwargs):
+        priorities.append(llm_scheduler._priority.get())
+        return call(self, *args, **kwargs)
+
+    monkeypatch.setattr(llm_scheduler.LLMScheduler, "call", recording_call)
+    with llm_scheduler.llm_priority(llm_scheduler.BACKGROUND):
+        rag_service.batch_query(QUESTIONS, max_concurrency=3)
+
+    assert priorities and set(priorities) == {llm_scheduler.BACKGROUND}
+
+
+def _questions(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return [f"what does the policy say about {a} and {b}?" for a, b in rng.choice(WORDS, (n, 2))]
+
+
+@pytest.mark.benchmark(group="batch-throughput")
+@pytest.mark.parametrize("mode", ["batch", "sequential"])
+@pytest.mark.parametrize("n", [1, 10, 50])
+def test_benchmark_throughput(benchmark, rag_service, no_answer_cache, fake_llm, mode, n):
+    # a 20 ms provider round trip per call, which the batch overlaps
+    fake_llm.latency_ms = 20
+    questions = _questions(n)
+    if mode == "batch":
+        run = lambda: rag_service.batch_query(questions)
+    else:
+        run = lambda: [rag_service.run_query(q) for q in questions]
+
+    results = benchmark.pedantic(run, rounds=3, iterations=1)
+    assert [r.query for r in results] == questions
+    benchmark.extra_info["questions"] = n
+    if benchmark.stats:  # None under --benchmark-disable
+        benchmark.extra_info["questions_per_second"] = round(n / benchmark.stats.stats.mean, 1)
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+from rank_bm25 import BM25Okapi
+
+from app.retrieval.bm25 import BM25Index, BM25SparseRetriever
+from tests.conftest import WORDS
+
+
+def _corpus(n_docs: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    return [list(rng.choice(WORDS, rng.integers(5, 60))) for _ in range(n_docs)]
+
+
+QUERIES = [["premium"], ["waiting", "period"], ["maternity", "cover", "cover"], ["unknown"], ["dental", "unknown"]]
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_scores_match_rank_bm25(query):
+    corpus = _corpus(400)
+    np.testing.assert_allclose(BM25Index(corpus).get_scores(query), BM25Okapi(corpus).get_scores(query))
+
+
+@pytest.mark.parametrize("query", QUERIES)
+@pytest.mark.parametrize("k", [1, 10, 400, 1000])
+def test_top_k_is_best_first_with_lowest_index_on_ties(query, k):
+    corpus = _corpus(400)
+    reference = BM25Okapi(corpus).get_scores(query)
+    top, scores = BM25Index(corpus).search(query, k)
+
+    expected = sorted(range(len(corpus)), key=lambda i: (-reference[i], i))[:k]
+    assert top.tolist() == expected
+    np.testing.assert_allclose(scores, reference[expected])
+
+
+def test_retriever_returns_documents_with_scores():
+    docs = [Document(page_content=" ".join(tokens), metadata={"row": i}) for i, tokens in enumerate(_corpus(50))]
+    retriever = BM25SparseRetriever.from_documents(docs, k=3)
+    reference = BM25Okapi([d.page_content.split() for d in docs]).get_scores(["premium"])
+
+    results = retriever.search_with_scores("premium")
+    assert [doc.metadata["row"] for doc, _ in results] == sorted(range(50), key=lambda i: (-reference[i], i))[:3]
+    assert [doc.metadata["row"] for doc in retriever.invoke("premium")] == [doc.metadata["row"] for doc, _ in results]
+
+
+def test_benchmark_search(benchmark):
+    index = BM25Index(_corpus(5000))
+    top, _ = benchmark(index.search, ["waiting", "period", "premium"], 10)
+    assert len(top) == 10
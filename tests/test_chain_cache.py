@@ -0,0 +1,81 @@
+import pytest
+from langchain_core.exceptions import OutputParserException
+from langchain_core.runnables import RunnableLambda
+
+from app.metadata_extraction.metadata_ext import _page_prompt
+from app.schemas.metadata_schema import HRMetadata, InsuranceMetadata
+from app.utils.chain_cache import ChainCache, _require_result, format_instructions, output_parser, schema_json
+from app.utils.offline_models import FakeChatModel
+
+INPUTS = {"document_content": "Maternity cover after a two year waiting period; dental is excluded."}
+
+
+class ParserOnlyModel(FakeChatModel):
+    def with_structured_output(self, schema, **kwargs):
+        raise NotImplementedError
+
+
+@pytest.mark.parametrize("native", [False, True])
+def test_chain_is_compiled_once_per_task_schema_and_model(native):
+    cache, llm = ChainCache(), FakeChatModel()
+    chain = cache.chain("page_metadata", InsuranceMetadata, llm, _page_prompt, native)
+
+    assert cache.chain("page_metadata", InsuranceMetadata, llm, _page_prompt, native) is chain
+    assert cache.chain("page_metadata", HRMetadata, llm, _page_prompt, native) is not chain
+    assert cache.chain("page_metadata", InsuranceMetadata, FakeChatModel(), _page_prompt, native) is not chain
+    assert cache.metrics() == {"entries": 3, "hits": 1, "misses": 3}
+    assert isinstance(chain.invoke(INPUTS), InsuranceMetadata)
+
+
+def test_native_mode_falls_back_to_the_parser_chain():
+    cache = ChainCache()
+    chain = cache.chain("page_metadata", InsuranceMetadata, ParserOnlyModel(), _page_prompt, native=True)
+    assert isinstance(chain.invoke(INPUTS), InsuranceMetadata)
+
+
+def test_schema_strings_are_built_once():
+    assert schema_json(InsuranceMetadata) is schema_json(InsuranceMetadata)
+    assert schema_json(InsuranceMetadata) in _page_prompt(InsuranceMetadata, False).format(**INPUTS)
+    assert schema_json(InsuranceMetadata) not in _page_prompt(InsuranceMetadata, True).format(**INPUTS)
+
+
+def test_bounded_lru_and_reused_model_ids():
+    cache = ChainCache(max_entries=2)
+    models = [FakeChatModel() for _ in range(3)]
+    structured = [cache.structured_llm(m, InsuranceMetadata) for m in models]
+    assert cache.structured_llm(models[2], InsuranceMetadata) is structured[2]
+    assert cache.metrics()["entries"] == 2
+    assert cache.structured_llm(models[0], InsuranceMetadata) is not structured[0]
+
+    # an entry stored for one object is not served to another that got the same id()
+    key = ("structured", InsuranceMetadata, id(models[1]))
+    cache._store(key, models[1], RunnableLambda(lambda x: x))
+    assert cache._lookup(key, FakeChatModel()) is None
+
+
+def test_empty_native_result_is_a_parse_failure():
+    with pytest.raises(OutputParserException):
+        _require_result(None)
+
+
+def _uncached_chain(llm):
+    """What every call paid before: schema dump, parser, prompt and chain built from scratch."""
+    for memo in (schema_json, output_parser, format_instructions):
+        memo.cache_clear()
+    return ChainCache().chain("page_metadata", InsuranceMetadata, llm, _page_prompt, False)
+
+
+@pytest.mark.benchmark(group="chain-cache")
+@pytest.mark.parametrize("mode", ["cached", "fresh"])
+@pytest.mark.parametrize("step", ["build", "extract"])
+def test_benchmark_cached_against_fresh_chain(benchmark, mode, step):
+    cache, llm = ChainCache(), FakeChatModel()
+    if mode == "cached":
+        cache.chain("page_metadata", InsuranceMetadata, llm, _page_prompt, False)
+        build = lambda: cache.chain("page_metadata", InsuranceMetadata, llm, _page_prompt, False)
+    else:
+        build = lambda: _uncached_chain(llm)
+
+    result = benchmark(build if step == "build" else lambda: build().invoke(INPUTS))
+    if step == "extract":
+        assert isinstance(result, InsuranceMetadata)
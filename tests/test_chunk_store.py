@@ -0,0 +1,123 @@
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+import app.ingestion.text_splitter as text_splitter_module
+from app.retrieval.chunk_index import ChunkIndex
+from app.retrieval.chunk_store import ChunkStore
+from app.schemas.request_models import ClauseHit
+from app.services.RAG_service import RAGService
+from app.utils.memory_utils import deep_sizeof
+from tests.conftest import WORDS
+
+PAGES = ["alpha beta gamma delta", "epsilon zeta eta theta"]
+UNLOCATED = "text the splitter rewrote"
+
+
+@pytest.fixture
+def store():
+    """Two pages of two chunks each; the last chunk of page 2 could not be located."""
+    metadata = [{"doc_id": f"doc{i}", "page_no": i, "source": "policy"} for i in range(2)]
+    return ChunkStore.from_pages(PAGES, metadata, [[(0, 10), (11, 22)], [(0, 12), UNLOCATED]])
+
+
+def _round_trips(store, tmp_path):
+    yield ChunkStore.from_arrays(store.to_arrays(), ChunkIndex.from_arrays(store.index.to_arrays()))
+    path = str(tmp_path / "chunks.npz")
+    store.index.save(path)
+    yield ChunkStore.from_arrays(store.to_arrays(), ChunkIndex.load(path))
+
+
+def test_chunk_text_is_sliced_from_its_page(store):
+    assert store.texts() == ["alpha beta", "gamma delta", "epsilon zeta", UNLOCATED]
+    assert store.chunk_ids == ["doc0_p0_c0", "doc0_p0_c1", "doc1_p1_c0", "doc1_p1_c1"]
+    assert store[1].metadata["start_index"] == 11 and store[1].metadata["end_index"] == 22
+    assert store[3].metadata["start_index"] == store[3].metadata["end_index"] == -1
+
+
+def test_offsets_and_unlocated_text_survive_a_round_trip(store, tmp_path):
+    for restored in _round_trips(store, tmp_path):
+        assert restored.texts() == store.texts()
+        assert [d.metadata for d in restored] == [d.metadata for d in store]
+
+
+def test_unlocated_chunks_are_not_expansion_neighbours(store):
+    hit = ClauseHit(doc_id="doc1", page=1, chunk_id="doc1_p1_c0", text="epsilon zeta", metadata={}, score=1.0)
+    assert store.index.neighbours("doc1_p1_c0") == []
+    assert [h.chunk_id for h in store.index.expand_hits([hit])] == ["doc1_p1_c0"]
+
+
+def test_from_chunks_keeps_unlocated_text_inline():
+    pages = [Document(page_content=text, metadata={"doc_id": f"doc{i}", "page_no": i}) for i, text in enumerate(PAGES)]
+    chunks = [
+        Document(page_content="beta gamma", metadata={"doc_id": "doc0", "chunk_id": "a"}),
+        Document(page_content=UNLOCATED, metadata={"doc_id": "doc1", "chunk_id": "b", "start_index": -1}),
+    ]
+    index = ChunkIndex.from_chunks(chunks, pages)
+    assert [index.text(0), index.text(1)] == ["beta gamma", UNLOCATED]
+    assert index.start.tolist() == [6, -1]
+
+
+class RewritingSplitter:
+    """Yields one chunk per page whose text does not occur in the page."""
+
+    def __init__(self, **kwargs):
+        pass
+
+    def create_documents(self, texts):
+        return [Document(page_content=f"{UNLOCATED} {texts[0][:5]}", metadata={"start_index": -1})]
+
+
+def test_unlocated_chunks_are_indexed_with_their_text(fake_llm, pages, load_pages, monkeypatch):
+    monkeypatch.setattr(text_splitter_module, "RecursiveCharacterTextSplitter", RewritingSplitter)
+    load_pages(pages[:2])
+    service = RAGService()
+    service.load_and_split_document("pdf", path="policy.pdf")
+    service.create_vector_store()
+
+    assert all(text.startswith(UNLOCATED) for text in service.chunks.texts())
+    hits = service.retriever.sparse_retriever.search_with_scores("rewrote")
+    assert len(hits) == 2
+
+
+def _pymupdf_pages(n_pages):
+    """Page texts, loader-style metadata (one dict per page) and 500-char chunk spans overlapping by 100."""
+    rng = np.random.default_rng(0)
+    texts = [" ".join(rng.choice(WORDS, 300)) for _ in range(n_pages)]
+    metadata = [{
+        "doc_id": "policy", "page_no": p, "source": "/uploads/policy.pdf", "file_path": "/uploads/policy.pdf",
+        "producer": "Microsoft Word", "creator": "Microsoft Word", "format": "PDF 1.7", "total_pages": n_pages,
+        "keywords": ["waiting period", "pre-existing disease", "maternity"], "page": p,
+    } for p in range(n_pages)]
+    spans = [[(s, min(s + 500, len(t))) for s in range(0, max(len(t) - 100, 1), 400)] for t in texts]
+    return texts, metadata, spans
+
+
+def _documents(texts, metadata, spans):
+    """The per-chunk Document list the store replaced."""
+    return [
+        Document(page_content=text[s:e], metadata={**meta, "start_index": s, "end_index": e,
+                                                    "chunk_id": f"{meta['doc_id']}_p{meta['page_no']}_c{j}"})
+        for text, meta, page_spans in zip(texts, metadata, spans)
+        for j, (s, e) in enumerate(page_spans)
+    ]
+
+
+@pytest.mark.benchmark(group="chunk-store")
+@pytest.mark.parametrize("layout", ["store", "documents"])
+def test_benchmark_footprint_against_documents(benchmark, layout):
+    pages = _pymupdf_pages(1000)
+    build = (lambda: ChunkStore.from_pages(*pages)) if layout == "store" else (lambda: _documents(*pages))
+
+    def build_and_read():
+        chunks = build()
+        return chunks, sum(len(d.page_content) for d in chunks)
+
+    chunks, chars = benchmark.pedantic(build_and_read, rounds=3, iterations=1)
+    assert chars == sum(e - s for page_spans in pages[2] for s, e in page_spans)
+    benchmark.extra_info["chunks"] = len(chunks)
+    if layout == "store":
+        seen = set()
+        benchmark.extra_info["bytes"] = deep_sizeof(vars(chunks.index), seen) + deep_sizeof(chunks.page_metadata, seen)
+    else:
+        benchmark.extra_info["bytes"] = deep_sizeof(chunks)
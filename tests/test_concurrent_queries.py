@@ -0,0 +1,36 @@
+import asyncio
+import random
+
+import pytest
+
+from tests.conftest import WORDS
+
+QUESTIONS = [" ".join(random.Random(i).sample(WORDS, 3)) + "?" for i in range(12)]
+
+
+@pytest.fixture
+def references(rag_service, monkeypatch):
+    """Each question answered alone (answer cache off, so concurrent calls really run)."""
+    monkeypatch.setenv("ANSWER_CACHE_ENABLED", "false")
+    rag_service.answer_cache.invalidate()
+    return {q: rag_service.run_query(q) for q in QUESTIONS}
+
+
+def _chunk_ids(result):
+    return [hit.chunk_id for hit in result.hits]
+
+
+@pytest.mark.asyncio
+async def test_gathered_aquery_results_belong_to_their_own_question(rag_service, references, fake_llm):
+    assert len({tuple(_chunk_ids(r)) for r in references.values()}) > len(QUESTIONS) // 2, \
+        "questions should retrieve different chunks"
+    # a little latency so the calls interleave on the event loop
+    fake_llm.latency_ms = 20
+    questions = QUESTIONS * 3
+    results = await asyncio.gather(*(rag_service.aquery(q) for q in questions))
+
+    for question, result in zip(questions, results):
+        assert result.query == question
+        assert _chunk_ids(result) == _chunk_ids(references[question])
+        assert result.answer == references[question].answer
+        assert question.rstrip("?") in result.answer
@@ -0,0 +1,67 @@
+import numpy as np
+
+from app.retrieval.context_assembler import ContextAssembler
+from app.schemas.request_models import ClauseHit
+from app.utils.token_utils import estimate_tokens
+from tests.conftest import WORDS
+
+PAGE = " ".join(np.random.default_rng(3).choice(WORDS, 200))
+
+
+def hit(start, end, page=1, doc_id="doc", text=None, chunk_id=None):
+    """A hit for PAGE[start:end]; start=None makes a legacy chunk without offsets."""
+    text = text if text is not None else PAGE[start:end]
+    metadata = {} if start is None else {"start_index": start, "end_index": end}
+    return ClauseHit(doc_id=doc_id, page=page, chunk_id=chunk_id or f"{doc_id}-{page}-{start}-{end}",
+                     text=text, metadata=metadata, score=1.0)
+
+
+def test_hits_are_taken_in_order_until_the_budget_is_spent():
+    hits = [hit(0, 400), hit(500, 900), hit(1000, 1400)]
+    selected, stats = ContextAssembler(token_budget=250).select(hits)
+    assert selected == hits[:2]
+    assert stats == {"selected": 2, "duplicates": 0, "over_budget": 1, "tokens": 200}
+
+
+def test_the_first_hit_is_kept_even_over_budget():
+    selected, stats = ContextAssembler(token_budget=10).select([hit(0, 400), hit(500, 540)])
+    assert [h.chunk_id for h in selected] == ["doc-1-0-400"]
+    assert stats["over_budget"] == 1
+
+
+def test_overlap_with_a_selected_chunk_on_the_same_page_is_not_charged_twice():
+    selected, stats = ContextAssembler().select([hit(0, 400), hit(300, 700)])
+    assert len(selected) == 2 and stats["tokens"] == 100 + 75
+
+    # the same offsets on another page are a different text
+    _, stats = ContextAssembler().select([hit(0, 400), hit(300, 700, page=2)])
+    assert stats["tokens"] == 200
+
+
+def test_near_duplicates_are_dropped():
+    text = PAGE[:400]
+    hits = [hit(0, 400), hit(None, None, page=3, text=text + " rider"), hit(None, None, page=4, text=PAGE[600:900])]
+    selected, stats = ContextAssembler(dedup_threshold=0.9).select(hits)
+    assert [h.page for h in selected] == [1, 4]
+    assert stats["duplicates"] == 1
+
+
+def test_overlapping_chunks_are_merged_on_their_offsets():
+    # out of position order; 0-400 and 300-700 overlap, 800-1000 is separate
+    blocks = ContextAssembler.merge([hit(300, 700), hit(800, 1000), hit(0, 400)])
+    assert blocks == [(1, PAGE[0:700] + " ... " + PAGE[800:1000])]
+
+
+def test_pages_are_ordered_by_their_best_hit_and_legacy_chunks_kept():
+    hits = [hit(0, 100, page=5), hit(None, None, page=2, text="legacy text"), hit(200, 300, page=2), hit(400, 500, page=5)]
+    blocks = ContextAssembler.merge(hits)
+    assert [page for page, _ in blocks] == [5, 2]
+    assert blocks[0][1] == PAGE[0:100] + " ... " + PAGE[400:500]
+    assert blocks[1][1] == PAGE[200:300] + " ... legacy text"
+
+
+def test_assemble_reports_the_prompt_context_tokens():
+    blocks, stats = ContextAssembler().assemble([hit(0, 400), hit(300, 700)])
+    assert blocks == ["[Page 1]\n" + PAGE[0:700]]
+    assert stats["context_tokens"] == estimate_tokens(blocks[0])
+    assert stats["context_tokens"] < 200
@@ -0,0 +1,76 @@
+import pytest
+
+from app.retrieval.chunk_store import ChunkStore
+from app.schemas.request_models import ClauseHit
+
+# two pages of four 100-char chunks overlapping by 20
+PAGES = ["".join(chr(ord("a") + (i // 10) % 26) for i in range(340)), "".join(chr(ord("A") + (i // 10) % 26) for i in range(340))]
+SPANS = [(0, 100), (80, 180), (160, 260), (240, 340)]
+
+
+@pytest.fixture
+def store():
+    metadata = [{"doc_id": f"doc{i}", "page_no": i} for i in range(2)]
+    return ChunkStore.from_pages(PAGES, metadata, [SPANS, SPANS])
+
+
+def hit(store, row):
+    return ClauseHit(doc_id=store.page_metadata[store.index.page[row]]["doc_id"], page=int(store.index.page_no[store.index.page[row]]),
+                     chunk_id=store.chunk_ids[row], text=store.text(row), metadata=store.metadata(row), score=1.0 - row / 10)
+
+
+def ids(hits):
+    return [h.chunk_id for h in hits]
+
+
+def test_neighbours_stay_on_the_hits_page(store):
+    index = store.index
+    assert index.neighbours("doc0_p0_c1") == [0, 2]
+    assert index.neighbours("doc0_p0_c1", window=2) == [0, 2, 3]
+    # chunk 3 of page 0 and chunk 0 of page 1 are adjacent rows, not neighbours
+    assert index.neighbours("doc0_p0_c3") == [2]
+    assert index.neighbours("doc1_p1_c0") == [5]
+    assert index.neighbours("unknown") == []
+
+
+def test_neighbour_expansion_follows_each_hit(store):
+    expanded = store.index.expand_hits([hit(store, 5), hit(store, 2)])
+    assert ids(expanded) == ["doc1_p1_c1", "doc1_p1_c0", "doc1_p1_c2", "doc0_p0_c2", "doc0_p0_c1", "doc0_p0_c3"]
+
+    neighbour = expanded[1]
+    assert neighbour.text == PAGES[1][0:100]
+    assert (neighbour.metadata["start_index"], neighbour.metadata["end_index"]) == (0, 100)
+    assert neighbour.metadata["expanded_from"] == "doc1_p1_c1"
+    assert neighbour.score == expanded[0].score and neighbour.page == 1
+
+
+def test_adjacent_hits_do_not_repeat_chunks(store):
+    expanded = store.index.expand_hits([hit(store, 1), hit(store, 2)])
+    assert ids(expanded) == ["doc0_p0_c1", "doc0_p0_c0", "doc0_p0_c2", "doc0_p0_c3"]
+    # a later hit already added as a neighbour keeps its place
+    assert expanded[2].metadata["expanded_from"] == "doc0_p0_c1"
+
+
+def test_page_expansion_adds_each_parent_page_once(store):
+    expanded = store.index.expand_hits([hit(store, 0), hit(store, 2), hit(store, 6)], mode="page")
+    assert ids(expanded) == ["doc0_p0_c0", "doc0_page", "doc0_p0_c2", "doc1_p1_c2", "doc1_page"]
+    assert expanded[1].text == PAGES[0] and expanded[4].text == PAGES[1]
+
+
+def test_unknown_hits_and_modes_pass_through(store):
+    foreign = ClauseHit(doc_id="other", page=0, chunk_id="other-chunk", text="elsewhere", score=0.5)
+    assert ids(store.index.expand_hits([foreign, hit(store, 0)])) == ["other-chunk", "doc0_p0_c0", "doc0_p0_c1"]
+    assert ids(store.index.expand_hits([hit(store, 0)], mode="none")) == ["doc0_p0_c0"]
+
+
+def test_expanded_context_is_merged_into_one_block_per_page(rag_service, monkeypatch):
+    chunks = rag_service.chunks
+    row = next(r for r in range(1, len(chunks) - 1)
+               if chunks.index.page[r - 1] == chunks.index.page[r] == chunks.index.page[r + 1])
+    page_text = chunks.index.page_content(chunks.index.page[row])
+    start, end = int(chunks.index.start[row - 1]), int(chunks.index.end[row + 1])
+
+    monkeypatch.setenv("CONTEXT_EXPANSION", "neighbours")
+    monkeypatch.setenv("CONTEXT_TOKEN_BUDGET", "10000")
+    blocks = rag_service._context_blocks([hit(chunks, row)])
+    assert blocks == [f"[Page {int(chunks.index.page_no[chunks.index.page[row]])}]\n{page_text[start:end]}"]
@@ -0,0 +1,77 @@
+import time
+
+import pytest
+
+from app.utils.deadline import Deadline
+
+QUERY = "waiting period for pre-existing disease"
+
+
+def _spent(budget_ms, elapsed_ms):
+    """A deadline `elapsed_ms` into a `budget_ms` budget."""
+    deadline = Deadline(budget_ms)
+    deadline.start = time.perf_counter() - elapsed_ms / 1000
+    return deadline
+
+
+def test_without_a_budget_every_stage_fits():
+    deadline = Deadline()
+    assert deadline.affords(1e9, reserve_ms=1e9)
+    assert deadline.timeout(1000) is None and deadline.timings() == {}
+
+
+def test_stages_fit_while_keeping_the_reserve():
+    deadline = _spent(1000, 400)
+    assert deadline.affords(300, reserve_ms=200)
+    assert not deadline.affords(500, reserve_ms=200)
+    assert deadline.timeout(200) == pytest.approx(0.4, abs=0.02)
+    assert _spent(1000, 1500).timeout(200) == 0.0
+
+    deadline.degrade("rerank_skipped")
+    deadline.degrade("rerank_skipped")
+    assert deadline.degradations == ["rerank_skipped"]
+
+
+@pytest.fixture
+def budgeted(rag_service, monkeypatch):
+    """rag_service with a 1s answer reserve, a 1s LLM filter estimate and no local fast-path."""
+    monkeypatch.setenv("DEADLINE_ANSWER_RESERVE_MS", "1000")
+    monkeypatch.setenv("DEADLINE_LLM_FILTER_MS", "1000")
+    monkeypatch.setenv("RERANK_LATENCY_BUDGET_MS", "250")
+    monkeypatch.setenv("ANSWER_CACHE_ENABLED", "false")
+    monkeypatch.setattr(rag_service, "_local_query_metadata", lambda *args: (None, 0.0))
+    return rag_service
+
+
+@pytest.mark.parametrize("budget_ms, degradations", [
+    (100_000, []),
+    (1800, ["llm_filter_skipped"]),
+    (1200, ["llm_filter_skipped", "rerank_shortened"]),
+    (900, ["llm_filter_skipped", "rerank_skipped", "context_reduced"]),
+])
+def test_optional_stages_degrade_in_order_as_the_budget_shrinks(budgeted, budget_ms, degradations):
+    result = budgeted.run_query(QUERY, latency_budget_ms=budget_ms)
+    assert result.degradations == degradations
+    assert result.answer and result.hits
+    assert result.timings["deadline_ms"] == budget_ms
+
+
+@pytest.mark.parametrize("remaining_ms, token_budget", [(500, 750), (100, 375), (-50, 375)])
+def test_context_shrinks_with_the_time_left_before_the_answer(budgeted, monkeypatch, remaining_ms, token_budget):
+    monkeypatch.setenv("CONTEXT_TOKEN_BUDGET", "1500")
+    monkeypatch.setenv("DEADLINE_MIN_CONTEXT_FRACTION", "0.25")
+    budgets = []
+    monkeypatch.setattr(budgeted, "_context_blocks", lambda hits, budget=None: budgets.append(budget) or [])
+
+    deadline = _spent(10_000, 10_000 - remaining_ms)
+    budgeted._answer_prompt(QUERY, [], deadline)
+    # the clock keeps running between the two calls
+    assert budgets == [pytest.approx(token_budget, abs=30)]
+    assert deadline.degradations == ["context_reduced"]
+
+
+def test_degraded_answers_are_not_cached(budgeted, monkeypatch):
+    monkeypatch.setenv("ANSWER_CACHE_ENABLED", "true")
+    assert budgeted.run_query(QUERY, latency_budget_ms=900).degradations
+    assert budgeted.run_query(QUERY).cached is None
+    assert budgeted.run_query(QUERY).cached == "exact"
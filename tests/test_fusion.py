@@ -0,0 +1,97 @@
+import math
+
+import pytest
+from langchain_core.documents import Document
+
+from app.retrieval.fusion import chunk_key, fuse_results
+
+
+def doc(chunk_id, text=None):
+    metadata = {"chunk_id": chunk_id, "doc_id": "doc", "page_no": 1} if chunk_id else {}
+    return Document(page_content=text or f"text of {chunk_id}", metadata=metadata)
+
+
+def ids(hits):
+    return [h.chunk_id for h in hits]
+
+
+def test_rrf_sums_weighted_reciprocal_ranks():
+    dense = [(doc("a"), 0.9), (doc("b"), 0.8), (doc("c"), 0.7)]
+    sparse = [(doc("c"), 12.0), (doc("d"), 9.0)]
+    hits = fuse_results(dense, sparse, weights=(0.7, 0.3), rrf_k=60)
+
+    by_id = {h.chunk_id: h for h in hits}
+    assert by_id["c"].score == pytest.approx(0.7 / 63 + 0.3 / 61)
+    assert by_id["d"].score == pytest.approx(0.3 / 62)
+    assert ids(hits) == ["c", "a", "b", "d"]
+    assert (by_id["c"].dense_rank, by_id["c"].sparse_rank) == (3, 1)
+    assert (by_id["c"].dense_score, by_id["c"].sparse_score) == (0.7, 12.0)
+
+
+def test_weights_decide_between_the_legs_top_hits():
+    dense, sparse = [(doc("a"), 0.9)], [(doc("b"), 5.0)]
+    assert ids(fuse_results(dense, sparse, weights=(0.7, 0.3))) == ["a", "b"]
+    assert ids(fuse_results(dense, sparse, weights=(0.3, 0.7))) == ["b", "a"]
+
+
+def test_chunks_missing_from_a_leg_have_no_rank_or_score_there():
+    hits = fuse_results([(doc("a"), 0.9)], [(doc("b"), 5.0)])
+    by_id = {h.chunk_id: h for h in hits}
+    assert by_id["a"].sparse_rank is None and by_id["a"].sparse_score is None
+    assert by_id["b"].dense_rank is None and by_id["b"].dense_score is None
+    assert all(math.isfinite(h.score) for h in hits)
+
+
+def test_duplicates_within_a_leg_keep_their_best_rank():
+    hits = fuse_results([(doc("a"), 0.9), (doc("b"), 0.8), (doc("a"), 0.1)], [])
+    assert ids(hits) == ["a", "b"]
+    assert hits[0].dense_rank == 1 and hits[0].dense_score == 0.9
+
+
+def test_chunks_without_an_id_are_matched_by_content():
+    dense, sparse = [(doc(None, "same text"), 0.9)], [(doc(None, "same text"), 3.0)]
+    hits = fuse_results(dense, sparse)
+    assert len(hits) == 1 and hits[0].chunk_id == chunk_key(doc(None, "same text"))
+    assert hits[0].dense_rank == hits[0].sparse_rank == 1
+
+
+def test_score_fusion_min_max_normalises_each_leg():
+    dense = [(doc("a"), 0.9), (doc("b"), 0.5), (doc("c"), 0.1)]
+    sparse = [(doc("c"), 20.0), (doc("b"), 10.0)]
+    hits = fuse_results(dense, sparse, weights=(0.5, 0.5), method="score")
+
+    by_id = {h.chunk_id: h.score for h in hits}
+    assert by_id == pytest.approx({"a": 0.5, "b": 0.25, "c": 0.5})
+    # ties keep first-seen order
+    assert ids(hits) == ["a", "c", "b"]
+
+
+def test_score_fusion_of_a_single_result_leg_counts_it_fully():
+    hits = fuse_results([(doc("a"), 0.3)], [], weights=(0.7, 0.3), method="score")
+    assert hits[0].score == pytest.approx(0.7)
+
+
+@pytest.mark.parametrize("method", ["rrf", "score"])
+def test_nan_leg_scores_do_not_poison_the_fused_score(method):
+    dense = [(doc("a"), float("nan")), (doc("b"), 0.5)]
+    sparse = [(doc("a"), 4.0), (doc("c"), float("nan"))]
+    hits = fuse_results(dense, sparse, weights=(0.7, 0.3), method=method)
+    assert all(math.isfinite(h.score) for h in hits)
+    by_id = {h.chunk_id: h.score for h in hits}
+    if method == "rrf":
+        # ranks only: a NaN score still counts as the leg returning the chunk
+        assert ids(hits)[0] == "a"
+    else:
+        # a NaN score counts as the leg not returning the chunk
+        assert by_id == pytest.approx({"a": 0.3, "b": 0.7, "c": 0.0})
+
+
+def test_top_k_and_empty_input():
+    dense = [(doc(c), 1.0 - i / 10) for i, c in enumerate("abcde")]
+    assert ids(fuse_results(dense, [], top_k=2)) == ["a", "b"]
+    assert fuse_results([], []) == []
+
+
+def test_unknown_method_is_rejected():
+    with pytest.raises(ValueError):
+        fuse_results([(doc("a"), 1.0)], [], method="max")
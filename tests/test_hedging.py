@@ -0,0 +1,98 @@
+import asyncio
+import itertools
+import time
+
+import pytest
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+from app.utils.hedging import HedgedLLM, _hedge_counts, get_histogram
+from app.utils.llm_scheduler import BACKGROUND, _priority, llm_priority
+
+_names = itertools.count()
+
+
+class FakeProvider:
+    """Answers with its own name after `delay` seconds; records whether an async call was cancelled."""
+
+    def __init__(self, delay):
+        self.name = f"provider-{next(_names)}"
+        self.delay = delay
+        self.cancelled = False
+        self.priorities = []
+
+    def invoke(self, input, config=None, **kwargs):
+        self.priorities.append(_priority.get())
+        time.sleep(self.delay)
+        return AIMessage(content=self.name)
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        return AIMessage(content=self.name)
+
+    def stream(self, input, config=None, **kwargs):
+        time.sleep(self.delay)
+        for word in (self.name, " says", " hi"):
+            yield AIMessageChunk(content=word)
+
+
+def _hedged(primary, secondary):
+    # no latency history yet, so the hedge fires after max_delay_ms
+    return HedgedLLM(primary, secondary, primary.name, secondary.name, min_delay_ms=10, max_delay_ms=100)
+
+
+@pytest.mark.asyncio
+async def test_fast_primary_is_not_hedged():
+    primary, secondary = FakeProvider(0.0), FakeProvider(0.0)
+    hedged_before = _hedge_counts["hedged"]
+    assert (await _hedged(primary, secondary).ainvoke("q")).content == primary.name
+    assert _hedge_counts["hedged"] == hedged_before
+
+
+@pytest.mark.asyncio
+async def test_slow_primary_loses_to_the_hedge_and_is_cancelled():
+    primary, secondary = FakeProvider(2.0), FakeProvider(0.0)
+    wins_before = _hedge_counts["hedge_wins"]
+    start = time.perf_counter()
+    assert (await _hedged(primary, secondary).ainvoke("q")).content == secondary.name
+    assert time.perf_counter() - start < 1.0
+    assert _hedge_counts["hedge_wins"] == wins_before + 1
+
+    await asyncio.sleep(0)
+    assert primary.cancelled
+    # the loser's elapsed time still counts, as a lower bound
+    assert len(get_histogram(primary.name, "total")) == 1
+    assert len(get_histogram(secondary.name, "total")) == 1
+
+
+def test_sync_invoke_returns_the_first_answer():
+    primary, secondary = FakeProvider(1.0), FakeProvider(0.0)
+    assert _hedged(primary, secondary).invoke("q").content == secondary.name
+
+
+def test_sync_invoke_runs_both_requests_at_the_callers_priority():
+    primary, secondary = FakeProvider(1.0), FakeProvider(0.0)
+    with llm_priority(BACKGROUND):
+        _hedged(primary, secondary).invoke("q")
+    assert primary.priorities == secondary.priorities == [BACKGROUND]
+
+
+def test_stream_hedges_on_first_token_and_yields_only_the_winner():
+    primary, secondary = FakeProvider(1.0), FakeProvider(0.0)
+    chunks = [c.content for c in _hedged(primary, secondary).stream("q")]
+    assert "".join(chunks) == f"{secondary.name} says hi"
+    assert len(get_histogram(secondary.name, "ttft")) == 1
+    assert len(get_histogram(secondary.name, "total")) == 0
+
+
+def test_hedge_delay_uses_the_matching_histogram():
+    primary, secondary = FakeProvider(0.0), FakeProvider(0.0)
+    llm = HedgedLLM(primary, secondary, primary.name, secondary.name, min_delay_ms=10, max_delay_ms=5000, min_samples=5)
+    for _ in range(10):
+        get_histogram(primary.name, "ttft").record(40)
+        get_histogram(primary.name, "total").record(900)
+    assert llm.hedge_delay("ttft") == pytest.approx(0.04)
+    assert llm.hedge_delay("total") == pytest.approx(0.9)
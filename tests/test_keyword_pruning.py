@@ -0,0 +1,97 @@
+import json
+
+import pytest
+
+from app.metadata_extraction.keyword_index import KeywordIndex
+from app.utils.model_router import get_router
+from app.utils.offline_models import HashEmbeddings
+from app.utils.token_utils import estimate_tokens
+
+EMBEDDINGS = HashEmbeddings(dimension=256)
+KNOWN = {
+    "coverage_type": [f"coverage option {i}" for i in range(30)] + ["maternity benefit"],
+    "policy_name": [f"plan {i}" for i in range(30)],
+    "exclusions": ["cosmetic surgery", "dental"],
+    "added_new_keyword": True,
+}
+
+
+def _prune(query, **kwargs):
+    index = KeywordIndex(KNOWN, embedding_model=EMBEDDINGS)
+    return index.prune(EMBEDDINGS.embed_query(query), KNOWN, **kwargs)
+
+
+def test_keeps_top_n_per_field_most_similar_first():
+    pruned = _prune("maternity benefit", top_n=3, token_budget=10_000)
+    assert set(pruned) == {"coverage_type", "policy_name", "exclusions"}
+    assert len(pruned["coverage_type"]) == 3 and len(pruned["policy_name"]) == 3
+    assert pruned["coverage_type"][0] == "maternity benefit"
+    # fields that are not indexed keep their name with no values
+    assert pruned["exclusions"] == []
+
+
+def test_fits_the_token_budget():
+    budget = 40
+    pruned = _prune("maternity benefit", top_n=8, token_budget=budget)
+    assert estimate_tokens(json.dumps(pruned, separators=(",", ":"))) <= budget
+    assert pruned["coverage_type"][:1] == ["maternity benefit"]
+    assert estimate_tokens(json.dumps(pruned)) < estimate_tokens(json.dumps(KNOWN, indent=2))
+
+
+def test_prompt_vocabulary_is_pruned_for_the_query(rag_service, monkeypatch):
+    with open(rag_service.keywords_path) as f:
+        known = json.load(f)
+    embedding = rag_service.embedding_model.embed_query("waiting period")
+
+    assert any(isinstance(v, list) and len(v) > 1 for v in known.values())
+    monkeypatch.setenv("KEYWORD_PROMPT_TOP_N", "1")
+    pruned = rag_service._prompt_keywords(embedding, known)
+    assert all(len(v) <= 1 for v in pruned.values())
+    monkeypatch.setenv("KEYWORD_PROMPT_PRUNING", "false")
+    assert rag_service._prompt_keywords(embedding, known) == known
+
+
+REPLAYED = [
+    "what is the waiting period for pre-existing disease?",
+    "is maternity covered?",
+    "are dental and optical excluded?",
+    "how is the premium paid?",
+    "is ambulance cover included?",
+    "when does the policy lapse?",
+]
+
+
+def _metadata_prompt_tokens(service, embeddings, known):
+    """Mean prompt tokens of the query-metadata LLM call over REPLAYED."""
+    def prompt_tokens():
+        return get_router().metrics().get("query_metadata", {}).get("prompt_tokens", 0)
+
+    before = prompt_tokens()
+    for query, embedding in zip(REPLAYED, embeddings):
+        service._extract_query_metadata_llm(query, embedding, known)
+    return (prompt_tokens() - before) / len(REPLAYED)
+
+
+@pytest.fixture
+def replayed(rag_service):
+    known = rag_service._load_known_keywords()
+    return rag_service, [rag_service.embedding_model.embed_query(q) for q in REPLAYED], known
+
+
+def test_pruning_cuts_the_metadata_prompt(replayed, monkeypatch):
+    tokens = {}
+    for pruning in ("true", "false"):
+        monkeypatch.setenv("KEYWORD_PROMPT_PRUNING", pruning)
+        tokens[pruning] = _metadata_prompt_tokens(*replayed)
+    assert tokens["true"] < tokens["false"]
+
+
+@pytest.mark.benchmark(group="keyword-pruning")
+@pytest.mark.parametrize("pruning", ["true", "false"], ids=["pruned", "full-vocabulary"])
+def test_benchmark_metadata_prompt_over_replayed_queries(benchmark, replayed, monkeypatch, pruning):
+    service, embeddings, known = replayed
+    monkeypatch.setenv("KEYWORD_PROMPT_PRUNING", pruning)
+    benchmark.extra_info["queries"] = len(REPLAYED)
+    benchmark.extra_info["vocabulary_values"] = sum(len(v) for v in known.values() if isinstance(v, list))
+    benchmark.extra_info["prompt_tokens_per_query"] = round(_metadata_prompt_tokens(service, embeddings, known))
+    benchmark(lambda: [service._extract_query_metadata_llm(q, e, known) for q, e in zip(REPLAYED, embeddings)])
@@ -0,0 +1,130 @@
+import copy
+import time
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+import app.services.library_service as library_service_module
+from app.retrieval.library import LibraryDocument, LibrarySearch, can_match
+from app.services.RAG_service import RAGService
+
+TOPICS = {
+    "maternity": "maternity childbirth newborn delivery prenatal postnatal".split(),
+    "dental": "dental tooth extraction orthodontic crown filling".split(),
+}
+
+
+@pytest.fixture
+def library(tmp_path, fake_llm, load_pages):
+    """Two indexed documents on different topics, as LibraryDocuments."""
+    documents = []
+    for seed, (topic, words) in enumerate(TOPICS.items()):
+        rng = np.random.default_rng(seed)
+        source = str(tmp_path / topic)
+        load_pages([
+            Document(page_content=" ".join(rng.choice(words, 200)) + ".", metadata={"source": source, "page": p})
+            for p in range(3)
+        ])
+        service = RAGService()
+        service.load_and_split_document("pdf", path=f"{topic}.pdf")
+        service.create_vector_store()
+        documents.append(LibraryDocument(
+            session_id=f"session-{topic}", document_name=f"{topic}.pdf",
+            retriever=service.retriever, metadata_summary=service.metadata_summary,
+        ))
+    return documents
+
+
+def test_hits_come_from_the_matching_document(library):
+    search = LibrarySearch(library)
+    for topic in TOPICS:
+        hits, stats = search.search(f"{topic} {TOPICS[topic][1]}", k=4)
+        assert hits and stats["searched"] == 2
+        assert {hit.metadata["session_id"] for hit in hits[:2]} == {f"session-{topic}"}
+        names = {d.session_id: d.document_name for d in library}
+        assert all(hit.metadata["document_name"] == names[hit.metadata["session_id"]] for hit in hits)
+
+
+def test_documents_that_cannot_match_the_filter_are_pruned(library):
+    field, values = next(iter(library[0].metadata_summary.items()))
+    only_first = {field: {"$in": sorted(values - library[1].metadata_summary.get(field, set()))}}
+    if not only_first[field]["$in"]:
+        pytest.skip("the fake extractor gave both documents the same values")
+
+    kept, pruned = LibrarySearch(library).prune(only_first)
+    assert [d.session_id for d in kept] == ["session-maternity"]
+    assert [d.session_id for d in pruned] == ["session-dental"]
+    assert can_match(None, only_first)
+
+
+def test_restored_retrievers_are_a_bounded_lru(monkeypatch):
+    monkeypatch.setattr(library_service_module, "_restored_retrievers", type(library_service_module._restored_retrievers)())
+    monkeypatch.setattr(library_service_module, "open_vector_store", lambda index, namespace, models: object())
+    monkeypatch.setattr(library_service_module, "get_models", lambda: None)
+    monkeypatch.setenv("LIBRARY_RESTORED_RETRIEVERS_MAX", "2")
+    service = library_service_module.LibraryService(manager=None)
+
+    first = service._restored_retriever("index", "a")
+    assert service._restored_retriever("index", "a") is first
+    service._restored_retriever("index", "b")
+    service._restored_retriever("index", "a")  # most recently used again
+    service._restored_retriever("index", "c")
+    assert list(library_service_module._restored_retrievers) == [("index", "a"), ("index", "c")]
+
+
+@pytest.mark.parametrize("end", ["delete", "expire"])
+def test_library_skips_deleted_and_expired_sessions(end, monkeypatch):
+    monkeypatch.setattr(library_service_module.LibraryService, "_restored_retriever", lambda self, index, namespace: object())
+    manager = library_service_module.SessionManager()
+    session_id = manager.create_session(username=f"reader-{end}")
+    manager.db.update_session(session_id, document_name="policy.pdf", pinecone_index="index", pinecone_namespace=session_id)
+    service = library_service_module.LibraryService(manager)
+    assert [d.session_id for d in service.documents(f"reader-{end}")] == [session_id]
+
+    if end == "delete":
+        manager.delete_session(session_id)
+    else:
+        monkeypatch.setenv("SESSION_TIMEOUT_MINUTES", "0")
+        assert manager.cleanup_expired_sessions() == 1
+
+    assert service.documents(f"reader-{end}") == []
+    assert not manager.db.get_session(session_id)["is_active"]
+
+
+class SlowVectorStore:
+    """Delegates to `store` after a fixed dense round trip."""
+
+    def __init__(self, store, latency_ms):
+        self.store, self.latency_ms = store, latency_ms
+
+    def similarity_search_by_vector_with_score(self, *args, **kwargs):
+        time.sleep(self.latency_ms / 1000)
+        return self.store.similarity_search_by_vector_with_score(*args, **kwargs)
+
+    def similarity_search_with_score(self, *args, **kwargs):
+        time.sleep(self.latency_ms / 1000)
+        return self.store.similarity_search_with_score(*args, **kwargs)
+
+
+@pytest.mark.benchmark(group="library-search")
+@pytest.mark.parametrize("documents, pruned", [(1, 0), (10, 0), (100, 0), (100, 50)])
+def test_benchmark_library_size(benchmark, library, documents, pruned):
+    # copies of one indexed document, each behind a 30 ms dense round trip;
+    # the first `pruned` have a summary that cannot match the filter
+    retriever = copy.copy(library[0].retriever)
+    retriever.vector_store = SlowVectorStore(retriever.vector_store, latency_ms=30)
+    summary = library[0].metadata_summary
+    field = next(iter(summary))
+    metadata_filter = {field: {"$in": sorted(summary[field])}} if pruned else None
+    search = LibrarySearch([
+        LibraryDocument(session_id=f"session-{i}", document_name=f"{i}.pdf",
+                        retriever=retriever, metadata_summary={} if i < pruned else summary)
+        for i in range(documents)
+    ])
+
+    hits, stats = benchmark.pedantic(lambda: search.search("maternity newborn", metadata_filter=metadata_filter, k=5),
+                                     rounds=5, iterations=1)
+    assert hits and (stats["searched"], stats["pruned"]) == (documents - pruned, pruned)
+    benchmark.extra_info["documents"] = documents
+    benchmark.extra_info["pruned"] = pruned
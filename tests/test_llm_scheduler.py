@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+
+from app.utils.llm_scheduler import BACKGROUND, INTERACTIVE, LLMScheduler, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def scheduler(clock):
+    # 60 requests/min: a full bucket of 60, refilled at one request per second
+    return LLMScheduler({"p": {"requests_per_minute": 60}}, backoff_base=10.0, clock=clock)
+
+
+async def _advance(scheduler, clock, seconds):
+    """Move the fake clock and let waiters re-check the buckets."""
+    clock.now += seconds
+    limiter = scheduler._limiter("p")
+    with limiter.condition:
+        scheduler._wake(limiter)
+    await asyncio.sleep(0.02)
+
+
+def test_token_bucket_refills_continuously(clock):
+    bucket = TokenBucket(60, clock)
+    bucket.take(60)
+    assert bucket.wait_time(3, clock()) == pytest.approx(3.0)
+    clock.now += 1.5
+    assert bucket.wait_time(3, clock()) == pytest.approx(1.5)
+    # requests larger than the bucket wait for a full bucket only
+    assert bucket.wait_time(600, clock()) == pytest.approx(58.5)
+
+
+@pytest.mark.asyncio
+async def test_interactive_calls_go_before_queued_background_calls(scheduler, clock):
+    for _ in range(60):
+        await scheduler.aacquire("p", 1, INTERACTIVE)
+    order = []
+
+    async def call(name, priority):
+        await scheduler.aacquire("p", 1, priority)
+        order.append(name)
+
+    tasks = [asyncio.create_task(call(name, priority)) for name, priority in [
+        ("background-1", BACKGROUND), ("background-2", BACKGROUND),
+        ("interactive-1", INTERACTIVE), ("interactive-2", INTERACTIVE),
+    ]]
+    await asyncio.sleep(0.02)
+    assert order == [] and scheduler.metrics()["p"]["queue_depth"] == 4
+
+    for admitted in range(1, 5):
+        await _advance(scheduler, clock, 1.0)
+        assert len(order) == admitted
+    await asyncio.gather(*tasks)
+    assert order == ["interactive-1", "interactive-2", "background-1", "background-2"]
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_error_starts_a_cooldown_then_retries(scheduler, clock):
+    attempts = []
+
+    async def fn():
+        attempts.append(clock())
+        if len(attempts) == 1:
+            raise RateLimitError("429 Too Many Requests")
+        return "ok"
+
+    task = asyncio.create_task(scheduler.acall("p", fn))
+    await asyncio.sleep(0.02)
+    metrics = scheduler.metrics()["p"]
+    assert len(attempts) == 1 and metrics["rate_limited"] == 1
+    # backoff_base 10s with +-25% jitter
+    assert 7.5 <= metrics["cooldown_remaining_s"] <= 12.5
+
+    await _advance(scheduler, clock, 7.0)
+    assert len(attempts) == 1
+    await _advance(scheduler, clock, 6.0)
+    assert await task == "ok"
+    assert len(attempts) == 2
+    assert scheduler.metrics()["p"]["retries"] == 1
+    assert scheduler._limiter("p").backoff_level == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_leaves_the_queue(scheduler, clock):
+    for _ in range(60):
+        await scheduler.aacquire("p", 1, INTERACTIVE)
+    head = asyncio.create_task(scheduler.aacquire("p", 1, INTERACTIVE))
+    behind = asyncio.create_task(scheduler.aacquire("p", 1, BACKGROUND))
+    await asyncio.sleep(0.02)
+
+    head.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await head
+    await _advance(scheduler, clock, 1.0)
+    await behind
+    limiter = scheduler._limiter("p")
+    assert limiter.queue == [] and limiter.async_waiters == {}
+    assert scheduler.metrics()["p"]["calls"] == 61
@@ -0,0 +1,95 @@
+import json
+
+import numpy as np
+import pytest
+
+from app.metadata_extraction.keyword_index import KeywordIndex, filter_agreement
+from app.utils.model_router import get_router
+
+KNOWN = {
+    "coverage_type": ["Maternity", "day care", "OPD"],
+    "policy_name": ["Arogya Sanjeevani"],
+    "exclusions": ["cosmetic surgery"],  # never a filter field
+    "added_new_keyword": True,
+}
+
+
+class OneHotEmbeddings:
+    """Each text maps to its own axis, except those listed as synonyms of a keyword."""
+
+    def __init__(self, synonyms):
+        self.synonyms = synonyms
+        self.axes = {}
+
+    def _vector(self, text):
+        axis = self.axes.setdefault(self.synonyms.get(text, text), len(self.axes))
+        vector = np.zeros(16)
+        vector[axis] = 1.0
+        return vector.tolist()
+
+    def embed_documents(self, texts):
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+
+def test_exact_mentions_become_filters():
+    index = KeywordIndex(KNOWN)
+    assert index.build_filter("Is maternity covered under Arogya-Sanjeevani?") == {
+        "coverage_type": ["Maternity"], "policy_name": ["Arogya Sanjeevani"],
+    }
+    # whole words only, and skipped fields never match
+    assert index.build_filter("any opdx or daycare limits?") is None
+    assert index.build_filter("is cosmetic surgery excluded?") is None
+
+
+def test_embedding_match_needs_the_threshold():
+    embeddings = OneHotEmbeddings({"childbirth costs": "Maternity"})
+    index = KeywordIndex(KNOWN, embedding_model=embeddings, similarity_threshold=0.75)
+    assert index.build_filter("childbirth costs", embeddings.embed_query("childbirth costs")) == {"coverage_type": ["Maternity"]}
+    assert index.build_filter("dental", embeddings.embed_query("dental")) is None
+
+
+@pytest.mark.parametrize("enabled, source", [("true", "local"), ("false", "llm")])
+def test_query_filter_skips_the_llm_on_a_local_match(rag_service, monkeypatch, enabled, source):
+    monkeypatch.setenv("LOCAL_QUERY_FILTER", enabled)
+    monkeypatch.setenv("ANSWER_CACHE_ENABLED", "false")
+    with open(rag_service.keywords_path) as f:
+        known = json.load(f)
+    values = next(v for k, v in known.items() if isinstance(v, list) and v and k not in ("exclusions", "obligations", "notes"))
+
+    def llm_calls():
+        return get_router().metrics().get("query_metadata", {}).get("calls", 0)
+
+    before = llm_calls()
+    result = rag_service.run_query(f"what does the policy say about {values[0]}?")
+    assert result.filter_source == source
+    assert (llm_calls() > before) == (source == "llm")
+    if source == "local":
+        assert values[0] in json.dumps(result.query_filter)
+
+
+def _replayed(service, known, n=6):
+    """Queries that each mention one keyword of the document, with their embeddings."""
+    values = [v for k, vs in known.items() if isinstance(vs, list) and k not in ("exclusions", "obligations", "notes") for v in vs]
+    queries = [f"what does the policy say about {value}?" for value in values[:n]]
+    return queries, [service.embedding_model.embed_query(q) for q in queries]
+
+
+@pytest.mark.benchmark(group="query-filter")
+@pytest.mark.parametrize("path", ["local", "llm"])
+def test_benchmark_local_filter_against_the_llm(benchmark, rag_service, monkeypatch, path):
+    monkeypatch.setenv("LOCAL_QUERY_FILTER", str(path == "local").lower())
+    known = rag_service._load_known_keywords()
+    queries, embeddings = _replayed(rag_service, known)
+
+    results = benchmark(lambda: [rag_service._resolve_query_filter(q, e, known) for q, e in zip(queries, embeddings)])
+    assert [source for _, source in results] == [path] * len(queries)
+    benchmark.extra_info["queries"] = len(queries)
+    if path == "local":
+        agreement = [
+            filter_agreement(rag_service._local_query_metadata(q, e, known)[0], rag_service._extract_query_metadata_llm(q, e, known))
+            for q, e in zip(queries, embeddings)
+        ]
+        benchmark.extra_info["agreement_with_llm"] = round(sum(agreement) / len(agreement), 2)
@@ -0,0 +1,109 @@
+import pytest
+from langchain_core.documents import Document
+from langchain_core.exceptions import OutputParserException
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import RunnableLambda
+
+from app.ingestion.file_loader import FileLoader
+from app.metadata_extraction.metadata_ext import MetadataExtractor
+from app.schemas.metadata_schema import InsuranceMetadata
+from app.schemas.request_models import DocumentTypeSchema
+from app.utils.offline_models import FakeChatModel
+
+PAGE = Document(page_content="Maternity is covered after a two year waiting period.", metadata={"source": "policy.pdf"})
+
+
+class UnparseableModel(FakeChatModel):
+    """Replies with text no parser accepts; no native structured output either."""
+    calls: int = 0
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="sorry, no JSON today"))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        return self._generate(messages)
+
+    def with_structured_output(self, schema, **kwargs):
+        raise NotImplementedError
+
+
+class InvalidStructuredModel(FakeChatModel):
+    """Native structured output whose reply fails schema validation."""
+    calls: int = 0
+
+    def with_structured_output(self, schema, **kwargs):
+        def invalid(input):
+            self.calls += 1
+            return schema.model_validate({name: 42 for name in schema.model_fields})
+
+        async def ainvalid(input):
+            return invalid(input)
+
+        return RunnableLambda(invalid, afunc=ainvalid)
+
+
+@pytest.fixture(params=["parse", "validation"])
+def failing(request, monkeypatch):
+    """A primary model whose output fails to parse, or fails validation (native mode)."""
+    if request.param == "parse":
+        monkeypatch.setenv("STRUCTURED_OUTPUT_MODE", "parser")
+        return UnparseableModel()
+    monkeypatch.setenv("STRUCTURED_OUTPUT_MODE", "native")
+    return InvalidStructuredModel()
+
+
+@pytest.mark.parametrize("fallback_fails", [False, True])
+def test_page_extraction_escalates_to_the_fallback(failing, fallback_fails):
+    fallback = type(failing)() if fallback_fails else FakeChatModel()
+    result = MetadataExtractor(llm=failing, fallback_llm=fallback).extractMetadata(InsuranceMetadata, PAGE)
+
+    assert failing.calls == 1
+    if fallback_fails:
+        assert fallback.calls == 1
+        assert result == InsuranceMetadata(added_new_keyword=True)
+    else:
+        assert result != InsuranceMetadata(added_new_keyword=True)
+
+
+def test_page_extraction_without_fallback_keeps_ingesting(failing):
+    assert MetadataExtractor(llm=failing).extractMetadata(InsuranceMetadata, PAGE) == InsuranceMetadata(added_new_keyword=True)
+
+
+@pytest.mark.parametrize("with_fallback", [False, True])
+def test_query_extraction_never_aborts_the_query(failing, with_fallback):
+    extractor = MetadataExtractor(llm=failing, fallback_llm=FakeChatModel() if with_fallback else None)
+    result = extractor.extractMetadata_query(InsuranceMetadata, Document(page_content="is maternity covered?"), {})
+    assert (result == InsuranceMetadata(added_new_keyword=False)) != with_fallback
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("with_fallback", [False, True])
+async def test_async_query_extraction_never_aborts_the_query(failing, with_fallback):
+    extractor = MetadataExtractor(llm=failing, fallback_llm=FakeChatModel() if with_fallback else None)
+    result = await extractor.aextractMetadata_query(InsuranceMetadata, Document(page_content="is maternity covered?"), {})
+    assert (result == InsuranceMetadata(added_new_keyword=False)) != with_fallback
+
+
+def test_empty_extraction_is_not_escalated(monkeypatch):
+    monkeypatch.setenv("STRUCTURED_OUTPUT_MODE", "native")
+
+    class EmptyModel(FakeChatModel):
+        def with_structured_output(self, schema, **kwargs):
+            return RunnableLambda(lambda input: schema(added_new_keyword=True))
+
+    fallback = InvalidStructuredModel()
+    result = MetadataExtractor(llm=EmptyModel(), fallback_llm=fallback).extractMetadata(InsuranceMetadata, PAGE)
+    assert result == InsuranceMetadata(added_new_keyword=True)
+    assert fallback.calls == 0
+
+
+@pytest.mark.parametrize("with_fallback", [False, True])
+def test_classification_escalates_or_raises_a_parse_error(failing, with_fallback):
+    loader = FileLoader(llm=failing, fallback_llm=FakeChatModel() if with_fallback else None)
+    if with_fallback:
+        assert isinstance(loader.detect_document_type([PAGE]), DocumentTypeSchema)
+    else:
+        with pytest.raises(OutputParserException):
+            loader.detect_document_type([PAGE])
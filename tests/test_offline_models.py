@@ -0,0 +1,98 @@
+import json
+import time
+
+import numpy as np
+import pytest
+
+from app.schemas.request_models import DocumentTypeSchema, PackedAnswers
+from app.services.RAG_service import RAGService
+from app.utils.offline_models import FakeChatModel, HashEmbeddings, LexicalCrossEncoder, fake_instance
+
+QUERY = "waiting period for pre-existing disease"
+CLASSIFY = 'Return JSON with "document_types".\nDocument content: this insurance plan covers hospitalization'
+
+
+def test_hash_embeddings_are_deterministic_unit_vectors():
+    a, b = HashEmbeddings(dimension=256), HashEmbeddings(dimension=256)
+    vector = np.asarray(a.embed_query(QUERY))
+    assert vector.shape == (256,) and np.linalg.norm(vector) == pytest.approx(1.0, abs=1e-6)
+    assert a.embed_documents([QUERY]) == [b.embed_query(QUERY)]
+    assert a.embed_query("") == [0.0] * 256
+
+
+def test_hash_embeddings_place_texts_sharing_words_closer():
+    model = HashEmbeddings()
+    query, near, far = (np.asarray(v) for v in model.embed_documents([
+        QUERY, "the waiting period applies to a pre-existing disease", "dental and optical riders lapse at renewal",
+    ]))
+    assert query @ near > query @ far
+
+
+def test_fake_instances_are_schema_valid_and_depend_only_on_the_text():
+    first = fake_instance(DocumentTypeSchema, CLASSIFY)
+    assert first == fake_instance(DocumentTypeSchema, CLASSIFY)
+    # a Literal prefers the option the content mentions
+    assert first.document_types == "Insurance"
+
+
+def test_prompts_with_a_schema_get_json_and_others_a_grounded_answer():
+    model = FakeChatModel()
+    assert DocumentTypeSchema.model_validate_json(model.invoke(CLASSIFY).content)
+
+    answer = model.invoke(f"Context clauses:\n[Page 2]\nthe waiting period is 36 months\nQuestion: {QUERY}")
+    assert answer.content == f"Regarding {QUERY}: the waiting period is 36 months."
+    assert answer.usage_metadata["total_tokens"] > answer.usage_metadata["output_tokens"] > 0
+
+    packed = json.loads(model.invoke('Return "answers".\nQuestions:\n1. first?\n2. second?').content)
+    assert len(PackedAnswers(**packed).answers) == 2
+
+
+def test_streamed_pieces_join_to_the_invoked_answer():
+    model = FakeChatModel()
+    prompt = f"[Page 1]\nmaternity is covered after nine months\nQuestion: {QUERY}"
+    pieces = [chunk.content for chunk in model.stream(prompt)]
+    assert len(pieces) > 1 and "".join(pieces) == model.invoke(prompt).content
+
+
+def test_structured_output_returns_instances():
+    instance = FakeChatModel().with_structured_output(DocumentTypeSchema).invoke(CLASSIFY)
+    assert isinstance(instance, DocumentTypeSchema) and instance == fake_instance(DocumentTypeSchema, CLASSIFY)
+
+
+def test_latency_is_seeded():
+    def latencies(seed):
+        model = FakeChatModel(latency_ms=100, latency_jitter=0.3, seed=seed)
+        return [model._latency() for _ in range(5)]
+
+    assert latencies(1) == latencies(1) != latencies(2)
+    assert FakeChatModel(latency_ms=100)._latency() == 0.1
+
+    model = FakeChatModel(latency_ms=50)
+    start = time.perf_counter()
+    model.invoke(QUERY)
+    assert time.perf_counter() - start >= 0.05
+
+
+def test_lexical_cross_encoder_scores_query_word_coverage():
+    scores = LexicalCrossEncoder().predict([
+        (QUERY, "the waiting period for any pre-existing disease"),
+        (QUERY, "the waiting period"),
+        (QUERY, "dental cover"),
+    ])
+    assert scores == [1.0, 0.5, 0.0]
+
+
+def test_two_ingests_of_one_document_answer_alike(fake_llm, pages, load_pages, monkeypatch):
+    monkeypatch.setenv("ANSWER_CACHE_ENABLED", "false")
+    load_pages(pages)
+    results = []
+    for _ in range(2):
+        service = RAGService()
+        service.load_and_split_document("pdf", path="policy.pdf")
+        service.create_vector_store()
+        results.append(service.run_query(QUERY))
+
+    first, second = results
+    assert first.answer == second.answer
+    assert [h.text for h in first.hits] == [h.text for h in second.hits]
+    assert first.query_filter == second.query_filter
@@ -0,0 +1,111 @@
+import pytest
+
+from app.retrieval.reranker import CrossEncoderReranker
+from app.schemas.request_models import ClauseHit
+from app.utils.offline_models import LexicalCrossEncoder
+from app.utils.token_utils import estimate_tokens
+
+
+class CountingEncoder(LexicalCrossEncoder):
+    """Lexical scores, recording the size of every batch."""
+
+    def __init__(self):
+        self.batches = []
+
+    def predict(self, pairs, batch_size=None, show_progress_bar=False):
+        self.batches.append(len(pairs))
+        return super().predict(pairs, batch_size, show_progress_bar)
+
+
+def _hits(texts):
+    return [ClauseHit(doc_id="d", page=0, chunk_id=f"c{i}", text=text, score=1.0 - i / 100) for i, text in enumerate(texts)]
+
+
+HITS = _hits([
+    "premium is due monthly",
+    "maternity cover after a waiting period",
+    "dental and optical are excluded",
+    "waiting period for pre-existing disease",
+    "ambulance cover",
+])
+
+
+def test_orders_by_cross_encoder_score_in_one_batch():
+    model = CountingEncoder()
+    reranked = CrossEncoderReranker(top_n=2, model=model).rerank("waiting period for maternity", HITS)
+
+    assert [h.chunk_id for h in reranked] == ["c1", "c3"]
+    assert reranked[0].rerank_score == 1.0
+    assert model.batches == [len(HITS)]
+
+
+def test_scores_are_cached_per_query_and_chunk():
+    model = CountingEncoder()
+    reranker = CrossEncoderReranker(top_n=3, model=model)
+    reranker.rerank("ambulance cover", HITS[:3])
+    reranked = reranker.rerank("  Ambulance cover ", HITS)
+
+    # only the two chunks not seen for this query are scored
+    assert model.batches == [3, 2]
+    assert reranked[0].chunk_id == "c4"
+    reranker.rerank("ambulance cover", HITS)
+    assert model.batches == [3, 2]
+    reranker.rerank("dental", HITS[:1])
+    assert model.batches == [3, 2, 1]
+
+
+def test_candidates_are_capped_by_the_latency_budget():
+    model = CountingEncoder()
+    reranker = CrossEncoderReranker(top_n=2, max_candidates=5, latency_budget_ms=10, model=model)
+    reranker._pair_ms = 4.0  # measured cost per pair: the budget affords 2 pairs
+
+    reranked = reranker.rerank("waiting period", HITS)
+    assert model.batches == [2]
+    assert {h.chunk_id for h in reranked} <= {"c0", "c1"}
+    # an explicit budget overrides the default one
+    reranker._pair_ms = 4.0
+    reranker.rerank("maternity", HITS, latency_budget_ms=20)
+    assert model.batches[-1] == 5
+
+
+QUERIES = [
+    "what is the waiting period for pre-existing disease?",
+    "is maternity covered?",
+    "are cosmetic surgery claims excluded?",
+    "when does the policy lapse?",
+]
+
+
+@pytest.fixture
+def pipeline(rag_service, monkeypatch):
+    """rag_service answering uncached, with the mean prompt tokens of QUERIES per rerank setting."""
+    monkeypatch.setenv("ANSWER_CACHE_ENABLED", "false")
+    prompt_tokens = {}
+    answer_prompt = rag_service._answer_prompt
+    for rerank in (True, False):
+        monkeypatch.setenv("RERANK_ENABLED", str(rerank).lower())
+        tokens = []
+        monkeypatch.setattr(rag_service, "_answer_prompt",
+                            lambda *args, **kwargs: tokens.append(estimate_tokens(p := answer_prompt(*args, **kwargs))) or p)
+        for query in QUERIES:
+            rag_service.run_query(query)
+        prompt_tokens[rerank] = sum(tokens) / len(tokens)
+    monkeypatch.setattr(rag_service, "_answer_prompt", answer_prompt)
+    return rag_service, prompt_tokens
+
+
+def test_reranking_sends_fewer_prompt_tokens(pipeline):
+    _, prompt_tokens = pipeline
+    assert prompt_tokens[True] < 0.75 * prompt_tokens[False]
+
+
+@pytest.mark.benchmark(group="rerank-end-to-end")
+@pytest.mark.parametrize("rerank", [True, False], ids=["rerank-20-to-3", "full-ensemble"])
+def test_benchmark_rerank_against_the_full_ensemble(benchmark, pipeline, monkeypatch, rerank):
+    service, prompt_tokens = pipeline
+    monkeypatch.setenv("RERANK_ENABLED", str(rerank).lower())
+    benchmark.extra_info["queries"] = len(QUERIES)
+    benchmark.extra_info["prompt_tokens_per_query"] = round(prompt_tokens[rerank])
+    benchmark.extra_info["prompt_tokens_vs_full_ensemble"] = round(prompt_tokens[rerank] / prompt_tokens[False], 2)
+    results = benchmark(lambda: [service.run_query(query) for query in QUERIES])
+    assert all(len(result.hits) <= 3 for result in results) == rerank
@@ -0,0 +1,63 @@
+import time
+
+from app.retrieval.retriever import Retriever
+
+QUERY = "waiting period for pre-existing disease"
+
+
+class Slow:
+    """Delays every search of the wrapped vector store or sparse retriever by `seconds`."""
+
+    def __init__(self, inner, seconds):
+        self.inner = inner
+        self.seconds = seconds
+
+    def similarity_search_with_score(self, *args, **kwargs):
+        time.sleep(self.seconds)
+        return self.inner.similarity_search_with_score(*args, **kwargs)
+
+    def similarity_search_by_vector_with_score(self, *args, **kwargs):
+        time.sleep(self.seconds)
+        return self.inner.similarity_search_by_vector_with_score(*args, **kwargs)
+
+    def search_with_scores(self, *args, **kwargs):
+        time.sleep(self.seconds)
+        return self.inner.search_with_scores(*args, **kwargs)
+
+
+def test_dense_and_sparse_legs_run_concurrently(rag_service):
+    retriever = rag_service.retriever
+    slow = Retriever(Slow(retriever.vector_store, 0.2), Slow(retriever.sparse_retriever, 0.2),
+                     namespace=retriever.namespace)
+
+    hits, timings = slow.retrieve(QUERY)
+    assert timings["dense_ms"] >= 200 and timings["sparse_ms"] >= 200
+    assert timings["total_ms"] < 350
+    assert [h.chunk_id for h in hits] == [h.chunk_id for h in retriever.retrieve(QUERY)[0]]
+
+
+def test_one_retriever_serves_many_queries_and_filters(rag_service):
+    retriever = rag_service.retriever
+    page = rag_service.chunks[0].metadata["page_no"]
+    first, _ = retriever.retrieve(QUERY)
+    filtered, _ = retriever.retrieve(QUERY, {"page_no": page}, k=20)
+    again, _ = retriever.retrieve(QUERY)
+
+    assert [h.chunk_id for h in again] == [h.chunk_id for h in first]
+    # the filter applies to the dense leg only; BM25 hits carry no dense rank
+    assert all(h.page == page for h in filtered if h.dense_rank is not None)
+    assert any(h.dense_rank is not None for h in filtered)
+
+
+def test_k_widens_both_legs(rag_service):
+    hits, _ = rag_service.retriever.retrieve(QUERY, k=15)
+    assert max(h.dense_rank or 0 for h in hits) == 15
+    assert max(h.sparse_rank or 0 for h in hits) == 15
+
+
+def test_dense_only_without_a_sparse_retriever(rag_service):
+    retriever = rag_service.retriever
+    dense_only = Retriever(retriever.vector_store, None, namespace=retriever.namespace)
+    hits, timings = dense_only.retrieve(QUERY)
+    assert hits and all(h.sparse_rank is None and h.dense_rank is not None for h in hits)
+    assert timings["sparse_ms"] == 0.0
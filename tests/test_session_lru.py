@@ -0,0 +1,97 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.core.session_manager import SessionManager
+
+MB = 1024 * 1024
+
+
+class FakeState:
+    """Stands in for a RAGService holding `mb` megabytes until it is spilled."""
+
+    def __init__(self, mb):
+        self.bytes = int(mb * MB)
+        self.heavy_state_loaded = True
+        self.spilled = False
+
+    def memory_footprint(self):
+        return {"total": self.bytes if self.heavy_state_loaded else 0}
+
+    def spill(self):
+        self.heavy_state_loaded, self.spilled = False, True
+        return True
+
+    def discard_spill(self):
+        pass
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    monkeypatch.setenv("SESSION_EVICT_IDLE_SECONDS", "0")
+    return SessionManager()
+
+
+def _open(manager, *names, mb=1):
+    """Sessions named `names`, each holding `mb` MB, created (so least recently used) in that order."""
+    sessions = {}
+    for name in names:
+        session = manager.get_session(manager.create_session())
+        session.rag_service, session.vector_store_created = FakeState(mb), True
+        session.last_activity = datetime.now() - timedelta(minutes=1)
+        sessions[name] = session
+    manager.account()
+    return sessions
+
+
+def _evicted(sessions):
+    return [name for name, session in sessions.items() if session.evicted]
+
+
+def test_least_recently_used_sessions_are_evicted_first(manager, monkeypatch):
+    sessions = _open(manager, "a", "b", "c", "d")
+    manager.get_session(sessions["a"].session_id)  # a becomes the most recently used
+
+    monkeypatch.setenv("SESSION_MEMORY_BUDGET_MB", "2.5")
+    manager.account()
+    assert _evicted(sessions) == ["b", "c"]
+    assert manager.evictions == 2
+    assert manager.metrics()["bytes_held"] == 2 * MB
+
+
+def test_eviction_stops_once_the_budget_fits(manager, monkeypatch):
+    sessions = _open(manager, "a", "b", "c")
+    monkeypatch.setenv("SESSION_MEMORY_BUDGET_MB", "3")
+    manager.account()
+    assert _evicted(sessions) == []
+
+    monkeypatch.setenv("SESSION_MEMORY_BUDGET_MB", "2")
+    manager.account()
+    assert _evicted(sessions) == ["a"]
+
+
+def test_the_session_being_accounted_is_never_evicted(manager, monkeypatch):
+    sessions = _open(manager, "a", "b", "c")
+    monkeypatch.setenv("SESSION_MEMORY_BUDGET_MB", "1.5")
+    manager.account(sessions["a"])
+    assert _evicted(sessions) == ["b", "c"]
+
+
+def test_recently_active_sessions_are_skipped(manager, monkeypatch):
+    sessions = _open(manager, "a", "b", "c")
+    monkeypatch.setenv("SESSION_EVICT_IDLE_SECONDS", "30")
+    sessions["a"].last_activity = datetime.now()
+
+    monkeypatch.setenv("SESSION_MEMORY_BUDGET_MB", "1.5")
+    manager.account()
+    assert _evicted(sessions) == ["b", "c"]
+
+
+def test_evicted_sessions_are_not_evicted_again(manager, monkeypatch):
+    sessions = _open(manager, "a", "b")
+    monkeypatch.setenv("SESSION_MEMORY_BUDGET_MB", "0")
+    manager.account()
+    manager.account()
+    assert _evicted(sessions) == ["a", "b"]
+    assert manager.evictions == 2
+    assert manager.metrics()["evicted_sessions"] == 2
@@ -0,0 +1,112 @@
+import os
+import time
+
+import numpy as np
+import pytest
+
+from app.core.session_manager import SessionManager
+from app.services.RAG_service import RAGService
+from tests.conftest import make_pages
+
+QUERY = "waiting period for pre-existing disease"
+
+
+@pytest.fixture
+def spilled(rag_service, monkeypatch):
+    """The service's state before spilling, after spilling it to disk."""
+    monkeypatch.setenv("ANSWER_CACHE_ENABLED", "false")
+    before = {
+        "texts": rag_service.chunks.texts(),
+        "metadata": [rag_service.chunks.metadata(i) for i in range(len(rag_service.chunks))],
+        "bm25": rag_service.sparse_retriever.index.to_arrays(),
+        "hits": [h.chunk_id for h in rag_service.run_query(QUERY).hits],
+        "bytes": rag_service.memory_footprint()["total"],
+    }
+    assert rag_service.spill()
+    return before
+
+
+def test_spill_releases_state_to_a_per_process_file(rag_service, spilled):
+    assert rag_service.spilled and not rag_service.heavy_state_loaded
+    assert os.path.basename(rag_service.spill_path()) == f"{os.getpid()}-{rag_service.document_id}.npz"
+    assert os.path.exists(rag_service.spill_path())
+    assert rag_service.memory_footprint()["total"] < spilled["bytes"] / 2
+
+
+def test_rehydrate_round_trip_is_identical(rag_service, spilled):
+    rag_service.rehydrate()
+
+    assert not rag_service.spilled and not os.path.exists(rag_service.spill_path())
+    assert rag_service.chunks.texts() == spilled["texts"]
+    assert [rag_service.chunks.metadata(i) for i in range(len(rag_service.chunks))] == spilled["metadata"]
+    for key, value in rag_service.sparse_retriever.index.to_arrays().items():
+        np.testing.assert_array_equal(value, spilled["bm25"][key])
+    assert [h.chunk_id for h in rag_service.run_query(QUERY).hits] == spilled["hits"]
+
+
+def test_query_rehydrates_transparently(rag_service, spilled):
+    result = rag_service.run_query(QUERY)
+    assert rag_service.heavy_state_loaded
+    assert [h.chunk_id for h in result.hits] == spilled["hits"]
+
+
+def test_missing_spill_file_rebuilds_from_the_chunk_index(rag_service, spilled):
+    os.remove(rag_service.spill_path())
+    rag_service.rehydrate()
+
+    assert not rag_service.spilled
+    assert rag_service.chunks.texts() == spilled["texts"]
+    assert [h.chunk_id for h in rag_service.run_query(QUERY).hits] == spilled["hits"]
+
+
+def test_without_any_state_the_document_is_served_dense_only(rag_service, spilled):
+    os.remove(rag_service.spill_path())
+    os.remove(rag_service.chunk_index_path())
+    rag_service.rehydrate()
+
+    assert not rag_service.spilled and rag_service.retriever.sparse_retriever is None
+    hits, timings = rag_service.retriever.retrieve(QUERY)
+    assert hits and all(h.sparse_score is None for h in hits)
+    assert timings["sparse_ms"] == 0.0
+
+
+def test_over_budget_manager_spills_idle_sessions(rag_service, monkeypatch):
+    monkeypatch.setenv("SESSION_MEMORY_BUDGET_MB", "0")
+    monkeypatch.setenv("SESSION_EVICT_IDLE_SECONDS", "0")
+    manager = SessionManager()
+    session = manager.get_session(manager.create_session())
+    session.rag_service, session.vector_store_created = rag_service, True
+
+    manager.account()
+    assert session.evicted and rag_service.spilled
+    assert manager.metrics()["spilled_sessions"] == 1
+
+
+@pytest.mark.benchmark(group="session-spill")
+@pytest.mark.parametrize("n_pages", [8, 40])
+def test_benchmark_spill_round_trip(benchmark, tmp_path, fake_llm, load_pages, n_pages):
+    load_pages(make_pages(tmp_path, n_pages=n_pages))
+    service = RAGService()
+    service.load_and_split_document("pdf", path="policy.pdf")
+    service.create_vector_store()
+    chunks, resident = len(service.chunks), service.memory_footprint()["total"]
+    steps, rehydrated = {"spill": [], "rehydrate": []}, []
+
+    def round_trip():
+        for step in steps:
+            start = time.perf_counter()
+            getattr(service, step)()
+            steps[step].append((time.perf_counter() - start) * 1000)
+        rehydrated.append(service.memory_footprint()["total"])
+
+    benchmark.pedantic(round_trip, rounds=5, iterations=1)
+    # repeated round trips do not grow the resident state
+    assert max(rehydrated) - min(rehydrated) < 0.01 * resident
+    service.spill()
+    benchmark.extra_info["chunks"] = chunks
+    benchmark.extra_info["resident_bytes"] = resident
+    benchmark.extra_info["rehydrated_bytes"] = rehydrated[-1]
+    benchmark.extra_info["spilled_bytes"] = service.memory_footprint()["total"]
+    benchmark.extra_info["file_bytes"] = os.path.getsize(service.spill_path())
+    for step, ms in steps.items():
+        benchmark.extra_info[f"{step}_ms"] = round(sorted(ms)[len(ms) // 2], 2)
@@ -0,0 +1,111 @@
+import pytest
+
+from app.core.session_manager import SessionManager
+from app.database.session_store import SQLiteSessionStore
+from app.services.RAG_service import RAGService
+
+QUERY = "waiting period for pre-existing disease"
+
+
+@pytest.fixture
+def workers(tmp_path):
+    """Two SessionManagers (as in two uvicorn workers) sharing one SQLite store."""
+    store = SQLiteSessionStore(str(tmp_path / "sessions.db"))
+    managers = []
+    for _ in range(2):
+        manager = SessionManager()
+        manager.store = store
+        managers.append(manager)
+    return managers
+
+
+def _publish(manager, rag_service) -> str:
+    session_id = manager.create_session()
+    session = manager.get_session(session_id)
+    session.rag_service = rag_service
+    session.document_uploaded = session.vector_store_created = True
+    session.document_info = {"filename": "policy.pdf"}
+    manager.save_document(session)
+    return session_id
+
+
+def test_session_created_on_one_worker_is_served_by_another(workers, rag_service):
+    first, second = workers
+    session_id = _publish(first, rag_service)
+
+    session = second.get_session(session_id)
+    assert session is not None and session.document_info == {"filename": "policy.pdf"}
+    restored = session.rag_service
+    assert restored is not rag_service and restored.document_id == rag_service.document_id
+    assert restored.chunks.texts() == rag_service.chunks.texts()
+    expected, _ = rag_service.retriever.retrieve(QUERY)
+    hits, _ = restored.retriever.retrieve(QUERY)
+    assert [h.chunk_id for h in hits] == [h.chunk_id for h in expected]
+
+
+def test_delete_on_one_worker_is_seen_by_the_other(workers, rag_service):
+    first, second = workers
+    session_id = _publish(first, rag_service)
+    assert second.get_session(session_id) is not None
+
+    second.delete_session(session_id)
+    assert first.get_session(session_id) is None
+    assert first.store.get_document(rag_service.document_id) is None
+
+
+def test_each_upload_gets_its_own_document_id(fake_llm, pages, load_pages):
+    load_pages(pages)
+    services = []
+    for _ in range(2):
+        service = RAGService()
+        service.load_and_split_document("pdf", path="policy.pdf")
+        service.create_vector_store()
+        services.append(service)
+
+    first, second = services
+    assert first.document_id != second.document_id
+    assert first.namespace != second.namespace
+    assert first.chunk_index_path() != second.chunk_index_path()
+
+
+def test_concurrent_request_during_a_reupload_keeps_the_new_document(workers, rag_service, fake_llm, pages, load_pages):
+    first, second = workers
+    session_id = _publish(first, rag_service)
+    load_pages(pages)
+    new_service = RAGService()
+    new_service.load_and_split_document("pdf", path="policy.pdf")
+    new_service.create_vector_store()
+
+    session = first.get_session(session_id)
+    with first.uploading(session):
+        session.rag_service = new_service
+        session.document_info = {"filename": "renewed.pdf"}
+        # another request on this worker while the stored record still names the old document
+        assert first.get_session(session_id).rag_service is new_service
+        assert session.document_info == {"filename": "renewed.pdf"}
+        first.save_document(session)
+
+    assert first.get_session(session_id).rag_service is new_service
+    assert first.store.get_session(session_id)["document_id"] == new_service.document_id
+    assert second.get_session(session_id).rag_service.document_id == new_service.document_id
+
+
+@pytest.mark.benchmark(group="shared-sessions")
+@pytest.mark.parametrize("worker", ["cold", "warm"])
+def test_benchmark_get_session(benchmark, workers, rag_service, worker):
+    first, second = workers
+    session_id = _publish(first, rag_service)
+
+    def fresh_worker():
+        # a worker that has never loaded the document
+        manager = SessionManager()
+        manager.store = first.store
+        return (manager,), {}
+
+    if worker == "cold":
+        session = benchmark.pedantic(lambda manager: manager.get_session(session_id), setup=fresh_worker, rounds=10)
+    else:
+        second.get_session(session_id)
+        session = benchmark.pedantic(second.get_session, args=(session_id,), rounds=50)
+    assert session.rag_service.document_id == rag_service.document_id
+    benchmark.extra_info["chunks"] = len(rag_service.chunks)
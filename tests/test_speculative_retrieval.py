@@ -0,0 +1,103 @@
+import asyncio
+import time
+
+import pytest
+
+from app.utils.deadline import Deadline
+
+QUERY = "waiting period for pre-existing disease"
+K = 5
+
+
+@pytest.fixture
+def speculative(rag_service, monkeypatch):
+    """rag_service with the local fast-path disabled, so every query overlaps the LLM filter call."""
+    monkeypatch.setattr(rag_service, "_local_query_metadata", lambda *args: (None, 0.0))
+    return rag_service
+
+
+def _llm_filter(service, monkeypatch, metadata, delay=0.0):
+    def extract(query, query_embedding, known_keywords):
+        time.sleep(delay)
+        return metadata
+    monkeypatch.setattr(service, "_extract_query_metadata_llm", extract)
+
+
+def _retrieve(service, deadline=None):
+    embedding = service.embedding_model.embed_query(QUERY)
+    return service._speculative_retrieve(
+        service.retriever, QUERY, embedding, service._load_known_keywords(), K, deadline or Deadline()
+    )
+
+
+def _source(service):
+    return service.chunks[0].metadata["source"]
+
+
+def test_survivors_of_a_wide_retrieval_are_cut_to_2k(speculative, monkeypatch):
+    _llm_filter(speculative, monkeypatch, {"source": [_source(speculative)]})
+    hits, timings, query_filter, source = _retrieve(speculative)
+
+    wide, _ = speculative.retriever.retrieve(QUERY, None, k=K * 3)
+    assert len(wide) > 2 * K
+    assert [h.chunk_id for h in hits] == [h.chunk_id for h in wide[:2 * K]]
+    assert source == "llm" and query_filter == {"source": {"$in": [_source(speculative)]}}
+    assert "metadata_ms" in timings and "requery_ms" not in timings
+
+
+def test_too_few_dense_survivors_trigger_a_filtered_requery(speculative, monkeypatch):
+    _llm_filter(speculative, monkeypatch, {"source": ["another document"]})
+    hits, timings, query_filter, source = _retrieve(speculative)
+
+    assert "requery_ms" in timings
+    # nothing passes the filter in the dense leg; the sparse leg is unfiltered
+    assert hits and all(h.dense_rank is None and h.sparse_rank <= K for h in hits)
+    assert source == "llm"
+
+
+def test_a_slow_llm_filter_is_abandoned_at_the_deadline(speculative, monkeypatch):
+    monkeypatch.setenv("DEADLINE_ANSWER_RESERVE_MS", "0")
+    monkeypatch.setenv("DEADLINE_LLM_FILTER_MS", "0")
+    _llm_filter(speculative, monkeypatch, {"source": [_source(speculative)]}, delay=0.5)
+    deadline = Deadline(budget_ms=150)
+    hits, timings, query_filter, source = _retrieve(speculative, deadline)
+
+    assert timings["metadata_ms"] < 400
+    assert len(hits) == 2 * K and (query_filter, source) == (None, "none")
+    assert deadline.degradations == ["llm_filter_timeout"]
+
+
+@pytest.mark.asyncio
+async def test_an_abandoned_async_llm_filter_is_cancelled(speculative, monkeypatch):
+    monkeypatch.setenv("DEADLINE_ANSWER_RESERVE_MS", "0")
+    monkeypatch.setenv("DEADLINE_LLM_FILTER_MS", "0")
+    calls = {"started": 0, "cancelled": 0}
+
+    async def extract(query, query_embedding, known_keywords):
+        calls["started"] += 1
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            calls["cancelled"] += 1
+            raise
+        return {}
+
+    monkeypatch.setattr(speculative, "_aextract_query_metadata_llm", extract)
+    deadline = Deadline(budget_ms=150)
+    embedding = speculative.embedding_model.embed_query(QUERY)
+    hits, timings, query_filter, source = await speculative._aspeculative_retrieve(
+        speculative.retriever, QUERY, embedding, speculative._load_known_keywords(), K, deadline
+    )
+
+    assert calls == {"started": 1, "cancelled": 1}
+    assert len(hits) == 2 * K and (query_filter, source) == (None, "none")
+    assert deadline.degradations == ["llm_filter_timeout"]
+
+
+def test_no_llm_call_when_the_budget_cannot_afford_it(speculative, monkeypatch):
+    monkeypatch.setattr(speculative, "_extract_query_metadata_llm", pytest.fail)
+    deadline = Deadline(budget_ms=100)
+    hits, timings, query_filter, source = _retrieve(speculative, deadline)
+
+    assert hits and (query_filter, source) == (None, "none")
+    assert deadline.degradations == ["llm_filter_skipped"]
@@ -0,0 +1,64 @@
+import json
+
+import pytest
+
+from app.api.v1 import routes
+from app.core.session_manager import Session
+from app.schemas.request_models import QueryRequest
+
+QUERY = "waiting period for pre-existing disease"
+
+
+async def _events(session, query=QUERY):
+    """The (event, data) pairs stream_query_document sends for `query`."""
+    response = await routes.stream_query_document(session.session_id, QueryRequest(query=query), session)
+    body = "".join([chunk async for chunk in response.body_iterator])
+    events = []
+    for block in body.strip().split("\n\n"):
+        event, data = block.split("\n")
+        events.append((event[len("event: "):], json.loads(data[len("data: "):])))
+    return events
+
+
+@pytest.fixture
+def session(rag_service):
+    session = Session("stream-session")
+    session.rag_service = rag_service
+    session.document_uploaded = session.vector_store_created = True
+    return session
+
+
+@pytest.mark.asyncio
+async def test_sources_then_tokens_then_done(session):
+    events = await _events(session)
+    names = [name for name, _ in events]
+    assert names[0] == "sources" and names[-1] == "done"
+    assert set(names[1:-1]) == {"token"}
+    assert events[0][1]["sources"]
+
+    done = events[-1][1]
+    answer = "".join(data for name, data in events if name == "token")
+    assert answer == session.rag_service.run_query(QUERY).answer
+    assert done["timings"]["time_to_first_token_ms"] <= done["timings"]["end_to_end_ms"]
+    assert done["filter_source"] in ("local", "llm", "none")
+    assert (done["query_filter"] is None) == (done["filter_source"] == "none")
+    assert done["cached"] is None
+
+
+@pytest.mark.asyncio
+async def test_a_cached_answer_streams_as_one_token(session):
+    first = await _events(session)
+    events = await _events(session)
+    assert [name for name, _ in events] == ["sources", "token", "done"]
+    assert events[1][1] == "".join(data for name, data in first if name == "token")
+    assert events[-1][1]["cached"] == "exact"
+
+
+@pytest.mark.asyncio
+async def test_failures_are_sent_as_an_error_event(session, monkeypatch):
+    def failing(*args, **kwargs):
+        raise RuntimeError("index unavailable")
+        yield
+
+    monkeypatch.setattr(session.rag_service, "stream_query", failing)
+    assert await _events(session) == [("error", {"detail": "Error processing query: index unavailable"})]